@@ -1,17 +1,66 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, send_from_directory
+from flask import (
+    Flask, Request, Response, g, render_template, request, jsonify, session, redirect, url_for, send_from_directory,
+    stream_with_context
+)
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import and_, event, func, inspect, or_
+from sqlalchemy.exc import IntegrityError
 from werkzeug.utils import secure_filename
-from predict import load_alzheimer_model, predict_alzheimer, get_ai_suggestions
+from predict import (
+    load_alzheimer_model, predict_alzheimer, predict_file, predict_alzheimer_batch, predict_volume, predict_batch,
+    get_ai_suggestions, model_version, start_background_warmup, get_model_status, use_inference_pool,
+    registry as model_registry
+)
+from prediction_cache import PredictionCache
+from batching import BatchScheduler, InferenceBusy
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from inference_pool import InferencePool
+from jobs import PredictionJobQueue, run_explanation_job, warm_up_explainer
+from explain import gradcam_model_version
+from volumes import is_volume_path, group_dicom_series
+from upload_writer import UploadWriter, read_upload
+from passwords import HashingBusy, PasswordHasher
+from sessions import ServerSession, ServerSessionInterface, SessionStore
+from similarity_index import SimilarityIndex, decode_vector, encode_vector
+from shadow import ShadowStats
+import progression
+import scan_export
+from storage import create_storage, blob_suffix
 from config import Config
+from observability import REQUEST_SECONDS, STAGE_SECONDS, configure_logging, render_metrics, timed
+import migrations
+import base64
+import io
+import logging
 import os
-from datetime import datetime
+import shutil
+import tarfile
+import threading
+import time
+import zipfile
+from collections import deque
+from datetime import date, datetime, timedelta
 import json
 
 
+configure_logging()
+log = logging.getLogger(__name__)
+
+
+class InMemoryUploadRequest(Request):
+    """Keeps multipart file parts in memory instead of spooling large ones to a temp file.
+
+    Uploads are bounded by MAX_CONTENT_LENGTH, and the predict endpoint decodes
+    them straight from this buffer.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return io.BytesIO()
+
 
 # Initialize Flask app
 app = Flask(__name__)
+app.request_class = InMemoryUploadRequest
 app.config.from_object(Config)
 
 app.secret_key = 'your-secret-key'
@@ -20,6 +69,95 @@ app.secret_key = 'your-secret-key'
 db = SQLAlchemy(app)
 
 
+def configure_sqlite(dbapi_connection, connection_record):
+    # WAL lets readers run alongside the single writer; NORMAL sync is safe with WAL
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.close()
+
+
+if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite') and app.config['SQLITE_WAL']:
+    with app.app_context():
+        event.listen(db.engine, 'connect', configure_sqlite)
+
+# Forward passes run on dedicated inference processes (started by start_worker) when configured
+inference_pool = None
+if app.config['INFERENCE_WORKERS'] > 0:
+    inference_pool = InferencePool(
+        workers=app.config['INFERENCE_WORKERS'],
+        max_batch_size=max(app.config['BATCH_MAX_SIZE'], app.config['BATCH_PREDICT_SIZE']),
+        max_queue=app.config['INFERENCE_QUEUE_SIZE'],
+        timeout=app.config['INFERENCE_TIMEOUT'],
+    )
+    use_inference_pool(inference_pool)
+
+# Shared scheduler that batches concurrent prediction requests, one batch in flight per inference process
+batch_scheduler = BatchScheduler(
+    predict_batch,
+    max_batch_size=app.config['BATCH_MAX_SIZE'],
+    max_wait_ms=app.config['BATCH_MAX_WAIT_MS'],
+    timeout=app.config['INFERENCE_TIMEOUT'],
+    workers=max(1, app.config['INFERENCE_WORKERS']),
+    max_queue_size=app.config['INFERENCE_QUEUE_SIZE'],
+)
+
+# Repeat scans are answered from the cache; it resets itself when the model changes
+prediction_cache = None
+if app.config['PREDICTION_CACHE_ENABLED']:
+    prediction_cache = PredictionCache(
+        app.config['PREDICTION_CACHE_PATH'],
+        model_version,
+        max_entries=app.config['PREDICTION_CACHE_SIZE'],
+    )
+
+# Uploads are stored once per distinct content, under their hash
+storage = create_storage(
+    app.config['STORAGE_BACKEND'],
+    app.config['UPLOAD_FOLDER'],
+    depth=app.config['STORAGE_SHARD_DEPTH'],
+)
+
+# Writes uploads to storage off the request thread, after the prediction has been made
+upload_writer = UploadWriter(storage)
+
+# Threads running async predictions through batch_scheduler like sync uploads (and so through
+# the inference pool when there is one); results are written back by complete_scan
+job_queue = PredictionJobQueue(
+    lambda scan_id, result: complete_scan(scan_id, result),
+    lambda filepath, tta=False: run_async_prediction(filepath, tta),
+    max_workers=app.config['PREDICTION_WORKERS'],
+    threads=True,
+)
+
+# Worker processes that compute Grad-CAM overlays on first view; stored by complete_explanation
+explanation_queue = PredictionJobQueue(
+    lambda scan_id, result: complete_explanation(scan_id, result),
+    run_explanation_job,
+    max_workers=app.config['GRADCAM_WORKERS'],
+    initializer=warm_up_explainer,
+)
+
+# Password hashes are computed a few at a time, off the request threads
+password_hasher = PasswordHasher(
+    app.config['PASSWORD_HASH_METHOD'],
+    workers=app.config['PASSWORD_HASH_WORKERS'],
+    max_queue=app.config['PASSWORD_HASH_QUEUE'],
+)
+
+# Nearest-neighbour index over scan embeddings, memory-mapped and shared by every process
+similarity_index = SimilarityIndex(
+    app.config['EMBEDDING_INDEX_PATH'],
+    train_size=app.config['EMBEDDING_INDEX_TRAIN_SIZE'],
+    nlist=app.config['EMBEDDING_INDEX_NLIST'],
+    nprobe=app.config['EMBEDDING_INDEX_NPROBE'],
+    dims=app.config['EMBEDDING_INDEX_DIMS'],
+)
+
+# Agreement of the registry's shadow model with the active one (written by every serving process)
+shadow_stats = ShadowStats(app.config['SHADOW_STATS_PATH'])
+
+
 # Create upload folder if doesn't exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs('database', exist_ok=True)
@@ -44,10 +182,14 @@ class Doctor(db.Model):
     scans = db.relationship('MRIScan', backref='doctor', lazy=True, cascade='all, delete-orphan')
     
     def set_password(self, password):
-        self.password = generate_password_hash(password)
+        self.password = password_hasher.hash(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password, password)
+        if not password_hasher.verify(self.password, password):
+            return False
+        if password_hasher.needs_rehash(self.password):
+            self.set_password(password)  # hashing parameters changed; the caller commits
+        return True
     
     def to_dict(self):
         return {
@@ -78,10 +220,14 @@ class Patient(db.Model):
     scans = db.relationship('MRIScan', backref='patient', lazy=True, cascade='all, delete-orphan')
     
     def set_password(self, password):
-        self.password = generate_password_hash(password)
+        self.password = password_hasher.hash(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password, password)
+        if not password_hasher.verify(self.password, password):
+            return False
+        if password_hasher.needs_rehash(self.password):
+            self.set_password(password)  # hashing parameters changed; the caller commits
+        return True
     
     def to_dict(self):
         return {
@@ -97,6 +243,13 @@ class Patient(db.Model):
 
 class MRIScan(db.Model):
     __tablename__ = 'mri_scans'
+    __table_args__ = (
+        # Dashboard lists: one user's scans, newest first, keyset-paginated on (created_at, id)
+        db.Index('ix_mri_scans_doctor_created', 'doctor_id', 'created_at', 'id'),
+        db.Index('ix_mri_scans_patient_created', 'patient_id', 'created_at', 'id'),
+        # Pending scans whose lease lapsed (see renew_scan_leases)
+        db.Index('ix_mri_scans_prediction_claimed', 'prediction', 'claimed_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'), nullable=False)
@@ -107,8 +260,22 @@ class MRIScan(db.Model):
     confidence = db.Column(db.Float, default=0.0)
     stage = db.Column(db.String(50), default='')
     ai_suggestions = db.Column(db.Text, default='')
+    class_probs = db.Column(db.LargeBinary)  # float16, in progression.STAGES order
+    model_version = db.Column(db.String(200))  # of the model that made the prediction
+    tta = db.Column(db.Boolean, default=False)  # high-confidence mode requested (for resuming Pending scans)
+    claimed_at = db.Column(db.DateTime)  # lease of the process predicting a Pending scan, renewed until done
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    embedding = db.relationship('ScanEmbedding', uselist=False, lazy=True, cascade='all, delete-orphan')
+    
+    @property
+    def status(self):
+        if self.prediction == 'Pending':
+            return 'pending'
+        if self.prediction == 'Failed':
+            return 'failed'
+        return 'complete'
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -118,16 +285,838 @@ class MRIScan(db.Model):
             'prediction': self.prediction,
             'confidence': self.confidence,
             'stage': self.stage,
+            'status': self.status,
+            'model_version': self.model_version,
             'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S')
         }
 
 
+class ScanTotal(db.Model):
+    """Running per-doctor / per-patient scan count and confidence sum for each prediction."""
+    __tablename__ = 'scan_totals'
+    
+    owner_type = db.Column(db.String(10), primary_key=True)  # 'doctor' or 'patient'
+    owner_id = db.Column(db.Integer, primary_key=True)
+    prediction = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    confidence_sum = db.Column(db.Float, nullable=False, default=0.0)
+
+
+class ScanDaily(db.Model):
+    """Running per-doctor / per-patient scan count for each day."""
+    __tablename__ = 'scan_daily'
+    
+    owner_type = db.Column(db.String(10), primary_key=True)
+    owner_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ScanExplanation(db.Model):
+    """Grad-CAM heatmap of a scan, blended over the image as a JPEG; generated on first view."""
+    __tablename__ = 'scan_explanations'
+    
+    scan_id = db.Column(db.Integer, db.ForeignKey('mri_scans.id'), primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending / ready / failed
+    class_name = db.Column(db.String(100))
+    overlay = db.Column(db.LargeBinary)
+    model_version = db.Column(db.String(200))
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ScanEmbedding(db.Model):
+    """Embedding of a scan's image from the prediction's forward pass, for similar-scan search."""
+    __tablename__ = 'scan_embeddings'
+    
+    scan_id = db.Column(db.Integer, db.ForeignKey('mri_scans.id'), primary_key=True)
+    dim = db.Column(db.Integer, nullable=False)
+    vector = db.Column(db.LargeBinary, nullable=False)  # float16
+    model_version = db.Column(db.String(200))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class PatientProgression(db.Model):
+    """A patient's completed scans as a packed probability time series, with its stage and trend."""
+    __tablename__ = 'patient_progression'
+    
+    patient_id = db.Column(db.Integer, db.ForeignKey('patients.id'), primary_key=True)
+    points = db.Column(db.Integer, nullable=False, default=0)
+    series = db.Column(db.LargeBinary)  # progression.POINT records, oldest first; NULL until built
+    stage = db.Column(db.String(100))
+    stage_since = db.Column(db.DateTime)
+    trend = db.Column(db.String(20))  # worsening / stable / improving; None until two visits are PROGRESSION_TREND_MIN_DAYS apart
+    trend_per_year = db.Column(db.Float)
+    changes = db.Column(db.Text)  # JSON list of confirmed stage changes
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'points': self.points,
+            'stage': self.stage,
+            'stage_since': self.stage_since.strftime('%Y-%m-%d %H:%M:%S') if self.stage_since else None,
+            'trend': self.trend,
+            'trend_per_year': self.trend_per_year,
+            'changes': json.loads(self.changes or '[]'),
+            'series': progression.to_json(progression.unpack(self.series)),
+        }
+
+
+class UserSession(db.Model):
+    """Server-side session data; ``id`` is a hash of the token in the session cookie."""
+    __tablename__ = 'user_sessions'
+    
+    id = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.Text, nullable=False)  # JSON
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+# Sessions (and the profile cached in them at login) are read from memory on most requests
+session_store = None
+if app.config['SESSION_STORE'] == 'server':
+    session_store = SessionStore(
+        lambda: db.engine,
+        UserSession.__table__,
+        cache_ttl=app.config['SESSION_CACHE_TTL'],
+        cache_size=app.config['SESSION_CACHE_SIZE'],
+    )
+    app.session_interface = ServerSessionInterface(session_store)
+
+
+def renew_session_id():
+    """Give a server-side session a fresh ID on login, dropping the one the client came with."""
+    if isinstance(session, ServerSession):
+        session.regenerate()
+
+
+# ===== DASHBOARD AGGREGATES =====
+# scan_totals / scan_daily are kept in step with mri_scans inside the same
+# flush, so summaries never scan the mri_scans history.
+
+def _scan_owners(doctor_id, patient_id):
+    owners = [('doctor', doctor_id)]
+    if patient_id is not None:
+        owners.append(('patient', patient_id))
+    return owners
+
+
+def _insert(connection, table):
+    """INSERT with ON CONFLICT support for the connection's dialect (SQLite and PostgreSQL)."""
+    if connection.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+
+def _upsert_increment(connection, table, keys, increments):
+    """INSERT the row, or add ``increments`` to it if it exists (SQLite and PostgreSQL)."""
+    stmt = _insert(connection, table).values(**keys, **increments)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={name: table.c[name] + stmt.excluded[name] for name in increments}
+    )
+    connection.execute(stmt)
+
+
+def update_scan_stats(session, flush_context):
+    """Fold the scans inserted, re-labelled or deleted by this flush into the aggregates."""
+    totals, daily = {}, {}
+
+    def add_total(owners, prediction, count, confidence):
+        for owner in owners:
+            entry = totals.setdefault(owner + (prediction,), [0, 0.0])
+            entry[0] += count
+            entry[1] += confidence or 0.0
+
+    def add_day(owners, created_at, count):
+        for owner in owners:
+            key = owner + ((created_at or datetime.utcnow()).date(),)
+            daily[key] = daily.get(key, 0) + count
+
+    for scan in session.new:
+        if isinstance(scan, MRIScan):
+            owners = _scan_owners(scan.doctor_id, scan.patient_id)
+            add_total(owners, scan.prediction, 1, scan.confidence)
+            add_day(owners, scan.created_at, 1)
+
+    for scan in session.deleted:
+        if isinstance(scan, MRIScan):
+            owners = _scan_owners(scan.doctor_id, scan.patient_id)
+            add_total(owners, scan.prediction, -1, -(scan.confidence or 0.0))
+            add_day(owners, scan.created_at, -1)
+
+    for scan in session.dirty:
+        if not isinstance(scan, MRIScan):
+            continue
+        state = inspect(scan)
+        prediction = state.attrs.prediction.history
+        confidence = state.attrs.confidence.history
+        if not (prediction.has_changes() or confidence.has_changes()):
+            continue
+        # e.g. a Pending scan completed by a background job
+        old_prediction = (prediction.deleted or prediction.unchanged or [scan.prediction])[0]
+        old_confidence = (confidence.deleted or confidence.unchanged or [0.0])[0]
+        owners = _scan_owners(scan.doctor_id, scan.patient_id)
+        add_total(owners, old_prediction, -1, -(old_confidence or 0.0))
+        add_total(owners, scan.prediction, 1, scan.confidence)
+
+    if not totals and not daily:
+        return
+    connection = session.connection()
+    for (owner_type, owner_id, prediction), (count, confidence_sum) in totals.items():
+        _upsert_increment(
+            connection, ScanTotal.__table__,
+            {'owner_type': owner_type, 'owner_id': owner_id, 'prediction': prediction},
+            {'count': count, 'confidence_sum': confidence_sum}
+        )
+    for (owner_type, owner_id, day), count in daily.items():
+        _upsert_increment(
+            connection, ScanDaily.__table__,
+            {'owner_type': owner_type, 'owner_id': owner_id, 'day': day},
+            {'count': count}
+        )
+
+
+event.listen(db.session, 'after_flush', update_scan_stats)
+
+
+def _commit_started(session):
+    session.info['commit_started'] = time.perf_counter()
+
+
+def _commit_finished(session):
+    started = session.info.pop('commit_started', None)
+    if started is not None:
+        STAGE_SECONDS.labels('db_commit').observe(time.perf_counter() - started)
+
+
+# Commit time (including the final flush and the scan stats upserts) as stage "db_commit"
+event.listen(db.session, 'before_commit', _commit_started)
+event.listen(db.session, 'after_commit', _commit_finished)
+
+
+def rebuild_scan_stats():
+    """Recompute the aggregate tables from mri_scans (e.g. for a database that predates them)."""
+    db.session.execute(ScanTotal.__table__.delete())
+    db.session.execute(ScanDaily.__table__.delete())
+    for owner_type, column in (('doctor', MRIScan.doctor_id), ('patient', MRIScan.patient_id)):
+        totals = db.session.query(
+            column, MRIScan.prediction, func.count(MRIScan.id), func.sum(MRIScan.confidence)
+        ).filter(column.isnot(None)).group_by(column, MRIScan.prediction).all()
+        if totals:
+            db.session.execute(ScanTotal.__table__.insert(), [
+                {'owner_type': owner_type, 'owner_id': owner_id, 'prediction': prediction,
+                 'count': count, 'confidence_sum': confidence_sum or 0.0}
+                for owner_id, prediction, count, confidence_sum in totals
+            ])
+        days = db.session.query(
+            column, func.date(MRIScan.created_at), func.count(MRIScan.id)
+        ).filter(column.isnot(None)).group_by(column, func.date(MRIScan.created_at)).all()
+        if days:
+            db.session.execute(ScanDaily.__table__.insert(), [
+                {'owner_type': owner_type, 'owner_id': owner_id, 'count': count,
+                 'day': day if isinstance(day, date) else date.fromisoformat(day)}
+                for owner_id, day, count in days
+            ])
+    db.session.commit()
+
+
+def scan_summary(owner_type, owner_id, days):
+    """Dashboard header numbers for one doctor or patient, read from the aggregate tables."""
+    totals = ScanTotal.query.filter_by(owner_type=owner_type, owner_id=owner_id).all()
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    per_day = ScanDaily.query.filter(
+        ScanDaily.owner_type == owner_type,
+        ScanDaily.owner_id == owner_id,
+        ScanDaily.day >= since
+    ).order_by(ScanDaily.day).all()
+
+    # Pending / Failed scans carry no confidence
+    predicted = [t for t in totals if t.prediction not in ('Pending', 'Failed')]
+    predicted_count = sum(t.count for t in predicted)
+    return {
+        'total': sum(t.count for t in totals),
+        'by_prediction': {t.prediction: t.count for t in totals if t.count},
+        'average_confidence': (
+            round(sum(t.confidence_sum for t in predicted) / predicted_count * 100, 2)
+            if predicted_count else None
+        ),
+        'per_day': [{'date': d.day.isoformat(), 'count': d.count} for d in per_day if d.count]
+    }
+
+
+# ===== PATIENT PROGRESSION =====
+# patient_progression holds each patient's completed scans as a packed
+# probability time series (see progression.py) with its stage and trend,
+# updated inside the flush that changes the scans, so dashboards read one row
+# per patient instead of re-reading (and re-scoring) the scan history.
+
+def _is_complete(prediction):
+    return prediction not in ('Pending', 'Failed')
+
+
+def _progression_point(scan_id, created_at, class_probs, prediction, confidence):
+    return progression.point(
+        scan_id, created_at, progression.scan_probabilities(class_probs, prediction, confidence)
+    )
+
+
+def _progression_values(series):
+    summary = progression.summarise(
+        series,
+        confirm=app.config['PROGRESSION_CONFIRM_SCANS'],
+        trend_years=app.config['PROGRESSION_TREND_YEARS'],
+        threshold=app.config['PROGRESSION_TREND_THRESHOLD'],
+        min_days=app.config['PROGRESSION_TREND_MIN_DAYS'],
+    )
+    return {
+        'points': summary['points'],
+        'series': progression.pack(series),
+        'stage': summary['stage'],
+        'stage_since': summary['stage_since'],
+        'trend': summary['trend'],
+        'trend_per_year': summary['trend_per_year'],
+        'changes': json.dumps(summary['changes']),
+        'updated_at': datetime.utcnow(),
+    }
+
+
+def _apply_progression(connection, patient_id, points, removed):
+    """Add ``points`` to / drop ``removed`` scan ids from the patient's series, under a row lock.
+
+    A patient without a row yet (e.g. scanned before progression was tracked)
+    gets one built from all of their completed scans, this transaction's included.
+    """
+    table = PatientProgression.__table__
+    connection.execute(
+        _insert(connection, table).values(patient_id=patient_id, points=0)
+        .on_conflict_do_nothing(index_elements=['patient_id'])
+    )
+    row = connection.execute(
+        table.select().where(table.c.patient_id == patient_id).with_for_update()
+    ).first()
+    if row.series is None:
+        scans = MRIScan.__table__
+        history = connection.execute(
+            scans.select().where(
+                scans.c.patient_id == patient_id, scans.c.prediction.notin_(['Pending', 'Failed'])
+            ).order_by(scans.c.created_at, scans.c.id)
+        ).all()
+        series = progression.upsert(progression.unpack(None), [
+            _progression_point(s.id, s.created_at, s.class_probs, s.prediction, s.confidence)
+            for s in history
+        ])
+    else:
+        series = progression.upsert(progression.remove(progression.unpack(row.series), removed), points)
+    connection.execute(
+        table.update().where(table.c.patient_id == patient_id).values(**_progression_values(series))
+    )
+
+
+def update_progression(session, flush_context):
+    """Fold the scans completed, re-labelled or deleted by this flush into their patients' series."""
+    changes = {}  # patient_id -> (new points, removed scan ids)
+
+    for scan in session.new:
+        if isinstance(scan, MRIScan) and scan.patient_id is not None and _is_complete(scan.prediction):
+            changes.setdefault(scan.patient_id, ([], set()))[0].append(_progression_point(
+                scan.id, scan.created_at, scan.class_probs, scan.prediction, scan.confidence
+            ))
+
+    for scan in session.deleted:
+        if isinstance(scan, MRIScan) and scan.patient_id is not None:
+            changes.setdefault(scan.patient_id, ([], set()))[1].add(scan.id)
+
+    for scan in session.dirty:
+        if not isinstance(scan, MRIScan) or scan.patient_id is None:
+            continue
+        state = inspect(scan)
+        if not (state.attrs.prediction.history.has_changes() or state.attrs.class_probs.history.has_changes()):
+            continue
+        # e.g. a Pending scan completed (or failed) by a background job
+        points, removed = changes.setdefault(scan.patient_id, ([], set()))
+        if _is_complete(scan.prediction):
+            points.append(_progression_point(
+                scan.id, scan.created_at, scan.class_probs, scan.prediction, scan.confidence
+            ))
+        else:
+            removed.add(scan.id)
+
+    if not changes:
+        return
+    connection = session.connection()
+    for patient_id, (points, removed) in changes.items():
+        _apply_progression(connection, patient_id, points, removed)
+
+
+event.listen(db.session, 'after_flush', update_progression)
+
+
+def patient_progression(patient_id):
+    """The patient's progression row, built from their scans first if they have none yet."""
+    row = db.session.get(PatientProgression, patient_id)
+    if row is None or row.series is None:
+        _apply_progression(db.session.connection(), patient_id, [], set())
+        db.session.commit()
+        row = db.session.get(PatientProgression, patient_id, populate_existing=True)
+    return row
+
+
 # ===== HELPER FUNCTIONS =====
 
+def encode_cursor(scan):
+    """Opaque cursor for the page after ``scan``."""
+    raw = f"{scan.created_at.isoformat()}|{scan.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    created_at, scan_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+    return datetime.fromisoformat(created_at), int(scan_id)
+
+
+def filter_scans(query, args):
+    """``query`` (ORM query or select) narrowed to ``args``' ``prediction`` (repeatable) and
+    ``date_from`` / ``date_to`` (YYYY-MM-DD, inclusive). Raises ValueError on bad dates."""
+    predictions = [p for p in args.getlist('prediction') if p]
+    if predictions:
+        query = query.filter(MRIScan.prediction.in_(predictions))
+    if args.get('date_from'):
+        query = query.filter(MRIScan.created_at >= datetime.strptime(args['date_from'], '%Y-%m-%d'))
+    if args.get('date_to'):
+        day_after = datetime.strptime(args['date_to'], '%Y-%m-%d') + timedelta(days=1)
+        query = query.filter(MRIScan.created_at < day_after)
+    return query
+
+
+def export_query(args, doctor_id=None):
+    """SELECT of the scans to export with their doctor and patient, in id order (see scan_export.py).
+
+    Filtered by ``doctor_id``, ``args``' ``patient_id`` and the ``filter_scans`` filters.
+    """
+    query = db.select(
+        MRIScan.id.label('scan_id'), MRIScan.created_at, MRIScan.doctor_id,
+        Doctor.fullname.label('doctor_name'), Doctor.hospital, MRIScan.patient_id,
+        Patient.fullname.label('patient_name'), Patient.age.label('patient_age'),
+        Patient.gender.label('patient_gender'), MRIScan.filename, MRIScan.prediction,
+        MRIScan.confidence, MRIScan.stage, MRIScan.model_version, MRIScan.class_probs
+    ).join(Doctor, Doctor.id == MRIScan.doctor_id).outerjoin(Patient, Patient.id == MRIScan.patient_id)
+    if doctor_id is not None:
+        query = query.filter(MRIScan.doctor_id == doctor_id)
+    if args.get('patient_id'):
+        query = query.filter(MRIScan.patient_id == int(args['patient_id']))
+    return filter_scans(query, args).order_by(MRIScan.id)
+
+
+def scan_page(query, args):
+    """One page of ``query``'s scans, newest first, filtered and keyset-paginated.
+
+    ``args`` (the request's query string) may carry ``prediction`` (repeatable),
+    ``date_from`` / ``date_to`` (YYYY-MM-DD, inclusive), ``limit`` and the
+    ``cursor`` returned with the previous page. Returns ``(scans, next_cursor)``;
+    ``next_cursor`` is None on the last page. Raises ValueError on bad input.
+    """
+    limit = min(max(int(args.get('limit', app.config['SCANS_PAGE_SIZE'])), 1),
+                app.config['SCANS_MAX_PAGE_SIZE'])
+
+    query = filter_scans(query, args)
+    if args.get('cursor'):
+        # Seek past the last row of the previous page instead of OFFSET
+        created_at, scan_id = decode_cursor(args['cursor'])
+        query = query.filter(or_(
+            MRIScan.created_at < created_at,
+            and_(MRIScan.created_at == created_at, MRIScan.id < scan_id)
+        ))
+
+    scans = query.order_by(MRIScan.created_at.desc(), MRIScan.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(scans[limit - 1]) if len(scans) > limit else None
+    return scans[:limit], next_cursor
+
+
 def allowed_file(filename):
+    if filename.lower().endswith('.nii.gz'):
+        return 'nii' in app.config['ALLOWED_EXTENSIONS']
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
 
+def build_scan(doctor_id, patient_id, filename, filepath, result):
+    """Create (but don't add) the MRIScan row for a successful prediction result."""
+    scan = MRIScan(
+        doctor_id=doctor_id,
+        patient_id=patient_id,
+        filename=filename,
+        filepath=filepath,
+        prediction=result['prediction'],
+        confidence=result['confidence'],
+        class_probs=class_probabilities(result),
+        model_version=result.get('model_version'),
+        ai_suggestions=get_ai_suggestions(result['prediction'])
+    )
+    attach_embedding(scan, result)
+    return scan
+
+
+def class_probabilities(result):
+    """The result's class probabilities as stored in MRIScan.class_probs (None if it has none)."""
+    classes = result.get('classes')
+    return progression.encode_probabilities(classes) if classes else None
+
+
+def attach_embedding(scan, result):
+    """Store the result's embedding (if the backend produced one) with ``scan``, in the same commit."""
+    embedding = result.get('embedding')
+    if embedding is not None:
+        scan.embedding = ScanEmbedding(
+            dim=len(embedding),
+            vector=encode_vector(embedding),
+            model_version=result.get('model_version') or model_version()
+        )
+
+
+def embedding_items(scans):
+    """``(scan_id, doctor_id, embedding)`` of flushed scans that carry an embedding."""
+    return [(scan.id, scan.doctor_id, decode_vector(scan.embedding.vector))
+            for scan in scans if scan.embedding is not None]
+
+
+def index_embeddings(items):
+    """Add committed scans' ``embedding_items`` to the similar-scan index.
+
+    A failure only costs search recall until the next start, which re-adds
+    every stored embedding the index is missing. Once the model was swapped
+    the index is rebuilt from the new model's embeddings instead.
+    """
+    if not items:
+        return
+    try:
+        version = model_version()
+        if similarity_index.model_version() not in (None, version):
+            start_index_sync()
+            return
+        similarity_index.add(items, model_version=version)
+    except Exception as e:
+        log.warning("⚠️ Similar-scan index update failed: %s", e)
+
+
+_index_sync_thread = None
+_index_sync_lock = threading.Lock()
+
+
+def start_index_sync():
+    """Run ``sync_similarity_index`` in the background, unless it is already running."""
+    global _index_sync_thread
+    with _index_sync_lock:
+        if _index_sync_thread is None or not _index_sync_thread.is_alive():
+            _index_sync_thread = threading.Thread(target=sync_similarity_index, name="similarity-index-sync",
+                                                  daemon=True)
+            _index_sync_thread.start()
+
+
+def sync_similarity_index(rebuild=False):
+    """Add stored embeddings of the current model missing from the index; returns how many were added.
+
+    The index is started afresh when ``rebuild`` is set or it holds another model's embeddings.
+    """
+    version = model_version()
+    if rebuild or similarity_index.model_version() not in (None, version):
+        similarity_index.reset()
+    with app.app_context():
+        indexed = set(similarity_index.scan_ids().tolist())
+        missing = [scan_id for (scan_id,) in db.session.query(ScanEmbedding.scan_id)
+                   .filter(ScanEmbedding.model_version == version) if scan_id not in indexed]
+        added = 0
+        for start in range(0, len(missing), 1000):
+            rows = (db.session.query(ScanEmbedding.scan_id, MRIScan.doctor_id, ScanEmbedding.vector)
+                    .join(MRIScan, MRIScan.id == ScanEmbedding.scan_id)
+                    .filter(ScanEmbedding.scan_id.in_(missing[start:start + 1000])))
+            added += similarity_index.add(
+                [(scan_id, doctor_id, decode_vector(vector)) for scan_id, doctor_id, vector in rows],
+                model_version=version
+            )
+        db.session.remove()
+    if added:
+        log.info("🧭 Added %d stored embedding(s) to the similar-scan index", added)
+    return added
+
+
+def discard_blobs(refs):
+    """Delete stored uploads that failed, unless a scan references the same content."""
+    refs = set(refs)
+    if refs:
+        refs -= {filepath for (filepath,) in db.session.query(MRIScan.filepath).filter(MRIScan.filepath.in_(refs))}
+    for ref in refs:
+        storage.delete(ref)
+
+
+def store_results(results, doctor_id, patient_id):
+    """Bulk-insert the scans for ``(filename, filepath, result)`` triples with one commit.
+
+    The blobs of failed results are discarded. Returns the report entries in the same order.
+    """
+    report, stored, failed = [], [], []
+    for filename, filepath, result in results:
+        entry = {'filename': filename, 'success': result['success']}
+        if result['success']:
+            entry['prediction'] = result['prediction']
+            entry['confidence'] = round(result['confidence'] * 100, 2)
+            if 'slices' in result:
+                entry['slices'] = result['slices']
+            stored.append((entry, build_scan(doctor_id, patient_id, filename, filepath, result)))
+        else:
+            entry['message'] = result['message']
+            failed.append(filepath)
+        report.append(entry)
+
+    db.session.add_all([scan for _, scan in stored])
+    db.session.flush()
+    # Read ids before commit expires the rows (avoids a SELECT per scan)
+    for entry, scan in stored:
+        entry['scan_id'] = scan.id
+    embeddings = embedding_items([scan for _, scan in stored])
+    db.session.commit()
+    index_embeddings(embeddings)
+    discard_blobs(failed)
+    return report
+
+
+def predict_and_store(items, doctor_id, patient_id, batch_size):
+    """Predict ``(filename, filepath)`` items in batches and bulk-insert the scans.
+
+    2D images stream through ``predict_alzheimer_batch`` and each chunk's scans
+    are inserted with a single commit. NIfTI volumes and DICOM files are set
+    aside and predicted afterwards as studies: one scan per .nii/.nii.gz file
+    and one per DICOM series (slices grouped by SeriesInstanceUID). Returns a
+    per-item report: images in input order, then studies.
+    """
+    filenames = deque()
+    nifti, dicom = [], []
+
+    def paths():
+        for filename, filepath in items:
+            lower = filename.lower()
+            if lower.endswith('.dcm'):
+                dicom.append((filename, filepath))
+            elif is_volume_path(lower):
+                nifti.append((filename, filepath))
+            else:
+                filenames.append(filename)
+                yield filepath
+
+    report = []
+    for chunk in predict_alzheimer_batch(paths(), batch_size=batch_size, cache=prediction_cache):
+        report.extend(store_results(
+            [(filenames.popleft(), filepath, result) for filepath, result in chunk],
+            doctor_id, patient_id
+        ))
+
+    studies = [(filename, filepath, filepath) for filename, filepath in nifti]
+    if dicom:
+        try:
+            series = group_dicom_series(dicom)
+        except Exception as e:
+            log.error("❌ DICOM header error: %s", e)
+            series = {}
+            report.extend({'filename': filename, 'success': False, 'message': str(e)}
+                          for filename, _ in dicom)
+            discard_blobs(filepath for _, filepath in dicom)
+        for slices in series.values():
+            # One scan per series, pointing at its first slice
+            filename, filepath = slices[0]
+            label = filename if len(slices) == 1 else f"{filename} (+{len(slices) - 1} slices)"
+            studies.append((label, filepath, [path for _, path in slices]))
+
+    for filename, filepath, source in studies:
+        result = predict_volume(source, batch_size=batch_size)
+        report.extend(store_results([(filename, filepath, result)], doctor_id, patient_id))
+        if not result['success'] and isinstance(source, list):
+            discard_blobs(source)  # the series' other slices
+    return report
+
+
+def run_async_prediction(filepath, tta=False):
+    """A job_queue job: predict a stored async upload, batched with concurrent requests.
+
+    The scan has already been accepted, so when the batch queue or inference pool
+    is full the job waits for room (up to INFERENCE_TIMEOUT) instead of failing.
+    """
+    deadline = time.monotonic() + app.config['INFERENCE_TIMEOUT']
+    while True:
+        try:
+            return predict_file(filepath, scheduler=batch_scheduler, cache=prediction_cache, tta=tta)
+        except InferenceBusy:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.5)
+        except (TimeoutError, FutureTimeoutError):  # the same class only from Python 3.11
+            return {'success': False, 'message': 'Prediction timed out'}
+
+
+def complete_scan(scan_id, result):
+    """Record a background job's result on its Pending scan."""
+    try:
+        _record_scan_result(scan_id, result)
+    finally:
+        with _claimed_lock:
+            _claimed_scans.discard(scan_id)
+
+
+def _record_scan_result(scan_id, result):
+    with app.app_context():
+        scan = db.session.get(MRIScan, scan_id)
+        if scan is None or scan.prediction != 'Pending':
+            return  # deleted, or finished by a process that took over its lapsed lease
+        embeddings = []
+        if result['success']:
+            scan.prediction = result['prediction']
+            scan.confidence = result['confidence']
+            scan.class_probs = class_probabilities(result)
+            scan.model_version = result.get('model_version')
+            scan.ai_suggestions = get_ai_suggestions(result['prediction'])
+            attach_embedding(scan, result)
+            embeddings = embedding_items([scan])
+        else:
+            log.error("❌ Scan %s failed: %s", scan_id, result['message'])
+            scan.prediction = 'Failed'
+        db.session.commit()
+        index_embeddings(embeddings)
+
+
+# Pending scans this process is predicting; their leases (MRIScan.claimed_at) are renewed
+# every PENDING_LEASE_SECONDS / 3, so a scan whose process died is taken over by another
+_claimed_scans = set()
+_claimed_lock = threading.Lock()
+_lease_thread = None
+_lease_stop = threading.Event()
+
+
+def enqueue_scan(scan_id, filepath, tta=False):
+    """Predict a Pending scan claimed by this process on job_queue; ``filepath`` is its storage ref."""
+    with _claimed_lock:
+        _claimed_scans.add(scan_id)
+    job_queue.enqueue(scan_id, storage.local_path(filepath), tta=tta)
+
+
+def renew_scan_leases():
+    """Renew this process's leases and take over Pending scans whose lease lapsed; returns how many."""
+    now = datetime.utcnow()
+    lapsed = or_(MRIScan.claimed_at.is_(None),
+                 MRIScan.claimed_at < now - timedelta(seconds=app.config['PENDING_LEASE_SECONDS']))
+    with _claimed_lock:
+        claimed = sorted(_claimed_scans)
+    with app.app_context():
+        for start in range(0, len(claimed), 500):
+            (MRIScan.query.filter(MRIScan.id.in_(claimed[start:start + 500]), MRIScan.prediction == 'Pending')
+             .update({MRIScan.claimed_at: now}, synchronize_session=False))
+        db.session.commit()
+
+        stale = [scan_id for (scan_id,) in db.session.query(MRIScan.id)
+                 .filter(MRIScan.prediction == 'Pending', lapsed).order_by(MRIScan.id)
+                 if scan_id not in claimed]
+        taken = []
+        for scan_id in stale:
+            # Conditional update: of several processes seeing the same lapsed lease, one claims it
+            won = (MRIScan.query.filter(MRIScan.id == scan_id, MRIScan.prediction == 'Pending', lapsed)
+                   .update({MRIScan.claimed_at: now}, synchronize_session=False))
+            db.session.commit()
+            if won:
+                scan = db.session.get(MRIScan, scan_id)
+                enqueue_scan(scan.id, scan.filepath, tta=bool(scan.tta))
+                taken.append(scan_id)
+        if taken:
+            log.info("🔁 Took over %d pending scan(s)", len(taken))
+    return len(taken)
+
+
+def _lease_loop():
+    while True:
+        try:
+            renew_scan_leases()
+        except Exception as e:
+            log.error("❌ Pending scan lease error: %s", e)
+        if _lease_stop.wait(app.config['PENDING_LEASE_SECONDS'] / 3):
+            return
+
+
+def start_scan_leases():
+    """Run the lease loop in the background, unless it is already running."""
+    global _lease_thread
+    with _claimed_lock:
+        if _lease_thread is None or not _lease_thread.is_alive():
+            _lease_stop.clear()
+            _lease_thread = threading.Thread(target=_lease_loop, name="scan-leases", daemon=True)
+            _lease_thread.start()
+
+
+def clear_pending_explanations():
+    """Forget unfinished explanations of a previous run; explanations are lazy, the next view starts them again."""
+    with app.app_context():
+        ScanExplanation.query.filter_by(status='pending').delete()
+        db.session.commit()
+
+
+def complete_explanation(scan_id, result):
+    """Store a Grad-CAM job's overlay (or its failure) on the scan's explanation row."""
+    with app.app_context():
+        explanation = db.session.get(ScanExplanation, scan_id)
+        if explanation is None:
+            return
+        if result['success']:
+            explanation.status = 'ready'
+            explanation.class_name = result['class_name']
+            explanation.overlay = result['overlay']
+            explanation.model_version = result['model_version']
+            explanation.error = None
+        else:
+            log.error("❌ Explanation for scan %s failed: %s", scan_id, result['message'])
+            explanation.status = 'failed'
+            explanation.error = result['message']
+        db.session.commit()
+
+
+def request_explanation(scan, explanation=None):
+    """Queue Grad-CAM for ``scan``, (re)setting its explanation row to pending."""
+    if explanation is None:
+        explanation = ScanExplanation(scan_id=scan.id)
+        db.session.add(explanation)
+    explanation.status = 'pending'
+    explanation.error = None
+    explanation.created_at = datetime.utcnow()
+    db.session.commit()
+    explanation_queue.enqueue(scan.id, storage.local_path(scan.filepath), scan.prediction, scan.model_version)
+
+
+def iter_uploaded_images(files, storage):
+    """Store uploaded images (and the members of .zip/.tar archives) in ``storage``.
+
+    Yields ``(filename, filepath)`` as each image is stored so prediction can
+    start before the whole upload has been unpacked; ``filepath`` is the
+    storage reference.
+    """
+    for file in files:
+        name = file.filename or ''
+        lower = name.lower()
+        if lower.endswith('.zip'):
+            with zipfile.ZipFile(file.stream) as archive:
+                for member in archive.infolist():
+                    if member.is_dir() or not allowed_file(member.filename):
+                        continue
+                    filename = secure_filename(member.filename)
+                    with archive.open(member) as src:
+                        yield filename, storage.put_stream(src, blob_suffix(filename))
+        elif lower.endswith(('.tar', '.tar.gz', '.tgz')):
+            with tarfile.open(fileobj=file.stream, mode='r|*') as archive:
+                for member in archive:
+                    if not member.isfile() or not allowed_file(member.name):
+                        continue
+                    filename = secure_filename(member.name)
+                    yield filename, storage.put_stream(archive.extractfile(member), blob_suffix(filename))
+        elif allowed_file(name):
+            filename = secure_filename(name)
+            yield filename, storage.put_stream(file.stream, blob_suffix(filename))
+
+
 # ===== SERVE HTML PAGES =====
 @app.route('/')
 def index():
@@ -210,6 +1199,9 @@ def doctor_register():
         
         return jsonify({'success': True, 'message': 'Doctor registered successfully'}), 201
     
+    except HashingBusy as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)}), 500
@@ -246,6 +1238,9 @@ def patient_register():
         
         return jsonify({'success': True, 'message': 'Patient registered successfully'}), 201
     
+    except HashingBusy as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)}), 500
@@ -266,18 +1261,24 @@ def doctor_login():
         
         if not doctor or not doctor.check_password(data['password']):
             return jsonify({'success': False, 'message': 'Invalid email or password'}), 401
+        if db.session.is_modified(doctor):
+            db.session.commit()  # rehashed with the current PASSWORD_HASH_METHOD
         
-        # Set session
+        # Set session; the profile is kept in it so dashboards don't look the doctor up again
+        renew_session_id()
         session['doctor_id'] = doctor.id
         session['doctor_name'] = doctor.fullname
+        session['doctor'] = doctor.to_dict()
         session.permanent = True
         
         return jsonify({
             'success': True,
             'message': 'Login successful',
-            'doctor': doctor.to_dict()
+            'doctor': session['doctor']
         }), 200
     
+    except HashingBusy as e:
+        return jsonify({'success': False, 'message': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
@@ -297,22 +1298,37 @@ def patient_login():
         
         if not patient or not patient.check_password(data['password']):
             return jsonify({'success': False, 'message': 'Invalid email or password'}), 401
+        if db.session.is_modified(patient):
+            db.session.commit()  # rehashed with the current PASSWORD_HASH_METHOD
         
-        # Set session
+        # Set session; the profile is kept in it so dashboards don't look the patient up again
+        renew_session_id()
         session['patient_id'] = patient.id
         session['patient_name'] = patient.fullname
+        session['patient'] = patient.to_dict()
         session.permanent = True
         
         return jsonify({
             'success': True,
             'message': 'Login successful',
-            'patient': patient.to_dict()
+            'patient': session['patient']
         }), 200
     
+    except HashingBusy as e:
+        return jsonify({'success': False, 'message': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+def session_profile(role, model):
+    """The logged-in doctor's / patient's profile, cached in the session at login."""
+    profile = session.get(role)
+    if profile is None:
+        # Logged in before profiles were cached in the session
+        profile = session[role] = db.session.get(model, session[f'{role}_id']).to_dict()
+    return profile
+
+
 # ===== LOGOUT =====
 @app.route('/api/logout', methods=['POST'])
 def logout():
@@ -327,14 +1343,16 @@ def doctor_dashboard():
         return jsonify({'success': False, 'message': 'Unauthorized'}), 401
     
     try:
-        doctor = Doctor.query.get(session['doctor_id'])
-        scans = MRIScan.query.filter_by(doctor_id=doctor.id).all()
+        scans, next_cursor = scan_page(MRIScan.query.filter_by(doctor_id=session['doctor_id']), request.args)
         
         return jsonify({
             'success': True,
-            'doctor': doctor.to_dict(),
-            'scans': [scan.to_dict() for scan in scans]
+            'doctor': session_profile('doctor', Doctor),
+            'scans': [scan.to_dict() for scan in scans],
+            'next_cursor': next_cursor
         }), 200
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid filter or cursor'}), 400
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
@@ -342,11 +1360,7 @@ def doctor_dashboard():
 # ===== MRI UPLOAD & PREDICTION =====
 @app.route('/api/predict-mri', methods=['POST'])
 def predict_mri():
-    print("=== /api/predict-mri ===")
-    print("Files:", request.files)
-    print("Form:", request.form)
-    print("Keys in request.files:", list(request.files.keys()))
-    print("Keys in request.form:", list(request.form.keys()))
+    log.debug("predict-mri files=%s form=%s", list(request.files.keys()), list(request.form.keys()))
     if 'doctor_id' not in session:
         return jsonify({'success': False, 'message': 'Unauthorized'}), 401
     
@@ -366,17 +1380,57 @@ def predict_mri():
         if not patient:
             return jsonify({'success': False, 'message': 'Patient not found'}), 400
         
-        # Save file
         filename = secure_filename(file.filename)  # Original extension keep chestundi
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        suffix = blob_suffix(filename)
+        
+        # High-confidence mode: augmented views (and ensemble checkpoints) averaged in one batch
+        tta = request.form.get('tta', 'false').lower() in ('1', 'true', 'yes')
+        
+        # Async mode: store a Pending scan claimed by this process, predict on a job thread, client polls /api/scans/<id>
+        async_flag = request.form.get('async', str(app.config['ASYNC_PREDICTIONS']))
+        if async_flag.lower() in ('1', 'true', 'yes'):
+            with timed('upload_read'):
+                filepath = storage.put_stream(file.stream, suffix)  # the job reads it from storage
+            scan = MRIScan(
+                doctor_id=session['doctor_id'],
+                patient_id=patient.id,
+                filename=filename,
+                filepath=filepath,
+                tta=tta,
+                claimed_at=datetime.utcnow()
+            )
+            db.session.add(scan)
+            db.session.commit()
+            enqueue_scan(scan.id, filepath, tta=tta)
+            
+            return jsonify({
+                'success': True,
+                'status': scan.status,
+                'scan_id': scan.id
+            }), 202
         
         # Predict
-        result = predict_alzheimer(filepath)
+        data = None
+        if is_volume_path(filename):
+            # The DICOM / NIfTI readers work on files
+            with timed('upload_read'):
+                filepath = storage.put_stream(file.stream, suffix)
+            result = predict_file(storage.local_path(filepath))
+        else:
+            # Decode straight from the request body, hashing it as it is read
+            with timed('upload_read'):
+                data, digest = read_upload(file.stream)
+            content_key = prediction_cache.content_key(digest) if prediction_cache is not None else None
+            result = predict_alzheimer(data, scheduler=batch_scheduler, cache=prediction_cache,
+                                       content_key=content_key, tta=tta)
         
         if not result['success']:
             return jsonify(result), 400
         
+        # Keep the original only for successful scans, written in the background
+        if data is not None:
+            filepath = upload_writer.save(data, suffix, digest)
+        
         # Get suggestions
         suggestions = get_ai_suggestions(result['prediction'])
         
@@ -388,25 +1442,319 @@ def predict_mri():
             filepath=filepath,
             prediction=result['prediction'],
             confidence=result['confidence'],
+            class_probs=class_probabilities(result),
+            model_version=result.get('model_version'),
             ai_suggestions=suggestions
         )
+        attach_embedding(scan, result)
         db.session.add(scan)
+        db.session.flush()
+        embeddings = embedding_items([scan])
         db.session.commit()
+        index_embeddings(embeddings)
         
-        return jsonify({
+        response = {
             'success': True,
             'prediction': result['prediction'],
             'confidence': round(result['confidence'] * 100, 2),
             'classes': result['classes'],
             'suggestions': suggestions,
+            'model_version': scan.model_version,
             'scan_id': scan.id
-        }), 200
+        }
+        if 'tta' in result:
+            response['tta'] = result['tta']
+        return jsonify(response), 200
     
+    except InferenceBusy as e:
+        return jsonify({'success': False, 'message': f'Server busy, try again shortly: {e}'}), 503, {'Retry-After': '5'}
+    except (TimeoutError, FutureTimeoutError):
+        return jsonify({'success': False, 'message': 'Prediction timed out'}), 504
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+# ===== BATCH MRI UPLOAD & PREDICTION =====
+@app.route('/api/predict-mri-batch', methods=['POST'])
+def predict_mri_batch():
+    if 'doctor_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+
+    try:
+        # Many images under mri_files, and/or .zip/.tar archives of a whole study
+        files = request.files.getlist('mri_files')
+        if not files:
+            return jsonify({'success': False, 'message': 'No files uploaded'}), 400
+
+        patient_email = request.form.get('patient_email')
+        if not patient_email:
+            return jsonify({'success': False, 'message': 'Patient email required'}), 400
+
+        # Find patient once for the whole study
+        patient = Patient.query.filter_by(email=patient_email).first()
+        if not patient:
+            return jsonify({'success': False, 'message': 'Patient not found'}), 400
+
+        report = predict_and_store(
+            iter_uploaded_images(files, storage),
+            doctor_id=session['doctor_id'],
+            patient_id=patient.id,
+            batch_size=app.config['BATCH_PREDICT_SIZE']
+        )
+        if not report:
+            return jsonify({'success': False, 'message': 'No supported images found'}), 400
+
+        succeeded = sum(1 for entry in report if entry['success'])
+        return jsonify({
+            'success': True,
+            'total': len(report),
+            'succeeded': succeeded,
+            'failed': len(report) - succeeded,
+            'results': report
+        }), 200
+
+    except (zipfile.BadZipFile, tarfile.TarError) as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'Invalid archive: {e}'}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+# ===== SCAN SUMMARY =====
+@app.route('/api/summary', methods=['GET'])
+def summary():
+    """Dashboard header totals for the logged-in doctor or patient."""
+    if 'doctor_id' in session:
+        owner_type, owner_id = 'doctor', session['doctor_id']
+    elif 'patient_id' in session:
+        owner_type, owner_id = 'patient', session['patient_id']
+    else:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+
+    try:
+        days = min(max(int(request.args.get('days', app.config['SUMMARY_DAYS'])), 1), 366)
+        return jsonify({'success': True, **scan_summary(owner_type, owner_id, days)}), 200
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid days'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+# ===== SCAN LIST =====
+@app.route('/api/scans', methods=['GET'])
+def list_scans():
+    """Further pages of the logged-in doctor's or patient's scans (see scan_page for parameters)."""
+    if 'doctor_id' in session:
+        query = MRIScan.query.filter_by(doctor_id=session['doctor_id'])
+    elif 'patient_id' in session:
+        query = MRIScan.query.filter_by(patient_id=session['patient_id'])
+    else:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+
+    try:
+        scans, next_cursor = scan_page(query, request.args)
+        return jsonify({
+            'success': True,
+            'scans': [scan.to_dict() for scan in scans],
+            'next_cursor': next_cursor
+        }), 200
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid filter or cursor'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+# ===== SCAN STATUS =====
+@app.route('/api/scans/<int:scan_id>', methods=['GET'])
+def scan_status(scan_id):
+    if 'doctor_id' not in session and 'patient_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+
+    try:
+        scan = db.session.get(MRIScan, scan_id)
+        if scan is None or (
+            scan.doctor_id != session.get('doctor_id') and scan.patient_id != session.get('patient_id')
+        ):
+            return jsonify({'success': False, 'message': 'Scan not found'}), 404
+
+        response = {'success': True, 'scan_id': scan.id, 'status': scan.status, 'scan': scan.to_dict()}
+        if scan.status == 'complete':
+            response.update(
+                prediction=scan.prediction,
+                confidence=round(scan.confidence * 100, 2),
+                suggestions=scan.ai_suggestions
+            )
+        return jsonify(response), 200
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@app.route('/api/scans/<int:scan_id>/explanation', methods=['GET'])
+def scan_explanation(scan_id):
+    """Grad-CAM overlay (image/jpeg) of a completed scan; 202 while it is being generated."""
+    if 'doctor_id' not in session and 'patient_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+
+    try:
+        scan = db.session.get(MRIScan, scan_id)
+        if scan is None or (
+            scan.doctor_id != session.get('doctor_id') and scan.patient_id != session.get('patient_id')
+        ):
+            return jsonify({'success': False, 'message': 'Scan not found'}), 404
+        if scan.status != 'complete':
+            return jsonify({'success': False, 'message': 'Scan has no prediction yet'}), 409
+
+        explanation = db.session.get(ScanExplanation, scan_id)
+        if explanation is not None and explanation.status == 'ready':
+            if explanation.model_version == gradcam_model_version(scan.model_version):
+                return app.response_class(explanation.overlay, mimetype='image/jpeg', headers={
+                    'Cache-Control': 'private, max-age=3600',
+                    'X-Explained-Class': explanation.class_name,
+                })
+            request_explanation(scan, explanation)  # the explaining model was replaced since
+        elif explanation is not None and explanation.status == 'failed' and not request.args.get('retry'):
+            return jsonify({'success': False, 'status': 'failed', 'message': explanation.error}), 500
+        elif explanation is None or explanation.status == 'failed':
+            # First view (or ?retry=1 after a failure): generate in the background
+            try:
+                request_explanation(scan, explanation)
+            except IntegrityError:
+                db.session.rollback()  # another request started it first
+        return jsonify({'success': True, 'status': 'pending'}), 202
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@app.route('/api/scans/<int:scan_id>/similar', methods=['GET'])
+def similar_scans(scan_id):
+    """The doctor's other scans whose images are closest to this one's, most similar first (?k=)."""
+    if 'doctor_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+
+    try:
+        k = int(request.args.get('k', app.config['SIMILAR_SCANS_K']))
+        if not 1 <= k <= app.config['SIMILAR_SCANS_MAX_K']:
+            raise ValueError(k)
+    except ValueError:
+        return jsonify({'success': False, 'message': f"k must be between 1 and {app.config['SIMILAR_SCANS_MAX_K']}"}), 400
+
+    try:
+        scan = db.session.get(MRIScan, scan_id)
+        if scan is None or scan.doctor_id != session['doctor_id']:
+            return jsonify({'success': False, 'message': 'Scan not found'}), 404
+        embedding = scan.embedding
+        if embedding is None or embedding.model_version != model_version():
+            return jsonify({'success': False, 'message': 'Scan has no embedding from the current model'}), 409
+
+        with timed('similar_search'):
+            matches = similarity_index.search(
+                decode_vector(embedding.vector), k, owner=scan.doctor_id, exclude=scan.id
+            )
+        # The index may still hold scans deleted since
+        found = {s.id: s for s in MRIScan.query.filter(
+            MRIScan.id.in_([match_id for match_id, _ in matches]), MRIScan.doctor_id == scan.doctor_id
+        )} if matches else {}
+        similar = [
+            dict(found[match_id].to_dict(), similarity=round(score, 4))
+            for match_id, score in matches if match_id in found
+        ]
+        return jsonify({'success': True, 'scan_id': scan.id, 'similar': similar}), 200
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+# ===== EXPORT =====
+@app.route('/api/export', methods=['GET'])
+def export_scans():
+    """Stream the doctor's scans as ?format=csv|ndjson|parquet (filters as for /api/scans, plus patient_id)."""
+    if 'doctor_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+
+    fmt = request.args.get('format', 'csv')
+    try:
+        scan_export.check_format(fmt)
+        statement = export_query(request.args, doctor_id=session['doctor_id'])
+    except ImportError as e:
+        return jsonify({'success': False, 'message': str(e)}), 501
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Invalid format or filter: {e}'}), 400
+
+    mimetype, extension = scan_export.FORMATS[fmt]
+    chunks = scan_export.iter_chunks(db.engine, statement, app.config['EXPORT_CHUNK_SIZE'])
+    filename = f"scans-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{extension}"
+    return Response(
+        stream_with_context(scan_export.export_stream(fmt, chunks)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+
+# ===== PREDICTION CACHE STATS =====
+@app.route('/api/prediction-cache', methods=['GET'])
+def prediction_cache_stats():
+    if 'doctor_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    if prediction_cache is None:
+        return jsonify({'success': True, 'enabled': False}), 200
+    return jsonify({'success': True, 'enabled': True, **prediction_cache.stats()}), 200
+
+
+@app.route('/api/inference', methods=['GET'])
+def inference_stats():
+    # Batching and (when enabled) inference process pool counters
+    if 'doctor_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    stats = {'success': True, 'batching': batch_scheduler.stats()}
+    if inference_pool is not None:
+        stats['pool'] = inference_pool.stats()
+    stats['similarity_index'] = similarity_index.stats()
+    return jsonify(stats), 200
+
+
+@app.route('/api/models', methods=['GET'])
+def model_versions():
+    # Model registry: the version being served, the shadow candidate and its agreement so far
+    if 'doctor_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    try:
+        return jsonify({
+            'success': True,
+            'serving': get_model_status(),
+            'registry': model_registry.state(),
+            'versions': model_registry.versions(),
+            'shadow': shadow_stats.summary(),
+        }), 200
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+# ===== METRICS =====
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def observe_request(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        REQUEST_SECONDS.labels(endpoint, request.method, response.status_code).observe(
+            time.perf_counter() - started
+        )
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    # Prometheus text format (all gunicorn workers when PROMETHEUS_MULTIPROC_DIR is set)
+    body, content_type = render_metrics()
+    return body, 200, {'Content-Type': content_type}
+
+
 # ===== PATIENT DASHBOARD =====
 @app.route('/api/patient-dashboard', methods=['GET'])
 def patient_dashboard():
@@ -414,13 +1762,42 @@ def patient_dashboard():
         return jsonify({'success': False, 'message': 'Unauthorized'}), 401
     
     try:
-        patient = Patient.query.get(session['patient_id'])
-        scans = MRIScan.query.filter_by(patient_id=patient.id).all()
+        scans, next_cursor = scan_page(MRIScan.query.filter_by(patient_id=session['patient_id']), request.args)
         
         return jsonify({
             'success': True,
-            'patient': patient.to_dict(),
-            'scans': [scan.to_dict() for scan in scans]
+            'patient': session_profile('patient', Patient),
+            'scans': [scan.to_dict() for scan in scans],
+            'next_cursor': next_cursor,
+            'progression': patient_progression(session['patient_id']).to_dict()
+        }), 200
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid filter or cursor'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@app.route('/api/patients/<int:patient_id>/progression', methods=['GET'])
+def patient_progression_view(patient_id):
+    """A patient's stage, trend, stage changes and probability series, for the patient or their doctors."""
+    if 'doctor_id' not in session and 'patient_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+
+    try:
+        if 'doctor_id' in session:
+            # Doctors see patients they have scanned
+            allowed = db.session.query(MRIScan.id).filter_by(
+                doctor_id=session['doctor_id'], patient_id=patient_id
+            ).first() is not None
+        else:
+            allowed = session['patient_id'] == patient_id
+        if not allowed:
+            return jsonify({'success': False, 'message': 'Patient not found'}), 404
+
+        return jsonify({
+            'success': True,
+            'patient_id': patient_id,
+            'progression': patient_progression(patient_id).to_dict()
         }), 200
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
@@ -437,6 +1814,20 @@ def check_session():
     }), 200
 
 
+# ===== HEALTH / READINESS =====
+@app.route('/api/health', methods=['GET'])
+def health():
+    # Liveness: the web process is up (the model may still be loading)
+    return jsonify({'success': True, 'status': 'ok'}), 200
+
+
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    # Readiness: route prediction traffic here only once the model is warm
+    status = get_model_status()
+    return jsonify({'success': status['ready'], 'model': status}), 200 if status['ready'] else 503
+
+
 # ===== ERROR HANDLERS =====
 @app.errorhandler(404)
 def not_found(error):
@@ -451,10 +1842,46 @@ def server_error(error):
 # ===== CREATE DATABASE =====
 def init_db():
     with app.app_context():
-        db.create_all()
-        print("✅ Database initialized successfully!")
+        # The schema is owned by migrations.py (works on databases made by the old create_all too)
+        migrations.upgrade(db.engine)
+        log.info("✅ Database initialized successfully!")
+
+
+# ===== SERVING PROCESS LIFECYCLE =====
+# Used by the dev server below and by the gunicorn hooks in gunicorn.conf.py
+
+def start_worker(resume_jobs=True):
+    """Per-process startup of a serving process: warm the model and take part in Pending scan leases.
+
+    With ``resume_jobs`` (one process per deployment) it also forgets unfinished explanations
+    and brings the similar-scan index up to date, in the background.
+    """
+    if inference_pool is not None:
+        inference_pool.start()
+    elif app.config['MODEL_WARMUP']:
+        start_background_warmup()
+    if resume_jobs:
+        clear_pending_explanations()
+        start_index_sync()
+    start_scan_leases()
+
+
+def stop_worker():
+    """Let a serving process finish its background work before it exits."""
+    _lease_stop.set()  # take over no more scans
+    if _lease_thread is not None:
+        _lease_thread.join()
+    job_queue.shutdown(wait=True)  # its jobs still need the scheduler and pool
+    batch_scheduler.stop()
+    if inference_pool is not None:
+        inference_pool.stop()
+    upload_writer.flush()
+    explanation_queue.shutdown(wait=True)
 
 
 if __name__ == '__main__':
     init_db()
+    # Only the reloader's serving child warms the model and resumes jobs, not the file-watching parent
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_worker()
     app.run(debug=True, host='0.0.0.0', port=5000)
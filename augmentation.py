@@ -0,0 +1,49 @@
+import numpy as np
+
+# Views predicted in test-time augmentation mode, in order; "identity" is the plain prediction
+TTA_VIEWS = ("identity", "hflip", "crop", "bright", "dark")
+
+
+def _crop_index(size, fraction):
+    """Source row/column for each output pixel when zooming into the central ``fraction``."""
+    crop = size * fraction
+    offset = (size - crop) / 2.0
+    return np.clip((offset + (np.arange(size) + 0.5) * crop / size).astype(np.intp), 0, size - 1)
+
+
+def tta_batch(image, views=TTA_VIEWS, crop_fraction=0.9, jitter=0.1, out=None):
+    """Stack augmented copies of one preprocessed ``(224, 224, 3)`` image into a ``(len(views), 224, 224, 3)`` batch.
+
+    Views: ``identity``; ``hflip`` (left/right mirror, the hemispheres are
+    near-symmetric); ``crop`` (zoom into the central ``crop_fraction``,
+    nearest-neighbour); ``bright`` / ``dark`` (intensity scaled by
+    1 +/- ``jitter``, clipped to 0..255). Every view is a numpy copy or gather,
+    so building the batch costs far less than one forward pass.
+    """
+    if out is None:
+        out = np.empty((len(views),) + image.shape, dtype=np.float32)
+    for i, view in enumerate(views):
+        if view == "identity":
+            out[i] = image
+        elif view == "hflip":
+            out[i] = image[:, ::-1]
+        elif view == "crop":
+            rows = _crop_index(image.shape[0], crop_fraction)
+            cols = _crop_index(image.shape[1], crop_fraction)
+            out[i] = image[np.ix_(rows, cols)]
+        elif view in ("bright", "dark"):
+            scale = 1.0 + jitter if view == "bright" else 1.0 - jitter
+            np.multiply(image, scale, out=out[i])
+            np.clip(out[i], 0.0, 255.0, out=out[i])
+        else:
+            raise ValueError(f"Unknown TTA view: {view!r}")
+    return out
+
+
+def parse_views(spec):
+    """``"identity,hflip,crop"`` -> a tuple of view names, validated against ``TTA_VIEWS``."""
+    views = tuple(v.strip() for v in spec.split(",") if v.strip())
+    unknown = [v for v in views if v not in TTA_VIEWS]
+    if unknown or not views:
+        raise ValueError(f"TTA views must be a comma-separated subset of {', '.join(TTA_VIEWS)}")
+    return views
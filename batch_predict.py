@@ -0,0 +1,86 @@
+"""Predict every MRI image in a directory and store the scans in bulk.
+
+    python batch_predict.py scans/ --doctor-email dr@example.com \
+        --patient-email patient@example.com --batch-size 32 --report report.csv
+
+Images are streamed from the directory into upload storage (the scans point at
+the stored copies, as for web uploads), predicted one batch at a time and each
+batch's MRIScan rows are inserted with a single commit. A per-image report is
+written as CSV (to stdout unless --report is given).
+"""
+import argparse
+import csv
+import os
+import sys
+
+import migrations
+from app import app, db, storage, Doctor, Patient, allowed_file, predict_and_store
+from storage import blob_suffix
+
+REPORT_FIELDS = ['filename', 'success', 'prediction', 'confidence', 'slices', 'scan_id', 'message']
+
+
+def iter_directory_images(directory, recursive=False, root=None):
+    """Yield ``(filename, filepath)`` for supported images without listing the whole tree up front."""
+    root = root or directory
+    for entry in sorted(os.scandir(directory), key=lambda e: e.name):
+        if entry.is_dir():
+            if recursive:
+                yield from iter_directory_images(entry.path, recursive=True, root=root)
+        elif allowed_file(entry.name):
+            yield os.path.relpath(entry.path, root), os.path.abspath(entry.path)
+
+
+def store_images(items, storage):
+    """Copy ``(filename, filepath)`` items into ``storage``, yielding ``(filename, reference)``."""
+    for filename, filepath in items:
+        with open(filepath, 'rb') as f:
+            yield filename, storage.put_stream(f, blob_suffix(filename))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Batch MRI prediction')
+    parser.add_argument('directory', help='Directory containing MRI images')
+    parser.add_argument('--doctor-email', required=True, help='Doctor the scans are recorded under')
+    parser.add_argument('--patient-email', required=True, help='Patient the scans belong to')
+    parser.add_argument('--batch-size', type=int, default=app.config['BATCH_PREDICT_SIZE'])
+    parser.add_argument('--recursive', action='store_true', help='Include sub-directories')
+    parser.add_argument('--report', help='Write the CSV report here instead of stdout')
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.directory):
+        parser.error(f'Not a directory: {args.directory}')
+
+    with app.app_context():
+        migrations.upgrade(db.engine)
+
+        doctor = Doctor.query.filter_by(email=args.doctor_email).first()
+        if not doctor:
+            parser.error(f'Doctor not found: {args.doctor_email}')
+        patient = Patient.query.filter_by(email=args.patient_email).first()
+        if not patient:
+            parser.error(f'Patient not found: {args.patient_email}')
+
+        report = predict_and_store(
+            store_images(iter_directory_images(args.directory, recursive=args.recursive), storage),
+            doctor_id=doctor.id,
+            patient_id=patient.id,
+            batch_size=args.batch_size
+        )
+
+    out = open(args.report, 'w', newline='') if args.report else sys.stdout
+    try:
+        writer = csv.DictWriter(out, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        writer.writerows(report)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    succeeded = sum(1 for entry in report if entry['success'])
+    print(f'✅ {succeeded}/{len(report)} scans predicted and stored', file=sys.stderr)
+    return 0 if succeeded == len(report) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,128 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from observability import INFERENCE_WORKER_EVENTS, QUEUE_DEPTH
+
+
+class InferenceBusy(RuntimeError):
+    """Too many images are already waiting for the model; the caller should retry later."""
+
+
+class BatchScheduler:
+    """Collects concurrently submitted images into batches for a single forward pass.
+
+    Request threads call ``submit`` with one preprocessed (224, 224, 3) image and
+    block until its probabilities are ready. A background thread takes the first
+    waiting image, keeps collecting until ``max_batch_size`` images are queued or
+    ``max_wait_ms`` has passed, runs ``predict_fn`` once on the stacked batch and
+    hands each row back to the request that submitted it.
+
+    With ``workers`` > 1 that many batches can be in flight at once (e.g. one
+    per inference process). With ``max_queue_size`` set, ``submit`` raises
+    ``InferenceBusy`` instead of queueing behind that many waiting images.
+    """
+
+    _STOP = object()
+
+    def __init__(self, predict_fn, max_batch_size=8, max_wait_ms=5, timeout=60, workers=1,
+                 max_queue_size=0):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_ms = max(0.0, float(max_wait_ms))
+        self.timeout = timeout
+        self.workers = max(1, int(workers))
+
+        self._queue = queue.Queue(maxsize=max(0, int(max_queue_size)))
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+        self.batches_run = 0
+        self.images_run = 0
+
+    def start(self):
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, name="batch-scheduler", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        with self._lock:
+            threads = [t for t in self._threads if t.is_alive()]
+            for _ in threads:
+                self._queue.put(self._STOP)
+            for thread in threads:
+                thread.join()
+            self._threads = []
+
+    def submit(self, image, timeout=None):
+        """Queue one image and wait for its row of class probabilities."""
+        self.start()
+        future = Future()
+        try:
+            self._queue.put_nowait((image, future))
+        except queue.Full:
+            INFERENCE_WORKER_EVENTS.labels("rejected").inc()
+            raise InferenceBusy(f"{self._queue.qsize()} images are already waiting for the model")
+        QUEUE_DEPTH.set(self._queue.qsize())
+        return future.result(timeout=timeout or self.timeout)
+
+    def stats(self):
+        return {
+            "batches_run": self.batches_run,
+            "images_run": self.images_run,
+            "mean_batch_size": (
+                self.images_run / self.batches_run if self.batches_run else 0.0
+            ),
+            "queue_depth": self._queue.qsize(),
+        }
+
+    def _collect(self):
+        """Next batch of queued items, and whether this runner was told to stop."""
+        first = self._queue.get()
+        if first is self._STOP:
+            return [], True
+
+        items = [first]
+        deadline = time.monotonic() + self.max_wait_ms / 1000.0
+        while len(items) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                # Anything already queued is taken without waiting
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is self._STOP:
+                # Run what was collected, then stop (re-queueing could block on a full queue)
+                return items, True
+            items.append(item)
+        QUEUE_DEPTH.set(self._queue.qsize())
+        return items, False
+
+    def _run(self):
+        stopped = False
+        while not stopped:
+            items, stopped = self._collect()
+            if not items:
+                continue
+
+            futures = [future for _, future in items]
+            try:
+                batch = np.stack([image for image, _ in items])
+                probs = self.predict_fn(batch)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            with self._stats_lock:
+                self.batches_run += 1
+                self.images_run += len(items)
+            for future, row in zip(futures, probs):
+                future.set_result(row)
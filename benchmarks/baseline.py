@@ -0,0 +1,70 @@
+"""Stored benchmark baselines and regression checks.
+
+Results are ``{benchmark: {metric: value}}``. Metrics ending in ``_ms`` are
+latencies (lower is better), ``per_s`` is throughput (higher is better) and
+``errors`` counts failed requests; anything else is reported but not checked.
+"""
+import json
+import os
+import platform
+
+BASELINE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def environment(**extra):
+    """What the numbers depend on, stored with the baseline so mismatches can be flagged."""
+    return {"cpus": os.cpu_count(), "machine": platform.machine(), "python": platform.python_version(), **extra}
+
+
+def save_baseline(path, results, env):
+    with open(path, "w") as f:
+        json.dump({"environment": env, "results": results}, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def regressions(results, baseline, tolerance):
+    """Human-readable lines for every metric worse than ``baseline`` by more than ``tolerance`` (a fraction)."""
+    found = []
+    for name, metrics in sorted(results.items()):
+        before = baseline.get(name)
+        if before is None:
+            continue
+        for metric, value in sorted(metrics.items()):
+            old = before.get(metric)
+            if old is None:
+                continue
+            if metric.endswith("_ms") and old > 0 and value > old * (1 + tolerance):
+                found.append(f"{name} {metric}: {value:.1f} vs {old:.1f} (+{(value / old - 1) * 100:.0f}%)")
+            elif metric == "per_s" and old > 0 and value < old * (1 - tolerance):
+                found.append(f"{name} {metric}: {value:.1f} vs {old:.1f} (-{(1 - value / old) * 100:.0f}%)")
+            elif metric == "errors" and value > old:
+                found.append(f"{name} {metric}: {value} vs {old}")
+    return found
+
+
+def check(results, env, path, save=False, tolerance=0.2):
+    """Save ``results`` as the baseline at ``path``, or compare them with it. Returns a process exit code."""
+    if save:
+        save_baseline(path, results, env)
+        print(f"Baseline saved to {path}")
+        return 0
+    if not os.path.exists(path):
+        print(f"No baseline at {path}; record one with --save-baseline")
+        return 0
+
+    stored = load_baseline(path)
+    if stored.get("environment") != env:
+        print(f"⚠️ Baseline was recorded on {stored.get('environment')}, this run is {env}")
+    found = regressions(results, stored.get("results", {}), tolerance)
+    if found:
+        print(f"❌ {len(found)} regression(s) beyond {tolerance:.0%} of {path}:")
+        for line in found:
+            print(f"  {line}")
+        return 1
+    print(f"✅ No regressions beyond {tolerance:.0%} of {path}")
+    return 0
@@ -0,0 +1,150 @@
+"""Accuracy parity, latency and memory of the inference backends against Keras.
+
+Each backend runs in a fresh subprocess so import time and resident memory
+are measured the way a worker would see them. Predictions on the same inputs
+are compared with the Keras backend (top-1 agreement, max |prob diff|).
+
+    python export_model.py --format all
+    python -m benchmarks.bench_backends --images-dir data/validation
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.common import random_images
+from export_model import default_output
+import predict
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run_worker(args):
+    """Subprocess side: load one backend, time it, save its probabilities."""
+    start = time.perf_counter()
+    from inference_backends import create_backend
+
+    options = {"custom_objects": predict._custom_objects()} if args.backend == "keras" else {}
+    backend = create_backend(args.backend, args.model_path, **options)
+    load_seconds = time.perf_counter() - start
+
+    images = np.load(args.images)
+    backend.predict(images[:1])  # warm-up
+
+    latency = {}
+    for size in (1, 8):
+        batch = images[:size]
+        if len(batch) < size:
+            continue
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            backend.predict(batch)
+        latency[size] = (time.perf_counter() - start) / args.repeats * 1000.0
+
+    probs = np.concatenate([backend.predict(images[i:i + 8]) for i in range(0, len(images), 8)])
+    np.save(args.out, probs)
+    print(json.dumps({
+        "load_seconds": load_seconds,
+        "latency_ms": latency,
+        "peak_rss_mb": peak_rss_mb(),
+        "tensorflow_imported": "tensorflow" in sys.modules,
+    }))
+
+
+def load_images(images_dir, count):
+    if images_dir:
+        paths = sorted(
+            os.path.join(root, f) for root, _, files in os.walk(images_dir) for f in files
+        )
+        arrays = (predict.preprocess_image(p) for p in paths)
+        arrays = [a for a in arrays if a is not None][:count]
+        if arrays:
+            return np.concatenate(arrays)
+    print("No --images-dir given, comparing on random inputs")
+    return random_images(count)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    keras_path = os.path.join(predict.BASE_DIR, "alz_effnet_clean.keras")
+    parser.add_argument("--keras", default=keras_path)
+    parser.add_argument("--tflite-fp16", default=default_output(keras_path, "tflite-fp16"))
+    parser.add_argument("--tflite-int8", default=default_output(keras_path, "tflite-int8"))
+    parser.add_argument("--onnx", default=default_output(keras_path, "onnx"))
+    parser.add_argument("--images-dir", help="Preprocessed with predict.preprocess_image")
+    parser.add_argument("--count", type=int, default=64)
+    parser.add_argument("--repeats", type=int, default=10)
+    # internal: subprocess mode
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    parser.add_argument("--model-path", help=argparse.SUPPRESS)
+    parser.add_argument("--images", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    candidates = [
+        ("keras", "keras", args.keras),
+        ("tflite-fp16", "tflite", args.tflite_fp16),
+        ("tflite-int8", "tflite", args.tflite_int8),
+        ("onnx", "onnx", args.onnx),
+    ]
+    workdir = tempfile.mkdtemp()
+    images_path = os.path.join(workdir, "images.npy")
+    np.save(images_path, load_images(args.images_dir, args.count))
+
+    results = {}
+    for label, backend, path in candidates:
+        if not os.path.exists(path):
+            print(f"skip {label}: {path} not found")
+            continue
+        out = os.path.join(workdir, f"{label}.npy")
+        proc = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_backends", "--worker", "--backend", backend,
+             "--model-path", path, "--images", images_path, "--out", out,
+             "--repeats", str(args.repeats)],
+            capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            print(f"❌ {label} failed:\n{proc.stderr[-2000:]}")
+            continue
+        stats = json.loads(proc.stdout.strip().splitlines()[-1])
+        stats["probs"] = np.load(out)
+        stats["size_mb"] = os.path.getsize(path) / 1e6
+        results[label] = stats
+
+    reference = results.get("keras")
+    print(f"\n{'backend':<12} {'size MB':>8} {'load s':>7} {'RSS MB':>7} {'TF':>3} "
+          f"{'b1 ms':>7} {'b8 ms':>7} {'top1 agree':>10} {'max |dp|':>9}")
+    for label, stats in results.items():
+        agree = diff = float("nan")
+        if reference is not None:
+            ref = reference["probs"]
+            agree = float(np.mean(np.argmax(stats["probs"], 1) == np.argmax(ref, 1)))
+            diff = float(np.max(np.abs(stats["probs"] - ref)))
+        rss = stats["peak_rss_mb"]
+        print(
+            f"{label:<12} {stats['size_mb']:>8.1f} {stats['load_seconds']:>7.2f} "
+            f"{rss if rss is not None else float('nan'):>7.0f} "
+            f"{'y' if stats['tensorflow_imported'] else 'n':>3} "
+            f"{stats['latency_ms'].get('1', float('nan')):>7.1f} "
+            f"{stats['latency_ms'].get('8', float('nan')):>7.1f} {agree:>10.3f} {diff:>9.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
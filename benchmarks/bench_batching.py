@@ -0,0 +1,85 @@
+"""Throughput / latency of batched inference on CPU.
+
+Part 1 times a raw forward pass at each batch size. Part 2 drives the
+BatchScheduler with concurrent client threads, the way /api/predict-mri does,
+and reports per-request latency for each ``max_batch_size`` setting.
+
+    python -m benchmarks.bench_batching --concurrency 16 --max-wait-ms 5
+"""
+import argparse
+import threading
+import time
+
+from batching import BatchScheduler
+from benchmarks.common import load_benchmark_model, percentile_ms, random_images
+import predict
+
+BATCH_SIZES = [1, 2, 4, 8, 16, 32]
+
+
+def bench_forward(batch_sizes, repeats):
+    print("\n== Forward pass ==")
+    print(f"{'batch':>6} {'ms/batch':>10} {'ms/image':>10} {'images/s':>10}")
+    for size in batch_sizes:
+        batch = random_images(size)
+        predict.predict_batch(batch)  # warm-up / graph tracing
+        start = time.perf_counter()
+        for _ in range(repeats):
+            predict.predict_batch(batch)
+        elapsed = (time.perf_counter() - start) / repeats
+        print(f"{size:>6} {elapsed * 1000:>10.1f} {elapsed * 1000 / size:>10.1f} {size / elapsed:>10.1f}")
+
+
+def bench_scheduler(batch_sizes, concurrency, requests_per_client, max_wait_ms):
+    print(f"\n== Scheduler ({concurrency} concurrent clients, max_wait_ms={max_wait_ms}) ==")
+    print(f"{'max_batch':>9} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'mean batch':>11}")
+    image = random_images(1)[0]
+
+    for size in batch_sizes:
+        scheduler = BatchScheduler(predict.predict_batch, max_batch_size=size, max_wait_ms=max_wait_ms)
+        scheduler.submit(image)  # warm-up
+        scheduler.batches_run = scheduler.images_run = 0
+        latencies = []
+        lock = threading.Lock()
+
+        def client():
+            for _ in range(requests_per_client):
+                start = time.perf_counter()
+                scheduler.submit(image)
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - start
+        scheduler.stop()
+
+        stats = scheduler.stats()
+        print(
+            f"{size:>9} {len(latencies) / wall:>8.1f} {percentile_ms(latencies, 50):>8.1f} "
+            f"{percentile_ms(latencies, 99):>8.1f} {stats['mean_batch_size']:>11.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=BATCH_SIZES)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests-per-client", type=int, default=4)
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    parser.add_argument("--standin", action="store_true", help="Use the untrained stand-in model")
+    args = parser.parse_args()
+
+    load_benchmark_model(standin=args.standin)
+    bench_forward(args.batch_sizes, args.repeats)
+    bench_scheduler(args.batch_sizes, args.concurrency, args.requests_per_client, args.max_wait_ms)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Per-request latency of the Keras serving paths: model.predict vs a direct call vs the compiled function.
+
+For each batch size, times
+
+    predict        model.predict(batch) (the original path)
+    direct         model(batch, training=False), eager
+    compiled       the tf.function KerasBackend uses (KERAS_COMPILED)
+    compiled+xla   the same, XLA-compiled (KERAS_JIT_COMPILE)
+
+plus, with --precision, the compiled function on a copy of the model using
+that dtype policy. Set TF_ENABLE_ONEDNN_OPTS=0 / 1 to compare oneDNN kernels.
+
+    python -m benchmarks.bench_compiled --batch-sizes 1 8 --repeats 20
+    python -m benchmarks.bench_compiled --precision mixed_bfloat16 --standin
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from benchmarks.common import load_benchmark_model, percentile_ms, random_images
+from inference_backends import KerasBackend
+
+
+def measure(fn, repeats):
+    fn()  # warm-up: tracing / XLA compilation for this batch size
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--precision", help="Also time a copy of the model with this dtype policy")
+    parser.add_argument("--standin", action="store_true", help="Use the untrained stand-in model")
+    args = parser.parse_args()
+
+    backend = load_benchmark_model(standin=args.standin)
+    if not isinstance(backend, KerasBackend):
+        raise SystemExit("Needs the keras backend (INFERENCE_BACKEND=keras)")
+    model = backend.model
+    variants = [
+        ("predict", lambda batch: model.predict(batch, verbose=0)),
+        ("direct", lambda batch: model(batch, training=False).numpy()),
+        ("compiled", KerasBackend(model=model, compiled=True).predict),
+        ("compiled+xla", KerasBackend(model=model, jit_compile=True).predict),
+    ]
+    if args.precision:
+        variants.append((f"compiled {args.precision}", KerasBackend(model=model, compiled=True, precision=args.precision).predict))
+
+    print(f"oneDNN: TF_ENABLE_ONEDNN_OPTS={os.environ.get('TF_ENABLE_ONEDNN_OPTS', 'default')}, {args.repeats} repeats")
+    print(f"{'path':<24} {'batch':>5} {'p50 ms':>8} {'p95 ms':>8} {'ms/image':>9} {'vs predict':>10}")
+    for batch_size in args.batch_sizes:
+        batch = random_images(batch_size)
+        reference = model.predict(batch, verbose=0)
+        baseline = None
+        for label, fn in variants:
+            samples = measure(lambda: fn(batch), args.repeats)
+            p50 = percentile_ms(samples, 50)
+            baseline = baseline or p50
+            diff = float(np.abs(np.asarray(fn(batch)) - reference).max())
+            print(f"{label:<24} {batch_size:>5} {p50:>8.1f} {percentile_ms(samples, 95):>8.1f} "
+                  f"{p50 / batch_size:>9.1f} {baseline / p50:>9.2f}x  (max diff {diff:.1e})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Preprocessing micro-benchmark: the original per-path function vs the ImagePreprocessor engine.
+
+Generates synthetic scans (grayscale/RGB, PNG/JPEG, at a few resolutions) and
+reports ms/image for the legacy function, the engine on single paths, on
+in-memory bytes, and in batches across the thread pool. Also prints the max
+pixel difference from the legacy output (non-zero only where JPEG draft
+decoding kicks in).
+
+    python -m benchmarks.bench_preprocessing --count 64 --threads 1 2 4 8
+"""
+import argparse
+import io
+import os
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from preprocessing import ImagePreprocessor
+
+
+def legacy_preprocess_image(image_path):
+    """The original predict.preprocess_image (EfficientNet's preprocess_input is a pass-through)."""
+    img = Image.open(image_path).convert("RGB")
+    img = img.resize((224, 224))
+    img = np.array(img).astype("float32")
+    return np.expand_dims(img, axis=0)
+
+
+def make_images(directory, count, mode, fmt, size):
+    rng = np.random.default_rng(0)
+    shape = (size, size) if mode == "L" else (size, size, 3)
+    paths = []
+    for i in range(count):
+        # Smooth-ish content so JPEG sizes resemble real scans
+        base = rng.integers(0, 255, size=(size // 16, size // 16) + shape[2:], dtype=np.uint8)
+        img = Image.fromarray(base, mode).resize((size, size), Image.BILINEAR)
+        path = os.path.join(directory, f"{mode}_{size}_{i}.{fmt.lower()}")
+        img.save(path, fmt)
+        paths.append(path)
+    return paths
+
+
+def per_image_ms(fn, items):
+    start = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - start) / len(items) * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=32)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[256, 512, 1024])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    print(f"{'images':<18} {'legacy':>8} {'engine':>8} {'bytes':>8} "
+          + " ".join(f"{'batch x' + str(t):>10}" for t in args.threads) + f" {'max diff':>9}")
+
+    for mode, fmt in (("L", "PNG"), ("L", "JPEG"), ("RGB", "JPEG")):
+        for size in args.sizes:
+            paths = make_images(workdir, args.count, mode, fmt, size)
+            blobs = [open(p, "rb").read() for p in paths]
+
+            engine = ImagePreprocessor(num_threads=1)
+            out = engine.buffer(1)[0]
+
+            legacy = per_image_ms(legacy_preprocess_image, paths)
+            single = per_image_ms(lambda p: engine.write(engine.open(p), out), paths)
+            from_bytes = per_image_ms(lambda b: engine.write(engine.open(b), out), blobs)
+
+            batched = []
+            for threads in args.threads:
+                pool_engine = ImagePreprocessor(num_threads=threads)
+                pool_engine.preprocess_batch(paths[:2])  # start the pool
+                start = time.perf_counter()
+                pool_engine.preprocess_batch(paths)
+                batched.append((time.perf_counter() - start) / len(paths) * 1000.0)
+
+            diff = max(
+                float(np.abs(legacy_preprocess_image(p)[0] - engine.write(engine.open(p), out)).max())
+                for p in paths[:4]
+            )
+            print(f"{mode + ' ' + fmt + ' ' + str(size):<18} {legacy:>8.2f} {single:>8.2f} {from_bytes:>8.2f} "
+                  + " ".join(f"{b:>10.2f}" for b in batched) + f" {diff:>9.1f}")
+
+    print("\n(ms per image; 'max diff' is the largest pixel difference from the legacy output, 0-255 scale)")
+
+
+if __name__ == "__main__":
+    main()
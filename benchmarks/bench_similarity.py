@@ -0,0 +1,87 @@
+"""Query latency and recall of the similar-scan index on synthetic embeddings.
+
+Builds a throwaway index of --rows clustered random vectors (EfficientNetB3's
+1536-d by default) spread over --owners doctors, clusters it, then times
+queries against it with and without the per-doctor filter. Recall@k is
+measured against an exact search over the same rows.
+
+    python -m benchmarks.bench_similarity --rows 300000
+    python -m benchmarks.bench_similarity --rows 300000 --nprobe 8 32
+"""
+import argparse
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.common import percentile_ms
+from similarity_index import SimilarityIndex, _normalise
+
+
+def synthetic_embeddings(rows, dim, clusters=256, seed=0):
+    """Non-negative vectors around ``clusters`` centres, like pooled ReLU/Swish features."""
+    rng = np.random.default_rng(seed)
+    centres = rng.gamma(1.0, 1.0, size=(clusters, dim)).astype(np.float32)
+    for start in range(0, rows, 10000):
+        n = min(10000, rows - start)
+        noise = rng.gamma(1.0, 0.5, size=(n, dim)).astype(np.float32)
+        yield centres[rng.integers(clusters, size=n)] + noise
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=300000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--owners", type=int, default=50, help="Doctors the rows are spread over")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[16])
+    parser.add_argument("--dims", type=int, default=256, help="Projected dimensions (EMBEDDING_INDEX_DIMS)")
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp(prefix="alz-similarity-")
+    try:
+        index = SimilarityIndex(path, train_size=args.rows + 1, dims=args.dims)  # train once, after loading
+        rng = np.random.default_rng(1)
+        start = time.perf_counter()
+        next_id = 0
+        for block in synthetic_embeddings(args.rows, args.dim):
+            owners = rng.integers(args.owners, size=len(block))
+            index.add(zip(range(next_id, next_id + len(block)), owners, block))
+            next_id += len(block)
+        print(f"{args.rows} x {args.dim} rows added in {time.perf_counter() - start:.1f}s")
+        start = time.perf_counter()
+        index.train(force=True)
+        stats = index.stats()
+        print(f"trained {stats['lists']} lists, {stats['reduced_dim']} dimensions in {time.perf_counter() - start:.1f}s")
+
+        vectors = index._maps["vectors"][:args.rows]
+        owners_all = np.asarray(index._maps["owners"][:args.rows])
+        queries = rng.choice(args.rows, args.queries, replace=False)
+        print(f"{'search':<24} {'nprobe':>6} {'p50 ms':>8} {'p95 ms':>8} {'recall@k':>9}")
+        for owner_filter in (False, True):
+            for nprobe in args.nprobe:
+                index.nprobe = nprobe
+                samples, hits = [], 0
+                for q in queries:
+                    query = np.asarray(vectors[q], dtype=np.float32)
+                    owner = int(owners_all[q]) if owner_filter else None
+                    t0 = time.perf_counter()
+                    found = index.search(query, args.k, owner=owner, exclude=int(q))
+                    samples.append(time.perf_counter() - t0)
+
+                    rows = np.flatnonzero(owners_all == owner) if owner_filter else np.arange(args.rows)
+                    rows = rows[rows != q]
+                    scores = np.asarray(vectors[rows], dtype=np.float32) @ _normalise(query)
+                    exact = set(rows[np.argsort(-scores)[:args.k]].tolist())
+                    hits += len(exact & {scan_id for scan_id, _ in found})
+                label = f"per doctor (~{args.rows // args.owners} rows)" if owner_filter else "all rows"
+                print(f"{label:<24} {nprobe:>6} {percentile_ms(samples, 50):>8.2f} "
+                      f"{percentile_ms(samples, 95):>8.2f} {hits / (args.k * len(queries)):>9.3f}")
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
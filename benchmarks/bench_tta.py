@@ -0,0 +1,62 @@
+"""Latency overhead of the high-confidence (test-time augmentation) mode.
+
+Compares, per image: a plain prediction; the TTA views run as separate
+forward passes; and the TTA views stacked into one batch the way
+``predict_alzheimer(..., tta=True)`` runs them. ``--checkpoints N`` adds N - 1
+ensemble members (copies of the loaded model) so the cost of checkpoint
+ensembling shows too.
+
+    python -m benchmarks.bench_tta --repeats 10
+    python -m benchmarks.bench_tta --checkpoints 2 --standin
+"""
+import argparse
+import time
+
+from augmentation import tta_batch
+from benchmarks.common import load_benchmark_model, percentile_ms, random_images
+import predict
+
+
+def measure(fn, repeats):
+    fn()  # warm-up / graph tracing for this batch size
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--checkpoints", type=int, default=1, help="Models in the ensemble (default 1)")
+    parser.add_argument("--standin", action="store_true", help="Use the untrained stand-in model")
+    args = parser.parse_args()
+
+    model = load_benchmark_model(standin=args.standin)
+    predict.ensemble_models = [model] * (args.checkpoints - 1)
+    image = random_images(1)[0]
+    views = predict.TTA_VIEWS
+
+    scenarios = [
+        ("single", lambda: predict.predict_batch(image[None])),
+        ("tta sequential", lambda: [
+            predict.predict_batch(view[None], ensemble=True) for view in tta_batch(image, views)
+        ]),
+        ("tta stacked", lambda: predict.predict_batch(tta_batch(image, views), ensemble=True)),
+        ("views only", lambda: tta_batch(image, views)),
+    ]
+
+    print(f"{len(views)} views ({', '.join(views)}) x {args.checkpoints} checkpoint(s), {args.repeats} repeats")
+    print(f"{'mode':<16} {'p50 ms':>8} {'p95 ms':>8} {'vs single':>10}")
+    baseline = None
+    for label, fn in scenarios:
+        samples = measure(fn, args.repeats)
+        p50 = percentile_ms(samples, 50)
+        baseline = baseline or p50
+        print(f"{label:<16} {p50:>8.1f} {percentile_ms(samples, 95):>8.1f} {p50 / baseline:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import os
+import time
+
+import numpy as np
+
+from inference_backends import KerasBackend
+import predict
+
+
+def load_benchmark_model(standin=False):
+    """Load the real model, or an untrained EfficientNetB3 with the same shapes.
+
+    The stand-in has the same architecture and input/output shapes as
+    ``alz_effnet_clean.keras`` so timings are representative even when the
+    trained weights are not available.
+    """
+    if not standin and os.path.exists(predict.MODEL_PATH):
+        model = predict.load_alzheimer_model()
+        if model is not None:
+            return model
+
+    print("Using untrained EfficientNetB3 stand-in model")
+    predict.model = KerasBackend(model=build_standin_model(), **predict._keras_options())
+    return predict.model
+
+
+def build_standin_model():
+    from tensorflow.keras.applications import EfficientNetB3
+
+    return EfficientNetB3(
+        weights=None, input_shape=(224, 224, 3), classes=len(predict.CLASS_NAMES)
+    )
+
+
+def random_images(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(0, 255, size=(n, 224, 224, 3)).astype("float32")
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q) * 1000.0) if samples else 0.0
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
@@ -0,0 +1,191 @@
+"""HTTP load test against a running server (dev server or gunicorn).
+
+Registers a throwaway doctor and patient, then runs ``--concurrency`` clients
+for ``--duration`` seconds, each logged in with its own session. Reports
+requests/s and p50/p95/p99 latency per endpoint.
+
+    gunicorn -c gunicorn.conf.py wsgi:app &
+    python -m benchmarks.load_test --url http://127.0.0.1:5000 --concurrency 8 --duration 30
+    python -m benchmarks.load_test --scenario mixed   # dashboards alongside uploads
+
+Uploads are random images (every request a new one, so the prediction cache
+doesn't answer them) unless --repeat-image is given. --save-baseline stores
+the numbers; later runs compare against them and exit 1 when an endpoint got
+slower (or lost throughput) by more than --tolerance. ``benchmarks.suite``
+runs this against an in-process server with the stand-in model.
+"""
+import argparse
+import http.cookiejar
+import io
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.baseline import BASELINE_DIR, check, environment
+from benchmarks.common import percentile_ms
+
+SCENARIOS = {
+    "predict": ["predict"],
+    "dashboard": ["dashboard"],
+    # 1 upload for every 3 dashboard / summary loads
+    "mixed": ["predict", "dashboard", "summary", "dashboard"],
+}
+
+
+class Client:
+    """A logged-in browser session."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        )
+
+    def request(self, method, path, body=None, headers=None):
+        req = urllib.request.Request(self.base_url + path, data=body, headers=headers or {}, method=method)
+        try:
+            with self.opener.open(req, timeout=120) as resp:
+                return resp.status, resp.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def post_json(self, path, payload):
+        return self.request("POST", path, json.dumps(payload).encode(), {"Content-Type": "application/json"})
+
+    def post_multipart(self, path, fields, files):
+        boundary = uuid.uuid4().hex
+        body = io.BytesIO()
+        for name, value in fields.items():
+            body.write(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+        for name, (filename, data) in files.items():
+            body.write(
+                f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                f'Content-Type: application/octet-stream\r\n\r\n'.encode()
+            )
+            body.write(data)
+            body.write(b"\r\n")
+        body.write(f"--{boundary}--\r\n".encode())
+        return self.request("POST", path, body.getvalue(),
+                            {"Content-Type": f"multipart/form-data; boundary={boundary}"})
+
+
+def png_bytes(rng, size=256):
+    img = Image.fromarray(rng.integers(0, 255, size=(size, size), dtype=np.uint8), "L")
+    buf = io.BytesIO()
+    img.save(buf, "PNG")
+    return buf.getvalue()
+
+
+def create_accounts(base_url):
+    tag = uuid.uuid4().hex[:10]
+    doctor = {"fullname": "Load Test", "email": f"load-{tag}@example.com", "password": "loadtest1",
+              "phone": "1234567890", "license": f"LOAD-{tag}", "specialization": "neurology",
+              "hospital": "bench"}
+    patient = {"fullname": "Load Test", "email": f"load-patient-{tag}@example.com", "password": "loadtest1",
+               "phone": "1234567890", "age": 70, "gender": "male"}
+    client = Client(base_url)
+    for path, payload in (("/api/doctor-register", doctor), ("/api/patient-register", patient)):
+        status, body = client.post_json(path, payload)
+        if status >= 400:
+            raise SystemExit(f"{path} failed ({status}): {body[:200]!r}")
+    return doctor, patient
+
+
+def run_client(base_url, doctor, patient_email, actions, stop_at, seed, repeat_image, samples, lock):
+    client = Client(base_url)
+    status, body = client.post_json("/api/doctor-login", {"email": doctor["email"], "password": doctor["password"]})
+    if status != 200:
+        raise RuntimeError(f"login failed ({status})")
+
+    rng = np.random.default_rng(seed)
+    image = png_bytes(rng)
+    i = 0
+    while time.time() < stop_at:
+        action = actions[i % len(actions)]
+        i += 1
+        start = time.perf_counter()
+        if action == "predict":
+            data = image if repeat_image else png_bytes(rng)
+            status, _ = client.post_multipart("/api/predict-mri", {"patient_email": patient_email},
+                                              {"mri_file": ("scan.png", data)})
+        elif action == "summary":
+            status, _ = client.request("GET", "/api/summary")
+        else:
+            status, _ = client.request("GET", "/api/doctor-dashboard")
+        elapsed = time.perf_counter() - start
+        with lock:
+            samples.setdefault(action, []).append((elapsed, status < 400))
+
+
+def run_load(url, concurrency, duration, scenario, repeat_image=False):
+    """Run the scenario against ``url``; returns ``{endpoint: {requests, errors, per_s, p50_ms, p95_ms, p99_ms}}``."""
+    doctor, patient = create_accounts(url)
+    # Fresh images every run, so earlier runs' cached predictions don't answer them
+    run_id = uuid.uuid4().int
+    samples, lock = {}, threading.Lock()
+    start = time.time()
+    stop_at = start + duration
+    threads = [
+        threading.Thread(target=run_client, args=(
+            url, doctor, patient["email"], SCENARIOS[scenario], stop_at, [run_id, i], repeat_image, samples, lock,
+        ))
+        for i in range(concurrency)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.time() - start
+
+    report = {}
+    for action, results in sorted(samples.items()):
+        latencies = [t for t, ok in results if ok]
+        report[action] = {
+            "requests": len(results),
+            "errors": sum(1 for _, ok in results if not ok),
+            "per_s": len(results) / elapsed,
+            "p50_ms": percentile_ms(latencies, 50),
+            "p95_ms": percentile_ms(latencies, 95),
+            "p99_ms": percentile_ms(latencies, 99),
+        }
+    return report
+
+
+def print_report(report):
+    print(f"{'endpoint':<10} {'requests':>8} {'errors':>6} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for action, r in report.items():
+        print(f"{action:<10} {r['requests']:>8} {r['errors']:>6} {r['per_s']:>7.1f} "
+              f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="predict")
+    parser.add_argument("--repeat-image", action="store_true", help="Upload the same image every time")
+    parser.add_argument("--baseline", default=os.path.join(BASELINE_DIR, "load_baseline.json"))
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown, as a fraction (default 0.2)")
+    args = parser.parse_args()
+
+    report = run_load(args.url, args.concurrency, args.duration, args.scenario, args.repeat_image)
+    print(f"{args.scenario}: {args.concurrency} clients for {args.duration:.0f}s against {args.url}")
+    print_report(report)
+
+    results = {f"load.{args.scenario}.{action}": r for action, r in report.items()}
+    env = environment(scenario=args.scenario, concurrency=args.concurrency)
+    return check(results, env, args.baseline, args.save_baseline, args.tolerance)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
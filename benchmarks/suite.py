@@ -0,0 +1,148 @@
+"""Benchmark suite: preprocessing and inference micro-benchmarks plus HTTP load, checked against a baseline.
+
+Runs everything in one process without any setup: the app is served from a
+background thread against a throwaway SQLite database and upload folder, with
+the untrained EfficientNetB3 stand-in unless --real-model is given (and the
+trained .keras file exists). Reports p50/p95/p99 latency and throughput for
+
+    preprocess_image        decode + resize + normalise one uploaded PNG
+    predict_batch[N]        one forward pass of N images (N = 1 and BATCH_MAX_SIZE)
+    load.predict.*          concurrent uploads to /api/predict-mri
+    load.mixed.*            uploads alongside dashboard and summary loads
+
+and exits 1 if any of them regressed by more than --tolerance against the
+stored baseline (record it on the reference machine with --save-baseline).
+
+    python -m benchmarks.suite --save-baseline
+    python -m benchmarks.suite                 # after a change: compare
+"""
+import argparse
+import io
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.baseline import BASELINE_DIR, check, environment
+
+# The app reads its configuration at import: point it at scratch storage first
+_WORK_DIR = tempfile.mkdtemp(prefix="alz-bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_WORK_DIR, 'bench.db')}")
+os.environ.setdefault("PREDICTION_CACHE_PATH", os.path.join(_WORK_DIR, "prediction_cache.db"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+def latency_summary(samples):
+    from benchmarks.common import percentile_ms
+    return {
+        "p50_ms": percentile_ms(samples, 50),
+        "p95_ms": percentile_ms(samples, 95),
+        "p99_ms": percentile_ms(samples, 99),
+    }
+
+
+def measure(fn, repeats):
+    fn()  # warm-up
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def upload_bytes(seed, size=256):
+    rng = np.random.default_rng(seed)
+    img = Image.fromarray(rng.integers(0, 255, size=(size, size), dtype=np.uint8), "L")
+    buf = io.BytesIO()
+    img.save(buf, "PNG")
+    return buf.getvalue()
+
+
+def bench_preprocess(repeats):
+    import predict
+    data = upload_bytes(0)
+    buffer = predict.preprocessor.buffer(1)
+    samples = measure(lambda: predict.preprocess_image(data, out=buffer), repeats)
+    return {**latency_summary(samples), "per_s": len(samples) / sum(samples)}
+
+
+def bench_predict(batch_size, repeats):
+    import predict
+    from benchmarks.common import random_images
+    batch = random_images(batch_size)
+    samples = measure(lambda: predict.predict_batch(batch), repeats)
+    return {**latency_summary(samples), "per_s": batch_size * len(samples) / sum(samples)}
+
+
+def serve_app():
+    """Start the app on a free local port in a background thread; returns ``(url, server)``."""
+    from werkzeug.serving import make_server
+    from app import app, init_db
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)  # no line per request
+    init_db()
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="bench-server", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=20, help="Timed runs per micro-benchmark")
+    parser.add_argument("--concurrency", type=int, default=4, help="Load-test clients")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per load scenario")
+    parser.add_argument("--real-model", action="store_true", help="Use MODEL_PATH instead of the stand-in")
+    parser.add_argument("--skip-load", action="store_true", help="Micro-benchmarks only")
+    parser.add_argument("--baseline", default=os.path.join(BASELINE_DIR, "baseline.json"))
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown, as a fraction (default 0.2)")
+    args = parser.parse_args()
+
+    # Run from the scratch directory so uploads land there too
+    os.chdir(_WORK_DIR)
+    from benchmarks.common import load_benchmark_model
+    from benchmarks.load_test import run_load, print_report
+    from config import Config
+    import predict
+
+    load_benchmark_model(standin=not args.real_model)
+    predict.warm_up_model()
+    real = args.real_model and os.path.exists(predict.MODEL_PATH)
+    model_name = os.path.basename(predict.MODEL_PATH) if real else "efficientnetb3-standin"
+
+    results = {"preprocess_image": bench_preprocess(args.repeats * 5)}
+    for batch_size in sorted({1, Config.BATCH_MAX_SIZE}):
+        results[f"predict_batch[{batch_size}]"] = bench_predict(batch_size, args.repeats)
+
+    print(f"{'benchmark':<20} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'images/s':>9}")
+    for name, r in results.items():
+        print(f"{name:<20} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['per_s']:>9.1f}")
+
+    if not args.skip_load:
+        url, server = serve_app()
+        try:
+            for scenario in ("predict", "mixed"):
+                report = run_load(url, args.concurrency, args.duration, scenario)
+                print(f"\n{scenario}: {args.concurrency} clients for {args.duration:.0f}s")
+                print_report(report)
+                results.update({f"load.{scenario}.{action}": r for action, r in report.items()})
+        finally:
+            server.shutdown()
+            from app import stop_worker
+            stop_worker()
+
+    env = environment(
+        model=model_name, backend=Config.INFERENCE_BACKEND, concurrency=args.concurrency, duration=args.duration,
+    )
+    print()
+    return check(results, env, args.baseline, args.save_baseline, args.tolerance)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,39 @@
 import os
 from datetime import timedelta
 
+
+def _database_url(base_dir):
+    url = os.environ.get('DATABASE_URL') or f'sqlite:///{os.path.join(base_dir, "database", "alzheimer.db")}'
+    # Many hosts hand out postgres://, which SQLAlchemy no longer accepts
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
 class Config:
-    # Database - Use absolute path
+    # Database - SQLite file by default, PostgreSQL (or any SQLAlchemy URL) via DATABASE_URL
     BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-    SQLALCHEMY_DATABASE_URI = f'sqlite:///{os.path.join(BASE_DIR, "database", "alzheimer.db")}'
+    SQLALCHEMY_DATABASE_URI = _database_url(BASE_DIR)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Connection pool (per process) and SQLite locking
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    SQLITE_WAL = os.environ.get('SQLITE_WAL', 'true').lower() in ('1', 'true', 'yes')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 30000))
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': True,
+    }
+    if SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
+        # Writers wait up to the busy timeout for the lock instead of failing with "database is locked"
+        SQLALCHEMY_ENGINE_OPTIONS['connect_args'] = {'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000.0}
+    
     # Secret key for sessions
     SECRET_KEY = 'your_secret_key_change_this_in_production_12345'
     
@@ -14,8 +41,133 @@ class Config:
     PERMANENT_SESSION_LIFETIME = timedelta(days=7)
     SESSION_COOKIE_SECURE = False
     SESSION_COOKIE_HTTPONLY = True
+    # 'server': sessions live in the user_sessions table, cached per process; 'cookie': Flask's signed cookie
+    SESSION_STORE = os.environ.get('SESSION_STORE', 'server')
+    SESSION_CACHE_TTL = float(os.environ.get('SESSION_CACHE_TTL', 30))
+    SESSION_CACHE_SIZE = int(os.environ.get('SESSION_CACHE_SIZE', 10000))
+
+    # Password hashing: Werkzeug method string, and a bounded pool so login storms don't starve other requests.
+    # Changing the method rehashes each password at its owner's next login.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 32))
     
     # File upload
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
     UPLOAD_FOLDER = 'uploads'
+    # Dashboard scan lists: keyset-paginated pages
+    SCANS_PAGE_SIZE = int(os.environ.get('SCANS_PAGE_SIZE', 20))
+    SCANS_MAX_PAGE_SIZE = int(os.environ.get('SCANS_MAX_PAGE_SIZE', 100))
+    # Rows read and written per chunk by /api/export and scan_export.py
+    EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 5000))
+    # Days of history in the dashboard summary's scans-per-day series
+    SUMMARY_DAYS = int(os.environ.get('SUMMARY_DAYS', 30))
+    # Content-addressed upload storage (see storage.py): backend and shard directory levels
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'local')
+    STORAGE_SHARD_DEPTH = int(os.environ.get('STORAGE_SHARD_DEPTH', 2))
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'dcm', 'nii'}
+
+    # Inference batching: concurrent uploads are coalesced into one forward pass
+    BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', 8))
+    BATCH_MAX_WAIT_MS = float(os.environ.get('BATCH_MAX_WAIT_MS', 5))
+    # Images per forward pass for batch uploads and the batch_predict CLI
+    BATCH_PREDICT_SIZE = int(os.environ.get('BATCH_PREDICT_SIZE', 16))
+
+    # Async predictions: uploads return immediately and are predicted on PREDICTION_WORKERS
+    # background threads, batched with other uploads (so allow about a batch's worth)
+    ASYNC_PREDICTIONS = os.environ.get('ASYNC_PREDICTIONS', 'false').lower() in ('1', 'true', 'yes')
+    PREDICTION_WORKERS = int(os.environ.get('PREDICTION_WORKERS', BATCH_MAX_SIZE))
+    # Each serving process renews a lease on the Pending scans it is predicting; a scan whose
+    # lease is this old (its process died) is taken over by another serving process
+    PENDING_LEASE_SECONDS = float(os.environ.get('PENDING_LEASE_SECONDS', 120))
+
+    # Prediction cache keyed by decoded pixels + model version (memory LRU + SQLite)
+    PREDICTION_CACHE_ENABLED = os.environ.get('PREDICTION_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    PREDICTION_CACHE_PATH = os.environ.get('PREDICTION_CACHE_PATH', os.path.join(BASE_DIR, "database", "prediction_cache.db"))
+    PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', 1024))
+
+    # Load the model and run a dummy inference in the background at startup
+    MODEL_WARMUP = os.environ.get('MODEL_WARMUP', 'true').lower() in ('1', 'true', 'yes')
+
+    # Inference backend: keras (reference), tflite or onnx (export with export_model.py)
+    INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'keras')
+    MODEL_PATH = os.environ.get('MODEL_PATH', os.path.join(BASE_DIR, {
+        'keras': 'alz_effnet_clean.keras',
+        'tflite': 'alz_effnet_clean_fp16.tflite',
+        'onnx': 'alz_effnet_clean.onnx',
+    }.get(INFERENCE_BACKEND, 'alz_effnet_clean.keras')))
+    INFERENCE_THREADS = int(os.environ.get('INFERENCE_THREADS', 0))  # 0 = runtime default
+    # TensorFlow (keras backend) thread pools per process, 0 = TF default (all cores);
+    # gunicorn.conf.py splits the cores between web workers
+    TF_INTRA_OP_THREADS = int(os.environ.get('TF_INTRA_OP_THREADS', 0))
+    TF_INTER_OP_THREADS = int(os.environ.get('TF_INTER_OP_THREADS', 0))
+    # keras backend: call a tf.function traced once at load instead of model.predict, optionally
+    # XLA-compiled, and optionally with a mixed-precision dtype policy (e.g. mixed_bfloat16)
+    KERAS_COMPILED = os.environ.get('KERAS_COMPILED', 'true').lower() in ('1', 'true', 'yes')
+    KERAS_JIT_COMPILE = os.environ.get('KERAS_JIT_COMPILE', 'false').lower() in ('1', 'true', 'yes')
+    KERAS_PRECISION = os.environ.get('KERAS_PRECISION', '')
+    # Dedicated inference processes per web process (0 = run the model in the web process),
+    # requests allowed to wait for one before answering 503, and seconds per forward pass
+    INFERENCE_WORKERS = int(os.environ.get('INFERENCE_WORKERS', 0))
+    INFERENCE_QUEUE_SIZE = int(os.environ.get('INFERENCE_QUEUE_SIZE', 64))
+    INFERENCE_TIMEOUT = float(os.environ.get('INFERENCE_TIMEOUT', 60))
+    # High-confidence mode (tta=1 on /api/predict-mri): augmented views predicted as one batch,
+    # averaged, optionally across extra checkpoints of the same backend (comma-separated paths)
+    TTA_VIEWS = os.environ.get('TTA_VIEWS', 'identity,hflip,crop,bright,dark')
+    ENSEMBLE_MODEL_PATHS = [p for p in os.environ.get('ENSEMBLE_MODEL_PATHS', '').split(',') if p.strip()]
+    # Load fork-safe backends (tflite / onnx) in the gunicorn master so workers share the weights
+    PRELOAD_MODEL = os.environ.get('PRELOAD_MODEL', 'true').lower() in ('1', 'true', 'yes')
+    # Versioned models (model_registry.py): the active version, when set, replaces MODEL_PATH;
+    # serving processes check for a new one every MODEL_POLL_SECONDS and hot-swap. The shadow
+    # version's agreement counts go to SHADOW_STATS_PATH; at most SHADOW_QUEUE_SIZE sampled
+    # batches wait for it per process, more are dropped
+    MODEL_REGISTRY_PATH = os.environ.get('MODEL_REGISTRY_PATH', os.path.join(BASE_DIR, 'models'))
+    MODEL_POLL_SECONDS = float(os.environ.get('MODEL_POLL_SECONDS', 5))
+    SHADOW_STATS_PATH = os.environ.get('SHADOW_STATS_PATH', os.path.join(BASE_DIR, "database", "shadow_stats.db"))
+    SHADOW_QUEUE_SIZE = int(os.environ.get('SHADOW_QUEUE_SIZE', 4))
+
+    # Grad-CAM explanations (explain.py): computed with the Keras model, on GRADCAM_WORKERS
+    # background processes the first time a scan's heatmap is viewed, stored as JPEG overlays
+    GRADCAM_MODEL_PATH = os.environ.get('GRADCAM_MODEL_PATH', MODEL_PATH if INFERENCE_BACKEND == 'keras'
+                                        else os.path.join(BASE_DIR, 'alz_effnet_clean.keras'))
+    GRADCAM_LAYER = os.environ.get('GRADCAM_LAYER', '')  # '' = last convolutional feature map
+    GRADCAM_WORKERS = int(os.environ.get('GRADCAM_WORKERS', 1))
+    GRADCAM_MAX_SIZE = int(os.environ.get('GRADCAM_MAX_SIZE', 512))
+    GRADCAM_JPEG_QUALITY = int(os.environ.get('GRADCAM_JPEG_QUALITY', 85))
+    GRADCAM_ALPHA = float(os.environ.get('GRADCAM_ALPHA', 0.5))
+
+    # Similar scans (similarity_index.py): the keras backend also emits each image's embedding
+    # (input of the last Dense layer unless EMBEDDING_LAYER names another), stored as float16 and
+    # indexed on disk. The index is exact until EMBEDDING_INDEX_TRAIN_SIZE vectors, then an IVF index
+    # with EMBEDDING_INDEX_NLIST clusters (0 = sqrt of the count), EMBEDDING_INDEX_NPROBE searched per
+    # query, scored on EMBEDDING_INDEX_DIMS-dimensional projections before re-ranking
+    EMBEDDINGS_ENABLED = os.environ.get('EMBEDDINGS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    EMBEDDING_LAYER = os.environ.get('EMBEDDING_LAYER', '')
+    EMBEDDING_INDEX_PATH = os.environ.get('EMBEDDING_INDEX_PATH', os.path.join(BASE_DIR, "database", "embedding_index"))
+    EMBEDDING_INDEX_TRAIN_SIZE = int(os.environ.get('EMBEDDING_INDEX_TRAIN_SIZE', 2048))
+    EMBEDDING_INDEX_NLIST = int(os.environ.get('EMBEDDING_INDEX_NLIST', 0))
+    EMBEDDING_INDEX_NPROBE = int(os.environ.get('EMBEDDING_INDEX_NPROBE', 16))
+    EMBEDDING_INDEX_DIMS = int(os.environ.get('EMBEDDING_INDEX_DIMS', 256))
+    SIMILAR_SCANS_K = int(os.environ.get('SIMILAR_SCANS_K', 10))
+    SIMILAR_SCANS_MAX_K = int(os.environ.get('SIMILAR_SCANS_MAX_K', 100))
+
+    # Patient progression (progression.py): consecutive scans needed to confirm a stage change, and the
+    # window (years) and slope (stages per year) that make a severity trend worsening / improving
+    PROGRESSION_CONFIRM_SCANS = int(os.environ.get('PROGRESSION_CONFIRM_SCANS', 2))
+    PROGRESSION_TREND_YEARS = float(os.environ.get('PROGRESSION_TREND_YEARS', 2.0))
+    PROGRESSION_TREND_THRESHOLD = float(os.environ.get('PROGRESSION_TREND_THRESHOLD', 0.25))
+    PROGRESSION_TREND_MIN_DAYS = int(os.environ.get('PROGRESSION_TREND_MIN_DAYS', 90))
+
+    # Image preprocessing: decode threads (0 = min(4, CPUs)) and reduced-size JPEG decoding
+    PREPROCESS_THREADS = int(os.environ.get('PREPROCESS_THREADS', 0))
+    PREPROCESS_JPEG_DRAFT = os.environ.get('PREPROCESS_JPEG_DRAFT', 'true').lower() in ('1', 'true', 'yes')
+
+    # DICOM / NIfTI studies: central fraction of axial slices sampled, slice cap, and how
+    # per-slice probabilities combine into the study result (mean or max)
+    VOLUME_SLICE_FRACTION = float(os.environ.get('VOLUME_SLICE_FRACTION', 0.5))
+    VOLUME_MAX_SLICES = int(os.environ.get('VOLUME_MAX_SLICES', 32))
+    VOLUME_AGGREGATION = os.environ.get('VOLUME_AGGREGATION', 'mean')
+
+    # Logging: level (DEBUG, INFO, WARNING, ...) and format (text, or json for one object per line)
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text')
@@ -0,0 +1,201 @@
+import io
+import logging
+import os
+import threading
+
+import numpy as np
+from PIL import Image
+
+from config import Config
+
+log = logging.getLogger(__name__)
+
+# Per process: ``(path, grad_model, logits_layer)`` of the Grad-CAM Keras model last used,
+# built on first use (TensorFlow is imported lazily)
+_gradcam = None
+_gradcam_lock = threading.Lock()
+
+
+def gradcam_artifact(version=None):
+    """``(path, version)`` of the Keras model that explains predictions of model ``version``.
+
+    A registry version that is a Keras model is explained with itself. Other
+    predictions (tflite / onnx versions, scans without a version) are explained
+    with the registry's active version if it is a Keras model, else with
+    GRADCAM_MODEL_PATH.
+    """
+    from predict import active_artifact, model_file_version, registry
+
+    if version:
+        try:
+            manifest = registry.manifest(version)
+        except ValueError:  # not a registry version, e.g. a MODEL_PATH file fingerprint
+            manifest = None
+        if manifest is not None and manifest["backend"] == "keras":
+            return manifest["path"], version
+    backend, path, active = active_artifact()
+    if backend == "keras" and registry.state()["active"]:
+        return path, active
+    return Config.GRADCAM_MODEL_PATH, model_file_version(Config.GRADCAM_MODEL_PATH)
+
+
+def gradcam_model_version(version=None):
+    """Version stored with explanations of model ``version``'s predictions (see ``gradcam_artifact``)."""
+    return gradcam_artifact(version)[1]
+
+
+def _last_feature_map_layer(model):
+    """The last layer with a 4D (N, h, w, c) output, e.g. EfficientNetB3's top activation."""
+    import keras
+    for layer in reversed(model.layers):
+        if isinstance(layer, keras.layers.InputLayer):
+            continue
+        try:
+            shape = layer.output.shape
+        except (AttributeError, ValueError):  # layers used more than once have no single output
+            continue
+        if len(shape) == 4:
+            return layer
+    raise ValueError("Model has no convolutional feature map to explain")
+
+
+def load_gradcam_model(path=None):
+    """``(grad_model, logits_layer)`` for the Keras model at ``path`` (default: ``gradcam_artifact()``'s).
+
+    ``grad_model`` maps an input batch to the last conv feature map and to the
+    classifier's output in one call. When the model ends in a softmax Dense
+    layer its *input* is returned instead and ``logits_layer`` is that layer,
+    so scores are taken before the softmax (softmax outputs saturate at 1.0 and
+    their gradients vanish). Only the model last used is kept.
+    """
+    global _gradcam
+    path = path or gradcam_artifact()[0]
+    if _gradcam is None or _gradcam[0] != path:
+        with _gradcam_lock:
+            if _gradcam is None or _gradcam[0] != path:
+                import keras
+                from inference_backends import KerasBackend
+                from predict import _custom_objects
+
+                _gradcam = None  # let the previous model be freed before loading the next
+                model = KerasBackend(path, custom_objects=_custom_objects()).model
+                layer = model.get_layer(Config.GRADCAM_LAYER) if Config.GRADCAM_LAYER else _last_feature_map_layer(model)
+                head = model.layers[-1]
+                logits_layer = None
+                if isinstance(head, keras.layers.Dense) and head.activation is keras.activations.softmax:
+                    logits_layer = head
+                    outputs = [layer.output, head.input]
+                else:
+                    outputs = [layer.output, model.output]
+                _gradcam = (path, keras.Model(model.input, outputs), logits_layer)
+    return _gradcam[1:]
+
+
+def gradcam(batch, class_indices=None, model_path=None):
+    """Grad-CAM heatmaps for a (N, 224, 224, 3) batch.
+
+    One forward pass yields both the class scores and the feature map they
+    were computed from; the gradient is taken from each score back to that
+    feature map only (through the classifier head, never the backbone).
+    Explains ``class_indices`` (default: each image's top class). Returns
+    ``(probs, heatmaps)``, heatmaps (N, h, w) in 0..1 at feature-map resolution.
+    """
+    import tensorflow as tf
+
+    grad_model, logits_layer = load_gradcam_model(model_path)
+    with tf.GradientTape() as tape:
+        features, head = grad_model(batch, training=False)
+        if logits_layer is not None:
+            logits = tf.matmul(head, logits_layer.kernel) + logits_layer.bias
+            probs = tf.nn.softmax(logits)
+        else:
+            logits = probs = head
+        if class_indices is None:
+            class_indices = tf.argmax(probs, axis=1)
+        scores = tf.gather(logits, tf.cast(class_indices, tf.int32), batch_dims=1)
+    grads = tape.gradient(scores, features)
+
+    weights = tf.reduce_mean(grads, axis=(1, 2))  # channel importance, (N, c)
+    cam = tf.nn.relu(tf.einsum("nhwc,nc->nhw", tf.cast(features, tf.float32), tf.cast(weights, tf.float32)))
+    cam = cam / (tf.reduce_max(cam, axis=(1, 2), keepdims=True) + 1e-8)
+    return probs.numpy(), cam.numpy()
+
+
+def _jet(heat):
+    """0..1 heat -> (h, w, 3) uint8 blue-to-red colours."""
+    x = heat[..., np.newaxis] * 4.0
+    rgb = np.clip(1.5 - np.abs(x - np.array([3.0, 2.0, 1.0])), 0.0, 1.0)
+    return (rgb * 255).astype(np.uint8)
+
+
+def overlay_jpeg(image, heatmap, alpha=None, max_size=None, quality=None):
+    """Blend ``heatmap`` over ``image`` (PIL) and encode it as JPEG bytes.
+
+    The image is shrunk to fit ``max_size``; hot regions are tinted up to
+    ``alpha``, cold ones keep the original pixels.
+    """
+    alpha = Config.GRADCAM_ALPHA if alpha is None else alpha
+    max_size = max_size or Config.GRADCAM_MAX_SIZE
+    base = image.convert("RGB")
+    base.thumbnail((max_size, max_size))
+
+    heat = Image.fromarray((heatmap * 255).astype(np.uint8), "L").resize(base.size, Image.BILINEAR)
+    heat = np.asarray(heat, dtype=np.float32) / 255.0
+    weight = (alpha * heat)[..., np.newaxis]
+    blended = np.asarray(base, dtype=np.float32) * (1.0 - weight) + _jet(heat) * weight
+
+    buf = io.BytesIO()
+    Image.fromarray(blended.astype(np.uint8)).save(
+        buf, "JPEG", quality=quality or Config.GRADCAM_JPEG_QUALITY, optimize=True
+    )
+    return buf.getvalue()
+
+
+def _explained_image(path):
+    """The decoded image to explain: the file itself, or a DICOM / NIfTI study's middle sampled slice."""
+    from predict import load_image
+    from volumes import is_volume_path, iter_volume_slices
+
+    if is_volume_path(path):
+        slices = list(iter_volume_slices(
+            path, fraction=Config.VOLUME_SLICE_FRACTION, max_slices=Config.VOLUME_MAX_SLICES
+        ))
+        if not slices:
+            return None
+        return Image.fromarray(slices[len(slices) // 2], "L")
+    return load_image(path)
+
+
+def explain_file(path, class_name=None, model_version=None):
+    """Grad-CAM overlay for one stored scan file.
+
+    Explains ``class_name`` (the scan's recorded prediction) when given,
+    otherwise the model's top class, with the Keras model for
+    ``model_version`` (the scan's, see ``gradcam_artifact``). Returns ``{'success', 'class_name',
+    'overlay' (JPEG bytes), 'model_version'}`` or ``{'success': False, 'message'}``.
+    """
+    from predict import CLASS_NAMES, preprocess_image
+
+    try:
+        if not os.path.exists(path):
+            return {"success": False, "message": "Scan file not found"}
+        img = _explained_image(path)
+        if img is None:
+            return {"success": False, "message": "Preprocessing failed"}
+        batch = preprocess_image(img)
+        if batch is None:
+            return {"success": False, "message": "Preprocessing failed"}
+
+        model_path, explained_version = gradcam_artifact(model_version)
+        class_indices = [CLASS_NAMES.index(class_name)] if class_name in CLASS_NAMES else None
+        probs, heatmaps = gradcam(batch, class_indices, model_path)
+        index = class_indices[0] if class_indices else int(np.argmax(probs[0]))
+        return {
+            "success": True,
+            "class_name": CLASS_NAMES[index],
+            "overlay": overlay_jpeg(img, heatmaps[0]),
+            "model_version": explained_version,
+        }
+    except Exception as e:
+        log.error("❌ Grad-CAM error: %s", e)
+        return {"success": False, "message": str(e)}
@@ -0,0 +1,133 @@
+"""Export the Keras model to TFLite (float16 / int8) and ONNX for the lighter inference backends.
+
+    python export_model.py --format all
+    python export_model.py --format tflite-int8 --calibration-dir data/calibration
+
+Select an export at runtime with INFERENCE_BACKEND=tflite|onnx and MODEL_PATH.
+Check accuracy parity and latency first with:
+
+    python -m benchmarks.bench_backends --images-dir data/validation
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+import predict
+
+FORMATS = ["tflite-fp16", "tflite-int8", "onnx"]
+
+
+def default_output(source, fmt):
+    stem = os.path.splitext(source)[0]
+    return {
+        "tflite-fp16": f"{stem}_fp16.tflite",
+        "tflite-int8": f"{stem}_int8.tflite",
+        "onnx": f"{stem}.onnx",
+    }[fmt]
+
+
+def load_keras_model(source):
+    from tensorflow.keras.models import load_model
+    return load_model(source, custom_objects=predict._custom_objects(), compile=False)
+
+
+def calibration_batches(calibration_dir, limit):
+    """Representative inputs for int8 calibration: real scans if given, else random noise."""
+    paths = []
+    if calibration_dir:
+        for root, _, files in os.walk(calibration_dir):
+            paths.extend(os.path.join(root, f) for f in sorted(files))
+    images = (predict.preprocess_image(p) for p in paths)
+    images = [img for img in images if img is not None][:limit]
+
+    if not images:
+        print("⚠️ No calibration images, using random inputs (int8 accuracy will suffer)")
+        rng = np.random.default_rng(0)
+        images = [rng.uniform(0, 255, size=(1, 224, 224, 3)).astype("float32") for _ in range(limit)]
+
+    def generator():
+        for img in images:
+            yield [img]
+    return generator
+
+
+def export_tflite(keras_model, output, quantize, calibration=None):
+    import tensorflow as tf
+
+    # Go through a SavedModel: works for both Keras 2 and Keras 3 models
+    saved_dir = tempfile.mkdtemp()
+    try:
+        keras_model.export(saved_dir, format="tf_saved_model")
+        converter = tf.lite.TFLiteConverter.from_saved_model(saved_dir)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if quantize == "float16":
+            converter.target_spec.supported_types = [tf.float16]
+        else:
+            # int8 weights and activations, float ops only where no int8 kernel exists;
+            # inputs/outputs stay float32 so callers don't change
+            converter.representative_dataset = calibration
+            converter.target_spec.supported_ops = [
+                tf.lite.OpsSet.TFLITE_BUILTINS_INT8,
+                tf.lite.OpsSet.TFLITE_BUILTINS,
+            ]
+        with open(output, "wb") as f:
+            f.write(converter.convert())
+    finally:
+        shutil.rmtree(saved_dir, ignore_errors=True)
+
+
+def export_onnx(keras_model, output, opset):
+    import tensorflow as tf
+    import tf2onnx
+    from tensorflow.python.framework.convert_to_constants import convert_variables_to_constants_v2
+
+    spec = tf.TensorSpec((None, 224, 224, 3), tf.float32, name="input")
+    serve = tf.function(lambda x: keras_model(x, training=False)).get_concrete_function(spec)
+    # Freeze first: otherwise tf2onnx turns EfficientNet's Normalization
+    # mean/variance into extra graph inputs instead of constants
+    frozen = convert_variables_to_constants_v2(serve)
+    tf2onnx.convert.from_graph_def(
+        frozen.graph.as_graph_def(),
+        input_names=[t.name for t in frozen.inputs],
+        output_names=[t.name for t in frozen.outputs],
+        opset=opset,
+        output_path=output,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the Alzheimer model for TFLite / ONNX Runtime")
+    parser.add_argument("--source", default=os.path.join(predict.BASE_DIR, "alz_effnet_clean.keras"))
+    parser.add_argument("--format", choices=FORMATS + ["all"], default="all")
+    parser.add_argument("--output", help="Output path (single format only)")
+    parser.add_argument("--calibration-dir", help="Images used to calibrate int8 quantization")
+    parser.add_argument("--calibration-samples", type=int, default=100)
+    parser.add_argument("--opset", type=int, default=17)
+    args = parser.parse_args(argv)
+
+    formats = FORMATS if args.format == "all" else [args.format]
+    if args.output and len(formats) > 1:
+        parser.error("--output needs a single --format")
+
+    keras_model = load_keras_model(args.source)
+
+    for fmt in formats:
+        output = args.output or default_output(args.source, fmt)
+        print(f"Exporting {fmt} -> {output}")
+        if fmt == "tflite-fp16":
+            export_tflite(keras_model, output, "float16")
+        elif fmt == "tflite-int8":
+            calibration = calibration_batches(args.calibration_dir, args.calibration_samples)
+            export_tflite(keras_model, output, "int8", calibration)
+        else:
+            export_onnx(keras_model, output, args.opset)
+        print(f"✅ {fmt}: {os.path.getsize(output) / 1e6:.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+"""gunicorn settings for production serving (Linux / macOS).
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+    kill -HUP <master pid>    # graceful reload: new workers, old ones finish their requests
+    kill -TERM <master pid>   # graceful shutdown
+
+Every setting can be overridden from the environment (see README).
+"""
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_WORKERS', 2))
+threads = int(os.environ.get('WEB_THREADS', 4))
+worker_class = 'gthread'
+timeout = int(os.environ.get('WEB_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 0))  # recycle workers after N requests, 0 = never
+max_requests_jitter = max_requests // 10
+
+# Import the app (and preload fork-safe models) once in the master, then fork
+preload_app = True
+
+# Split the cores between workers so N workers x N TF threads don't oversubscribe the CPU.
+# Must be in the environment before the app (and config.py) is imported.
+_threads_per_worker = str(max(1, (os.cpu_count() or 1) // workers))
+os.environ.setdefault('TF_INTRA_OP_THREADS', _threads_per_worker)
+os.environ.setdefault('TF_INTER_OP_THREADS', '1')
+os.environ.setdefault('INFERENCE_THREADS', _threads_per_worker)
+
+
+def post_fork(server, worker):
+    from app import app, db, start_worker
+
+    # Connections opened in the master (migrations) must not be shared between processes
+    with app.app_context():
+        db.engine.dispose(close=False)
+    # Every worker, including replacements for crashed ones, takes over Pending scans whose lease
+    # lapsed; one-off startup work (explanation cleanup, index sync) is left to the first worker
+    start_worker(resume_jobs=worker.age == 1)
+
+
+def worker_exit(server, worker):
+    from app import stop_worker
+    stop_worker()
+
+
+def child_exit(server, worker):
+    # Runs in the master: drop the dead worker's live gauges from /metrics
+    from observability import mark_process_dead
+    mark_process_dead(worker.pid)
@@ -0,0 +1,219 @@
+import logging
+import threading
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+class ModelOutput(np.ndarray):
+    """Output rows tagged with the ``model_version`` that produced them; rows and slices keep the tag."""
+
+    model_version = None
+
+    def __array_finalize__(self, obj):
+        self.model_version = getattr(obj, "model_version", None)
+
+
+def tag_output(rows, version):
+    """``rows`` as a ``ModelOutput`` of ``version`` (no copy)."""
+    rows = np.asarray(rows).view(ModelOutput)
+    rows.model_version = version
+    return rows
+
+
+class KerasBackend:
+    """Full TensorFlow/Keras runtime (the reference backend).
+
+    With ``compiled`` the forward pass is a ``tf.function`` traced once for a
+    fixed (any batch, 224, 224, 3) float32 signature and called directly,
+    instead of ``model.predict``, which sets up a data adapter and loop on
+    every call. Batches larger than ``compiled_max_batch`` still go through
+    ``model.predict``, which runs them in chunks. ``jit_compile`` compiles the
+    function with XLA (once per batch size); ``precision`` (e.g.
+    ``mixed_bfloat16``) rebuilds the model with that Keras dtype policy.
+
+    With ``embeddings`` each output row is the class probabilities followed by
+    the image's embedding: the input of the classifier's last Dense layer (for
+    EfficientNetB3, the pooled 1536-d features), or the output of
+    ``embedding_layer``. Both come out of the same forward pass.
+    """
+
+    name = "keras"
+
+    def __init__(self, model_path=None, model=None, custom_objects=None, compiled=False, jit_compile=False,
+                 precision=None, compiled_max_batch=64, embeddings=False, embedding_layer=None):
+        if model is None:
+            from tensorflow.keras.models import load_model
+            model = load_model(model_path, custom_objects=custom_objects, compile=False)
+        if precision:
+            model = _with_dtype_policy(model, precision, custom_objects)
+        self.model = model
+        self.input_shape = tuple(model.input_shape)
+        self.compiled_max_batch = compiled_max_batch
+        self.embedding_size = 0
+        self._forward = model
+        if embeddings:
+            try:
+                self._forward = _with_embedding_output(model, embedding_layer)
+                self.embedding_size = self._forward.output_shape[-1] - model.output_shape[-1]
+            except (ValueError, AttributeError) as e:
+                log.warning("⚠️ Model has no usable embedding layer, predicting without embeddings: %s", e)
+        self._serve = _serving_function(self._forward, jit_compile) if compiled or jit_compile else None
+
+    def predict(self, batch):
+        if self._serve is not None and len(batch) <= self.compiled_max_batch:
+            return self._serve(np.asarray(batch, dtype=np.float32)).numpy()
+        return self._forward.predict(batch, verbose=0)
+
+
+def _serving_function(model, jit_compile=False):
+    import tensorflow as tf
+
+    @tf.function(
+        input_signature=[tf.TensorSpec((None,) + tuple(model.input_shape[1:]), tf.float32)],
+        jit_compile=jit_compile,
+        autograph=False,
+    )
+    def serve(batch):
+        return model(batch, training=False)
+
+    return serve
+
+
+def _with_embedding_output(model, layer_name=None):
+    """A model sharing ``model``'s layers whose output is ``concat([probs, embedding])``."""
+    import keras
+
+    if layer_name:
+        features = model.get_layer(layer_name).output
+    else:
+        dense = next((layer for layer in reversed(model.layers) if isinstance(layer, keras.layers.Dense)), None)
+        if dense is None:
+            raise ValueError("no Dense classifier layer")
+        features = dense.input
+    if len(features.shape) != 2:
+        raise ValueError(f"embedding layer output has shape {tuple(features.shape)}, expected (N, d)")
+    outputs = keras.layers.Concatenate(dtype="float32")([model.output, features])
+    return keras.Model(model.input, outputs)
+
+
+def _with_dtype_policy(model, policy, custom_objects=None):
+    """A copy of ``model`` computing in ``policy``; the output layer stays float32.
+
+    Setting the global policy is not enough: saved models carry each layer's dtype.
+    """
+    config = model.get_config()
+    _set_dtype_policy(config, policy, keep_last=True)
+    clone = model.__class__.from_config(config, custom_objects=custom_objects)
+    clone.set_weights(model.get_weights())
+    return clone
+
+
+def _set_dtype_policy(config, policy, keep_last=False):
+    layers = config["layers"]
+    for i, layer in enumerate(layers):
+        if layer["class_name"] == "InputLayer" or (keep_last and i == len(layers) - 1):
+            continue
+        if "layers" in layer["config"]:  # nested model, e.g. the EfficientNet backbone
+            _set_dtype_policy(layer["config"], policy)
+        layer["config"]["dtype"] = policy
+
+
+class TFLiteBackend:
+    """TFLite interpreter for float16 / int8-quantized exports.
+
+    Uses the standalone LiteRT / tflite-runtime interpreter when installed so
+    workers don't have to import TensorFlow at all.
+    """
+
+    name = "tflite"
+    embedding_size = 0  # exports carry only the classifier output
+
+    def __init__(self, model_path, num_threads=None):
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            try:
+                from tflite_runtime.interpreter import Interpreter
+            except ImportError:
+                from tensorflow.lite import Interpreter
+
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self.input_shape = (None,) + tuple(self._input["shape"][1:])
+        self._batch_size = int(self._input["shape"][0])
+        # An interpreter holds its tensors internally, so invocations must not overlap
+        self._lock = threading.Lock()
+
+    def predict(self, batch):
+        with self._lock:
+            if batch.shape[0] != self._batch_size:
+                self.interpreter.resize_tensor_input(self._input["index"], list(batch.shape))
+                self.interpreter.allocate_tensors()
+                self._input = self.interpreter.get_input_details()[0]
+                self._output = self.interpreter.get_output_details()[0]
+                self._batch_size = batch.shape[0]
+
+            self.interpreter.set_tensor(self._input["index"], _quantize(batch, self._input))
+            self.interpreter.invoke()
+            return _dequantize(self.interpreter.get_tensor(self._output["index"]), self._output)
+
+
+class ONNXBackend:
+    """ONNX Runtime on CPU."""
+
+    name = "onnx"
+    embedding_size = 0
+
+    def __init__(self, model_path, num_threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(
+            model_path, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        model_input = self.session.get_inputs()[0]
+        self._input_name = model_input.name
+        self.input_shape = (None,) + tuple(model_input.shape[1:])
+
+    def predict(self, batch):
+        return self.session.run(None, {self._input_name: batch.astype(np.float32, copy=False)})[0]
+
+
+BACKENDS = {
+    KerasBackend.name: KerasBackend,
+    TFLiteBackend.name: TFLiteBackend,
+    ONNXBackend.name: ONNXBackend,
+}
+
+
+def create_backend(name, model_path, **kwargs):
+    """Instantiate the backend registered under ``name`` for ``model_path``."""
+    try:
+        backend_cls = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown inference backend '{name}' (choose from {', '.join(BACKENDS)})")
+    return backend_cls(model_path, **kwargs)
+
+
+def _quantize(batch, details):
+    dtype = details["dtype"]
+    if dtype == np.float32:
+        return batch.astype(np.float32, copy=False)
+    scale, zero_point = details["quantization"]
+    if scale:
+        batch = batch / scale + zero_point
+    info = np.iinfo(dtype)
+    return np.clip(np.round(batch), info.min, info.max).astype(dtype)
+
+
+def _dequantize(output, details):
+    if output.dtype == np.float32:
+        return output
+    scale, zero_point = details["quantization"]
+    return (output.astype(np.float32) - zero_point) * scale
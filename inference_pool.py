@@ -0,0 +1,355 @@
+import logging
+import multiprocessing
+import queue
+import signal
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from batching import InferenceBusy
+from inference_backends import tag_output
+from observability import INFERENCE_WORKER_EVENTS, MODEL_LOAD_SECONDS, configure_logging
+
+log = logging.getLogger(__name__)
+
+INPUT_SHAPE = (224, 224, 3)
+# Output row capacity: the class probabilities plus an embedding of up to this many values
+MAX_EMBEDDING_SIZE = 4096
+
+
+class InferenceTimeout(TimeoutError):
+    """A forward pass (or the wait for a free inference worker) took longer than allowed."""
+
+
+def serve(conn, input_name, output_name, max_batch_size, num_classes):
+    """Inference worker process: load the model, then run forward passes on request.
+
+    Batches arrive in the shared input buffer; the parent only sends the row
+    count over ``conn`` and reads the output rows back from the output buffer,
+    packed as (n, width) with the width sent back in the reply.
+    """
+    # Ctrl-C reaches the whole process group; the web process stops us itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    configure_logging()
+    import predict
+    # Under `python app.py` spawn re-imports app.py here, which points predict at the pool
+    predict.use_inference_pool(None)
+
+    # Spawned children share the web process's resource tracker, which unlinks the
+    # buffers only if the web process never does (see InferencePool.stop)
+    input_shm = shared_memory.SharedMemory(name=input_name)
+    output_shm = shared_memory.SharedMemory(name=output_name)
+    inputs = np.ndarray((max_batch_size,) + INPUT_SHAPE, dtype=np.float32, buffer=input_shm.buf)
+    outputs = np.ndarray((max_batch_size * (num_classes + MAX_EMBEDDING_SIZE),), dtype=np.float32,
+                         buffer=output_shm.buf)
+    try:
+        if not predict.warm_up_model():
+            conn.send(("failed", predict.get_model_status()))
+            return
+        conn.send(("ready", predict.get_model_status()))
+
+        while True:
+            try:
+                message = conn.recv()
+            except EOFError:
+                return  # the web process went away
+            if message is None:
+                return
+            n, ensemble = message
+            try:
+                rows = predict.predict_batch(inputs[:n], ensemble=ensemble)
+                width = rows.shape[1]
+                if width > num_classes + MAX_EMBEDDING_SIZE:
+                    raise ValueError(f"Model output has {width} values per image, more than the pool's buffers hold")
+                outputs[:n * width] = rows.ravel()
+                conn.send(("ok", (width, getattr(rows, "model_version", None))))
+            except Exception as e:
+                conn.send(("error", str(e)))
+    finally:
+        del inputs, outputs
+        input_shm.close()
+        output_shm.close()
+
+
+class _Worker:
+    """One inference process and the shared buffers it reads batches from / writes results to.
+
+    The buffers outlive the process, so a restarted worker attaches to the same ones.
+    """
+
+    def __init__(self, index, max_batch_size, num_classes):
+        self.index = index
+        self.input_shm = shared_memory.SharedMemory(
+            create=True, size=max_batch_size * int(np.prod(INPUT_SHAPE)) * 4
+        )
+        capacity = max_batch_size * (num_classes + MAX_EMBEDDING_SIZE)
+        self.output_shm = shared_memory.SharedMemory(create=True, size=capacity * 4)
+        self.inputs = np.ndarray((max_batch_size,) + INPUT_SHAPE, dtype=np.float32, buffer=self.input_shm.buf)
+        self.outputs = np.ndarray((capacity,), dtype=np.float32, buffer=self.output_shm.buf)
+        self.process = None
+        self.conn = None
+
+    def spawn(self, context, max_batch_size, num_classes):
+        parent_conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=serve,
+            args=(child_conn, self.input_shm.name, self.output_shm.name, max_batch_size, num_classes),
+            name=f"inference-{self.index}",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+
+    def kill(self):
+        if self.process is not None and self.process.is_alive():
+            self.process.kill()
+        if self.process is not None:
+            self.process.join()
+        if self.conn is not None:
+            self.conn.close()
+        self.process, self.conn = None, None
+
+    def release(self):
+        del self.inputs, self.outputs
+        for shm in (self.input_shm, self.output_shm):
+            shm.close()
+            shm.unlink()
+
+
+class InferencePool:
+    """Runs forward passes on dedicated inference processes instead of the web process.
+
+    ``predict(batch)`` has the same contract as ``predict.predict_batch``: the
+    calling thread copies the batch into an idle worker's shared-memory buffer
+    (no pickling of the ~600 KB per image arrays), the worker runs the model and
+    writes the probabilities back. Each worker handles one batch at a time.
+
+    Backpressure: once ``max_queue`` callers are waiting for a free worker,
+    ``predict`` raises ``InferenceBusy``. A batch that takes longer than
+    ``timeout`` seconds raises ``InferenceTimeout``; its worker is killed and,
+    like one that crashes, restarted in the background.
+    """
+
+    def __init__(self, workers=1, max_batch_size=16, max_queue=64, timeout=60, num_classes=4):
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_queue = max(1, int(max_queue))
+        self.timeout = timeout
+        self.num_classes = num_classes
+        self.size = max(1, int(workers))
+        # spawn: never fork a process that may already have TF threads running
+        self._context = multiprocessing.get_context("spawn")
+        self._workers = []
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+        self._stopping = False
+
+        self._state = {}
+        self._model_status = {}
+        self._error = None
+        self._waiting = 0
+        self.batches_run = 0
+        self.images_run = 0
+        self.restarts = 0
+        self.timeouts = 0
+        self.rejected = 0
+
+    def start(self):
+        """Start every worker in the background; each takes requests once its model is warm.
+
+        Called in the serving process (not before a fork), so the shared buffers
+        belong to it alone.
+        """
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            self._workers = [_Worker(i, self.max_batch_size, self.num_classes) for i in range(self.size)]
+            self._state = {worker.index: "not_loaded" for worker in self._workers}
+        for worker in self._workers:
+            self._launch(worker)
+
+    def predict(self, batch, timeout=None, ensemble=False):
+        """Run ``batch`` (N, 224, 224, 3) through the model, returns ``predict_batch``'s (N, width) rows."""
+        self.start()
+        deadline = time.monotonic() + (timeout or self.timeout)
+        for attempt in range(2):
+            worker = self._acquire(deadline)
+            try:
+                chunks = [
+                    self._run(worker, batch[start:start + self.max_batch_size], deadline, ensemble)
+                    for start in range(0, len(batch), self.max_batch_size)
+                ]
+                if len(chunks) == 1:
+                    probs = chunks[0]
+                else:
+                    probs = np.concatenate(chunks) if chunks else np.empty((0, self.num_classes), np.float32)
+                    probs = tag_output(probs, chunks[-1].model_version if chunks else None)
+            except InferenceTimeout as e:
+                self._restart(worker, e)
+                raise
+            except (EOFError, OSError) as e:
+                # The process died mid-batch (e.g. the OOM killer); retry once on another worker
+                self._restart(worker, e)
+                if attempt:
+                    raise RuntimeError(f"Inference worker {worker.index} exited: {e!r}")
+                continue
+            except Exception:
+                self._idle.put(worker)
+                raise
+
+            self._idle.put(worker)
+            with self._lock:
+                self.batches_run += 1
+                self.images_run += len(batch)
+            return probs
+
+    def _acquire(self, deadline):
+        """Wait for an idle, live worker until ``deadline``."""
+        with self._lock:
+            if all(state == "failed" for state in self._state.values()):
+                raise RuntimeError(f"Model not loaded: {self._error}")
+            if self._waiting >= self.max_queue:
+                self.rejected += 1
+                INFERENCE_WORKER_EVENTS.labels("rejected").inc()
+                raise InferenceBusy(f"{self._waiting} requests are already waiting for an inference worker")
+            self._waiting += 1
+        try:
+            while True:
+                try:
+                    worker = self._idle.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    raise InferenceTimeout("No inference worker became free in time")
+                if worker.process is not None and worker.process.is_alive():
+                    return worker
+                # Died while idle
+                self._restart(worker, EOFError("process exited"))
+        finally:
+            with self._lock:
+                self._waiting -= 1
+
+    def _run(self, worker, chunk, deadline, ensemble):
+        n = len(chunk)
+        worker.inputs[:n] = chunk
+        worker.conn.send((n, ensemble))
+        if not worker.conn.poll(max(0.0, deadline - time.monotonic())):
+            with self._lock:
+                self.timeouts += 1
+            INFERENCE_WORKER_EVENTS.labels("timeout").inc()
+            raise InferenceTimeout(f"Inference worker {worker.index} timed out")
+        status, reply = worker.conn.recv()
+        if status != "ok":
+            raise RuntimeError(reply)
+        width, version = reply
+        if version is not None and version != self._model_status.get("model_version"):
+            with self._lock:
+                self._model_status = dict(self._model_status, model_version=version)
+        return tag_output(worker.outputs[:n * width].reshape(n, width).copy(), version)
+
+    def _launch(self, worker):
+        threading.Thread(
+            target=self._start_worker, args=(worker,), name=f"inference-{worker.index}-start", daemon=True
+        ).start()
+
+    def _start_worker(self, worker):
+        """Spawn ``worker`` and hand it out once it reports a warm model; retries with backoff."""
+        delay = 1.0
+        while not self._stopping:
+            with self._lock:
+                self._state[worker.index] = "loading"
+            worker.spawn(self._context, self.max_batch_size, self.num_classes)
+            try:
+                status, model_status = worker.conn.recv()
+            except (EOFError, OSError) as e:
+                status, model_status = "failed", {"error": f"exited during startup: {e!r}"}
+
+            with self._lock:
+                self._model_status = model_status
+                if status == "ready":
+                    self._state[worker.index] = "ready"
+                    self._error = None
+                else:
+                    self._state[worker.index] = "failed"
+                    self._error = model_status.get("error")
+            if status == "ready":
+                if model_status.get("load_seconds") is not None:
+                    MODEL_LOAD_SECONDS.set(model_status["load_seconds"])
+                if self._stopping:
+                    worker.kill()
+                else:
+                    self._idle.put(worker)
+                return
+
+            worker.kill()
+            if self._stopping:
+                return
+            log.error("❌ Inference worker %d failed to start: %s", worker.index, self._error)
+            time.sleep(delay)
+            delay = min(delay * 2, 60.0)
+
+    def _restart(self, worker, error):
+        log.warning("⚠️ Restarting inference worker %d: %r", worker.index, error)
+        worker.kill()
+        INFERENCE_WORKER_EVENTS.labels("restart").inc()
+        with self._lock:
+            self.restarts += 1
+            self._state[worker.index] = "restarting"
+        if not self._stopping:
+            self._launch(worker)
+
+    def status(self):
+        """Readiness in the shape of ``predict.get_model_status``, plus per-worker states."""
+        with self._lock:
+            states = dict(self._state)
+            model_status = dict(self._model_status)
+            error = self._error
+        ready = sum(1 for s in states.values() if s == "ready")
+        if ready:
+            state = "ready"
+        elif states and all(s == "failed" for s in states.values()):
+            state = "failed"
+        elif any(s != "not_loaded" for s in states.values()):
+            state = "loading"
+        else:
+            state = "not_loaded"
+        return {
+            "state": state,
+            "ready": ready > 0,
+            "model_version": model_status.get("model_version"),
+            "load_seconds": model_status.get("load_seconds"),
+            "error": error,
+            "workers": {"total": self.size, "ready": ready},
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.size,
+                "idle": self._idle.qsize(),
+                "waiting": self._waiting,
+                "batches_run": self.batches_run,
+                "images_run": self.images_run,
+                "restarts": self.restarts,
+                "timeouts": self.timeouts,
+                "rejected": self.rejected,
+            }
+
+    def stop(self, timeout=10):
+        """Stop the workers (after their current batch) and free the shared buffers."""
+        with self._lock:
+            if self._stopping:
+                return
+            self._stopping = True
+        for worker in self._workers:
+            if worker.conn is not None:
+                try:
+                    worker.conn.send(None)
+                except OSError:
+                    pass
+            if worker.process is not None:
+                worker.process.join(timeout)
+            worker.kill()
+            worker.release()
@@ -0,0 +1,99 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from observability import configure_logging
+
+log = logging.getLogger(__name__)
+
+
+def warm_up_explainer():
+    """Pool initializer for Grad-CAM workers: build the Grad-CAM model before the first job."""
+    configure_logging()
+    from explain import load_gradcam_model
+    try:
+        load_gradcam_model()
+    except Exception as e:
+        log.error("❌ Grad-CAM model load error: %s", e)  # reported again by each job
+
+
+def run_explanation_job(filepath, class_name=None, model_version=None):
+    """Runs inside a worker process: Grad-CAM overlay for a stored scan (see explain.explain_file)."""
+    from explain import explain_file
+    return explain_file(filepath, class_name, model_version)
+
+
+class PredictionJobQueue:
+    """Runs per-scan jobs in the background: ``job(*args)`` on a pool of worker processes.
+
+    ``enqueue`` returns immediately; when a job finishes ``on_complete(scan_id,
+    result)`` is called from a background thread of the web process with the
+    job's result dict (``{'success': False, 'message'}`` if it raised).
+    ``enqueue``'s extra arguments are passed to ``job``; ``initializer`` runs
+    once in each worker process.
+
+    With ``threads`` the jobs run on threads of the web process instead, for
+    work that only waits on the process's own batching and inference pool
+    (async predictions, see app.run_async_prediction).
+    """
+
+    def __init__(self, on_complete, job, max_workers=1, initializer=None, threads=False):
+        self.on_complete = on_complete
+        self.max_workers = max(1, int(max_workers))
+        self.job = job
+        self.initializer = initializer
+        self.threads = threads
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None and self.threads:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='scan-job')
+            elif self._executor is None:
+                # spawn: never fork a process that may already have TF threads running
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=self.initializer,
+                )
+            return self._executor
+
+    def _reset_executor(self, broken):
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def enqueue(self, scan_id, *args, **kwargs):
+        executor = self._get_executor()
+        try:
+            future = executor.submit(self.job, *args, **kwargs)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM); start a fresh pool and retry once
+            self._reset_executor(executor)
+            executor = self._get_executor()
+            future = executor.submit(self.job, *args, **kwargs)
+        future.add_done_callback(lambda f: self._finish(scan_id, executor, f))
+
+    def _finish(self, scan_id, executor, future):
+        try:
+            result = future.result()
+        except BrokenProcessPool as e:
+            self._reset_executor(executor)
+            result = {'success': False, 'message': f'Worker process crashed: {e}'}
+        except Exception as e:
+            result = {'success': False, 'message': str(e)}
+
+        try:
+            self.on_complete(scan_id, result)
+        except Exception as e:
+            log.exception("❌ Failed to record result for scan %s: %s", scan_id, e)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
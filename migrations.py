@@ -0,0 +1,316 @@
+"""Versioned schema migrations for the doctors / patients / mri_scans database.
+
+Each migration is a function registered with ``@migration(version, description)``
+that receives a SQLAlchemy connection. ``upgrade`` applies the pending ones in
+order inside one transaction, records them in ``schema_migrations``, and holds
+a database-wide lock while doing so (``BEGIN IMMEDIATE`` on SQLite, an
+advisory lock on PostgreSQL), so several workers starting together apply each
+migration once.
+
+Migrations describe the schema as it was at that version with their own
+Table definitions; never import the models here. Add new ones at the bottom
+with the next version number.
+
+    python migrations.py            # upgrade to the latest version
+    python migrations.py --status
+"""
+import argparse
+import logging
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import (
+    Boolean, Column, Date, DateTime, Float, ForeignKey, Index, Integer, LargeBinary, MetaData, String, Table,
+    Text, text,
+)
+
+log = logging.getLogger(__name__)
+
+MIGRATIONS = []
+
+# Arbitrary constant identifying this app's migration lock on PostgreSQL
+ADVISORY_LOCK_KEY = 720_254_013
+
+
+def migration(version, description):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+# ----- migrations -----
+
+@migration(1, 'doctors, patients and mri_scans')
+def _initial_schema(conn):
+    # Databases created by db.create_all() before migrations existed already have these
+    metadata = MetaData()
+    Table(
+        'doctors', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('fullname', String(100), nullable=False),
+        Column('email', String(120), unique=True, nullable=False),
+        Column('password', String(255), nullable=False),
+        Column('phone', String(15), nullable=False),
+        Column('license', String(100), nullable=False, unique=True),
+        Column('specialization', String(100), nullable=False),
+        Column('hospital', String(150), nullable=False),
+        Column('created_at', DateTime),
+    )
+    Table(
+        'patients', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('fullname', String(100), nullable=False),
+        Column('email', String(120), unique=True, nullable=False),
+        Column('password', String(255), nullable=False),
+        Column('phone', String(15), nullable=False),
+        Column('age', Integer, nullable=False),
+        Column('gender', String(20), nullable=False),
+        Column('medical_history', Text),
+        Column('created_at', DateTime),
+    )
+    Table(
+        'mri_scans', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('doctor_id', Integer, ForeignKey('doctors.id'), nullable=False),
+        Column('patient_id', Integer, ForeignKey('patients.id'), nullable=True),
+        Column('filename', String(255), nullable=False),
+        Column('filepath', String(255), nullable=False),
+        Column('prediction', String(100)),
+        Column('confidence', Float),
+        Column('stage', String(50)),
+        Column('ai_suggestions', Text),
+        Column('created_at', DateTime),
+    )
+    metadata.create_all(conn, checkfirst=True)
+
+
+@migration(2, 'mri_scans (owner, created_at, id) indexes for dashboard pagination')
+def _scan_list_indexes(conn):
+    metadata = MetaData()
+    scans = Table('mri_scans', metadata, autoload_with=conn)
+    for index in (
+        Index('ix_mri_scans_doctor_created', scans.c.doctor_id, scans.c.created_at, scans.c.id),
+        Index('ix_mri_scans_patient_created', scans.c.patient_id, scans.c.created_at, scans.c.id),
+    ):
+        index.create(conn, checkfirst=True)
+
+
+@migration(3, 'scan_totals / scan_daily dashboard aggregates')
+def _scan_aggregates(conn):
+    metadata = MetaData()
+    totals = Table(
+        'scan_totals', metadata,
+        Column('owner_type', String(10), primary_key=True),
+        Column('owner_id', Integer, primary_key=True),
+        Column('prediction', String(100), primary_key=True),
+        Column('count', Integer, nullable=False),
+        Column('confidence_sum', Float, nullable=False),
+    )
+    Table(
+        'scan_daily', metadata,
+        Column('owner_type', String(10), primary_key=True),
+        Column('owner_id', Integer, primary_key=True),
+        Column('day', Date, primary_key=True),
+        Column('count', Integer, nullable=False),
+    )
+    metadata.create_all(conn, checkfirst=True)
+
+    if conn.execute(totals.select().limit(1)).first() is not None:
+        return
+    for owner_type, column in (('doctor', 'doctor_id'), ('patient', 'patient_id')):
+        conn.execute(text(
+            f"INSERT INTO scan_totals (owner_type, owner_id, prediction, count, confidence_sum) "
+            f"SELECT '{owner_type}', {column}, prediction, COUNT(*), COALESCE(SUM(confidence), 0) "
+            f"FROM mri_scans WHERE {column} IS NOT NULL GROUP BY {column}, prediction"
+        ))
+        conn.execute(text(
+            f"INSERT INTO scan_daily (owner_type, owner_id, day, count) "
+            f"SELECT '{owner_type}', {column}, DATE(created_at), COUNT(*) "
+            f"FROM mri_scans WHERE {column} IS NOT NULL GROUP BY {column}, DATE(created_at)"
+        ))
+
+
+@migration(4, 'scan_explanations Grad-CAM overlays')
+def _scan_explanations(conn):
+    metadata = MetaData()
+    Table('mri_scans', metadata, autoload_with=conn)
+    Table(
+        'scan_explanations', metadata,
+        Column('scan_id', Integer, ForeignKey('mri_scans.id'), primary_key=True),
+        Column('status', String(20), nullable=False),
+        Column('class_name', String(100)),
+        Column('overlay', LargeBinary),
+        Column('model_version', String(200)),
+        Column('error', Text),
+        Column('created_at', DateTime),
+    )
+    metadata.create_all(conn, checkfirst=True)
+
+
+@migration(5, 'user_sessions server-side session store')
+def _user_sessions(conn):
+    metadata = MetaData()
+    Table(
+        'user_sessions', metadata,
+        Column('id', String(64), primary_key=True),
+        Column('data', Text, nullable=False),
+        Column('created_at', DateTime, nullable=False),
+        Column('expires_at', DateTime, nullable=False),
+        Index('ix_user_sessions_expires_at', 'expires_at'),
+    )
+    metadata.create_all(conn, checkfirst=True)
+
+
+@migration(6, 'scan_embeddings similar-scan vectors')
+def _scan_embeddings(conn):
+    metadata = MetaData()
+    Table('mri_scans', metadata, autoload_with=conn)
+    Table(
+        'scan_embeddings', metadata,
+        Column('scan_id', Integer, ForeignKey('mri_scans.id'), primary_key=True),
+        Column('dim', Integer, nullable=False),
+        Column('vector', LargeBinary, nullable=False),
+        Column('model_version', String(200)),
+        Column('created_at', DateTime),
+    )
+    metadata.create_all(conn, checkfirst=True)
+
+
+@migration(7, 'mri_scans.class_probs and patient_progression time series')
+def _patient_progression(conn):
+    metadata = MetaData()
+    scans = Table('mri_scans', metadata, autoload_with=conn)
+    if 'class_probs' not in scans.c:
+        column_type = LargeBinary().compile(dialect=conn.dialect)
+        conn.execute(text(f"ALTER TABLE mri_scans ADD COLUMN class_probs {column_type}"))
+    Table('patients', metadata, autoload_with=conn)
+    # Rows are built from mri_scans the first time a patient's scans change (see app.update_progression)
+    Table(
+        'patient_progression', metadata,
+        Column('patient_id', Integer, ForeignKey('patients.id'), primary_key=True),
+        Column('points', Integer, nullable=False),
+        Column('series', LargeBinary),
+        Column('stage', String(100)),
+        Column('stage_since', DateTime),
+        Column('trend', String(20)),
+        Column('trend_per_year', Float),
+        Column('changes', Text),
+        Column('updated_at', DateTime),
+    )
+    metadata.create_all(conn, checkfirst=True)
+
+
+@migration(8, 'mri_scans.model_version')
+def _scan_model_version(conn):
+    scans = Table('mri_scans', MetaData(), autoload_with=conn)
+    if 'model_version' not in scans.c:
+        column_type = String(200).compile(dialect=conn.dialect)
+        conn.execute(text(f"ALTER TABLE mri_scans ADD COLUMN model_version {column_type}"))
+
+
+@migration(9, 'mri_scans.tta')
+def _scan_tta(conn):
+    scans = Table('mri_scans', MetaData(), autoload_with=conn)
+    if 'tta' not in scans.c:
+        column_type = Boolean().compile(dialect=conn.dialect)
+        conn.execute(text(f"ALTER TABLE mri_scans ADD COLUMN tta {column_type}"))
+
+
+@migration(10, 'patient_progression trends from same-day visits')
+def _progression_visits(conn):
+    # Summaries are rebuilt from the scans on their next read or scan (see app.patient_progression)
+    conn.execute(text("UPDATE patient_progression SET series = NULL"))
+
+
+@migration(11, 'mri_scans.claimed_at leases for Pending scans')
+def _scan_leases(conn):
+    if 'claimed_at' not in Table('mri_scans', MetaData(), autoload_with=conn).c:
+        column_type = DateTime().compile(dialect=conn.dialect)
+        conn.execute(text(f"ALTER TABLE mri_scans ADD COLUMN claimed_at {column_type}"))
+    scans = Table('mri_scans', MetaData(), autoload_with=conn)
+    Index('ix_mri_scans_prediction_claimed', scans.c.prediction, scans.c.claimed_at).create(conn, checkfirst=True)
+
+
+# ----- runner -----
+
+def _migrations_table(metadata=None):
+    return Table(
+        'schema_migrations', metadata or MetaData(),
+        Column('version', Integer, primary_key=True),
+        Column('description', String(200), nullable=False),
+        Column('applied_at', DateTime, nullable=False),
+    )
+
+
+@contextmanager
+def _locked(engine):
+    """A connection in a transaction that holds the migration lock."""
+    with engine.connect() as conn:
+        if conn.dialect.name == 'sqlite':
+            # Take the write lock up front; pysqlite would otherwise only lock at the first write
+            conn.exec_driver_sql('BEGIN IMMEDIATE')
+        elif conn.dialect.name == 'postgresql':
+            conn.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': ADVISORY_LOCK_KEY})
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+
+
+def applied_versions(conn):
+    table = _migrations_table()
+    table.create(conn, checkfirst=True)
+    return {row.version for row in conn.execute(table.select())}
+
+
+def upgrade(engine, target=None):
+    """Apply every pending migration up to ``target`` (default: latest). Returns the versions applied."""
+    applied = []
+    with _locked(engine) as conn:
+        done = applied_versions(conn)
+        table = _migrations_table()
+        for version, description, fn in MIGRATIONS:
+            if version in done or (target is not None and version > target):
+                continue
+            fn(conn)
+            conn.execute(table.insert().values(
+                version=version, description=description, applied_at=datetime.utcnow()
+            ))
+            applied.append(version)
+            log.info("✅ Migration %d: %s", version, description)
+    return applied
+
+
+def status(engine):
+    """``(version, description, applied)`` for every known migration."""
+    with engine.connect() as conn:
+        done = applied_versions(conn)
+        conn.commit()
+    return [(version, description, version in done) for version, description, _ in MIGRATIONS]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Apply database schema migrations')
+    parser.add_argument('--status', action='store_true', help='List migrations and whether they are applied')
+    parser.add_argument('--target', type=int, help='Stop at this version')
+    args = parser.parse_args(argv)
+
+    from app import app, db
+    with app.app_context():
+        if args.status:
+            for version, description, done in status(db.engine):
+                print(f"{'✅' if done else '  '} {version:>4}  {description}")
+        else:
+            applied = upgrade(db.engine, target=args.target)
+            if not applied:
+                print('Database schema is up to date')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
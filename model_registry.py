@@ -0,0 +1,253 @@
+"""Versioned model artifacts, the version being served and the shadow candidate.
+
+    python model_registry.py register alz_effnet_v2.keras --version v2 --notes "retrained on 2025 data"
+    python model_registry.py shadow v2 --sample-rate 0.1   # evaluate it on 10% of live batches
+    python model_registry.py status                        # ... and read its agreement with the active model
+    python model_registry.py activate v2                   # hot-swap every serving process to it
+    python model_registry.py rollback                      # back to the previous version
+    python model_registry.py list
+
+Layout under MODEL_REGISTRY_PATH:
+
+    <version>/<file>          the artifact, copied in once and never modified
+    <version>/manifest.json   version, backend, file, sha256, size, registered_at, notes
+    state.json                active / previous / shadow version and the shadow sample rate
+
+Versions are published by renaming a complete directory into place and
+state.json is replaced atomically, so readers never see a partial write.
+Processes that run the model poll state.json (one stat per
+MODEL_POLL_SECONDS, see predict.py) and swap models themselves, so no
+process has to be signalled. With no active version the app serves
+MODEL_PATH as before.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process dev server, no cross-process locking
+    fcntl = None
+
+# Artifact extension -> inference backend
+BACKEND_EXTENSIONS = {".keras": "keras", ".h5": "keras", ".tflite": "tflite", ".onnx": "onnx"}
+
+VERSION_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{0,99}$")
+
+DEFAULT_STATE = {"active": None, "previous": None, "shadow": None, "shadow_sample_rate": 0.0, "updated_at": None}
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class ModelRegistry:
+    """Model versions stored under ``root`` (see the module docstring)."""
+
+    def __init__(self, root):
+        self.root = root
+        self._state, self._signature = dict(DEFAULT_STATE), None
+
+    def _path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    @contextmanager
+    def _lock(self):
+        os.makedirs(self.root, exist_ok=True)
+        with open(self._path(".lock"), "a+b") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    # ----- versions -----
+
+    def register(self, path, version=None, backend=None, notes=""):
+        """Copy the model file at ``path`` in as a new version; returns its manifest.
+
+        ``version`` defaults to the file name plus the start of its hash, and
+        ``backend`` to the one its extension implies. Raises ValueError for an
+        unknown backend or a version that is invalid or already registered.
+        """
+        name = os.path.basename(path)
+        backend = backend or BACKEND_EXTENSIONS.get(os.path.splitext(name)[1].lower())
+        if backend not in BACKEND_EXTENSIONS.values():
+            raise ValueError(f"Can't tell the backend of {name}; pass one of keras, tflite, onnx")
+        digest = _sha256(path)
+        version = version or f"{os.path.splitext(name)[0]}-{digest[:8]}"
+        if not VERSION_PATTERN.match(version):
+            raise ValueError(f"Invalid version {version!r}: use letters, digits, '.', '_' and '-'")
+
+        os.makedirs(self.root, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".register-", dir=self.root)
+        try:
+            shutil.copyfile(path, os.path.join(staging, name))
+            manifest = {
+                "version": version,
+                "backend": backend,
+                "file": name,
+                "sha256": digest,
+                "size": os.path.getsize(path),
+                "registered_at": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+                "notes": notes,
+            }
+            with open(os.path.join(staging, "manifest.json"), "w") as f:
+                json.dump(manifest, f, indent=2)
+            with self._lock():
+                if os.path.exists(self._path(version)):
+                    raise ValueError(f"Version {version} is already registered")
+                os.rename(staging, self._path(version))
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        return self.manifest(version)
+
+    def manifest(self, version):
+        """The version's manifest, plus the artifact's absolute ``path``. Raises ValueError if unknown."""
+        try:
+            with open(self._path(version, "manifest.json")) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            raise ValueError(f"Unknown model version {version!r}")
+        manifest["path"] = os.path.abspath(self._path(version, manifest["file"]))
+        return manifest
+
+    def versions(self):
+        """Manifests of every registered version, oldest first."""
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+        manifests = [self.manifest(name) for name in names
+                     if os.path.isfile(self._path(name, "manifest.json"))]
+        return sorted(manifests, key=lambda m: (m["registered_at"], m["version"]))
+
+    # ----- serving state -----
+
+    def state(self):
+        """Active / previous / shadow versions and the shadow sample rate (re-read only when the file changes)."""
+        try:
+            st = os.stat(self._path("state.json"))
+        except FileNotFoundError:
+            return dict(DEFAULT_STATE)
+        signature = (st.st_mtime_ns, st.st_size, st.st_ino)
+        if signature != self._signature:
+            with open(self._path("state.json")) as f:
+                self._state = dict(DEFAULT_STATE, **json.load(f))
+            self._signature = signature
+        return dict(self._state)
+
+    def _update_state(self, **changes):
+        with self._lock():
+            self._signature = None
+            state = dict(self.state(), **changes, updated_at=datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"))
+            tmp = self._path(f"state.json.{os.getpid()}.tmp")
+            with open(tmp, "w") as f:
+                json.dump(state, f, indent=2)
+            os.replace(tmp, self._path("state.json"))
+        return state
+
+    def activate(self, version):
+        """Serve ``version`` from now on; serving processes swap to it within MODEL_POLL_SECONDS."""
+        self.manifest(version)
+        current = self.state()
+        if current["active"] == version:
+            return current
+        changes = {"active": version, "previous": current["active"]}
+        if current["shadow"] == version:
+            changes.update(shadow=None, shadow_sample_rate=0.0)  # promoted: nothing left to compare
+        return self._update_state(**changes)
+
+    def rollback(self):
+        """Serve the previously active version again. Raises ValueError if there is none."""
+        previous = self.state()["previous"]
+        if previous is None:
+            raise ValueError("No previous version to roll back to")
+        return self.activate(previous)
+
+    def set_shadow(self, version, sample_rate):
+        """Run ``version`` on ``sample_rate`` of live batches next to the active model (None turns it off)."""
+        if version is None:
+            return self._update_state(shadow=None, shadow_sample_rate=0.0)
+        self.manifest(version)
+        if not 0.0 < sample_rate <= 1.0:
+            raise ValueError("sample_rate must be in (0, 1]")
+        return self._update_state(shadow=version, shadow_sample_rate=float(sample_rate))
+
+
+def main(argv=None):
+    from config import Config
+
+    parser = argparse.ArgumentParser(description='Model registry: versions, hot-swap and shadow evaluation')
+    parser.add_argument('--root', default=Config.MODEL_REGISTRY_PATH, help='Registry directory (MODEL_REGISTRY_PATH)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    register = commands.add_parser('register', help='Add a model file as a new version')
+    register.add_argument('path')
+    register.add_argument('--version')
+    register.add_argument('--backend', choices=sorted(set(BACKEND_EXTENSIONS.values())))
+    register.add_argument('--notes', default='')
+    register.add_argument('--activate', action='store_true', help='Serve it straight away')
+    activate = commands.add_parser('activate', help='Hot-swap serving processes to a version')
+    activate.add_argument('version')
+    commands.add_parser('rollback', help='Serve the previously active version again')
+    shadow = commands.add_parser('shadow', help='Evaluate a version on a sample of live traffic')
+    shadow.add_argument('version', nargs='?')
+    shadow.add_argument('--sample-rate', type=float, default=0.05)
+    shadow.add_argument('--off', action='store_true')
+    commands.add_parser('list', help='Registered versions')
+    commands.add_parser('status', help='Serving state and shadow agreement')
+    args = parser.parse_args(argv)
+
+    registry = ModelRegistry(args.root)
+    try:
+        if args.command == 'register':
+            manifest = registry.register(args.path, version=args.version, backend=args.backend, notes=args.notes)
+            print(f"✅ Registered {manifest['version']} ({manifest['backend']}, sha256 {manifest['sha256'][:12]})")
+            if args.activate:
+                registry.activate(manifest['version'])
+        elif args.command == 'activate':
+            registry.activate(args.version)
+        elif args.command == 'rollback':
+            registry.rollback()
+        elif args.command == 'shadow':
+            if not args.off and not args.version:
+                parser.error('shadow needs a version, or --off')
+            registry.set_shadow(None if args.off else args.version, args.sample_rate)
+        elif args.command == 'list':
+            active = registry.state()['active']
+            for m in registry.versions():
+                marker = '*' if m['version'] == active else ' '
+                print(f"{marker} {m['version']:<30} {m['backend']:<7} {m['registered_at']}  {m['notes']}")
+            return 0
+    except ValueError as e:
+        parser.error(str(e))
+
+    state = registry.state()
+    for key in ('active', 'previous', 'shadow', 'shadow_sample_rate', 'updated_at'):
+        print(f'{key:>18}  {state[key]}')
+    if args.command == 'status':
+        from shadow import ShadowStats
+        for entry in ShadowStats(Config.SHADOW_STATS_PATH).summary():
+            print(f"\n{entry['shadow_version']} vs {entry['primary_version']}: {entry['images']} images, "
+                  f"agreement {entry['agreement']:.3f}, mean |Δp| {entry['mean_abs_diff']:.4f}, "
+                  f"{entry['mean_ms_per_image']:.1f} ms/image")
+            for primary, row in entry['confusion'].items():
+                print(f"  {primary:<20} -> {row}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""Prometheus metrics and logging setup.
+
+Metrics are served at /metrics. Under gunicorn (several worker processes) set
+PROMETHEUS_MULTIPROC_DIR to an empty, writable directory before starting, so
+every scrape aggregates all workers; gunicorn.conf.py clears out workers that
+exit. Without it each process reports its own samples.
+
+    alz_stage_seconds{stage=...}   upload_read, decode, resize, preprocess, forward, db_commit
+    alz_http_request_seconds       per endpoint / method / status
+    alz_batch_size                 images per model forward pass
+    alz_model_load_seconds         last model load
+    alz_prediction_cache_lookups_total{result=memory_hit|disk_hit|miss}
+    alz_inference_queue_depth      images waiting for a batch
+    alz_upload_writes_pending      uploads not yet written to storage
+    alz_inference_worker_events_total{event=restart|timeout|rejected}
+    alz_model_swaps_total{result=ok|failed}
+    alz_shadow_predictions_total{result=agree|disagree|dropped|error}
+"""
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+from config import Config
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STAGE_SECONDS = Histogram(
+    'alz_stage_seconds', 'Time spent in each stage of handling a scan', ['stage'], buckets=LATENCY_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    'alz_http_request_seconds', 'HTTP request latency', ['endpoint', 'method', 'status'], buckets=LATENCY_BUCKETS
+)
+BATCH_SIZE = Histogram(
+    'alz_batch_size', 'Images per model forward pass', buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+MODEL_LOAD_SECONDS = Gauge(
+    'alz_model_load_seconds', 'Seconds the last model load took', multiprocess_mode='max'
+)
+CACHE_LOOKUPS = Counter(
+    'alz_prediction_cache_lookups_total', 'Prediction cache lookups by outcome', ['result']
+)
+QUEUE_DEPTH = Gauge(
+    'alz_inference_queue_depth', 'Images waiting to be batched for the model', multiprocess_mode='livesum'
+)
+UPLOAD_WRITES_PENDING = Gauge(
+    'alz_upload_writes_pending', 'Uploads queued for storage but not written yet', multiprocess_mode='livesum'
+)
+INFERENCE_WORKER_EVENTS = Counter(
+    'alz_inference_worker_events_total', 'Inference process restarts, timeouts and rejected requests', ['event']
+)
+
+MODEL_SWAPS = Counter(
+    'alz_model_swaps_total', 'Hot-swaps to a newly activated model version by outcome', ['result']
+)
+SHADOW_PREDICTIONS = Counter(
+    'alz_shadow_predictions_total', 'Images evaluated by the shadow model by outcome', ['result']
+)
+
+
+@contextmanager
+def timed(stage):
+    """Observe the duration of the ``with`` block as ``alz_stage_seconds{stage=...}``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(stage).observe(time.perf_counter() - start)
+
+
+def render_metrics():
+    """``(body, content_type)`` for the /metrics endpoint."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid):
+    """Drop an exited process's live gauges (multiprocess mode only)."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid)
+
+
+# ----- logging -----
+
+# Attributes every LogRecord has; anything else came in through ``extra=``
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with any ``extra=`` fields as keys."""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'pid': record.process,
+            'message': record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def configure_logging(level=None, fmt=None):
+    """Send log records to stdout at LOG_LEVEL, as text or JSON lines (LOG_FORMAT)."""
+    level = (level or Config.LOG_LEVEL).upper()
+    fmt = fmt or Config.LOG_FORMAT
+    handler = logging.StreamHandler(sys.stdout)
+    if fmt == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s [%(process)d] %(name)s: %(message)s'))
+
+    root = logging.getLogger()
+    for old in [h for h in root.handlers if getattr(h, '_alz_handler', False)]:
+        root.removeHandler(old)
+    handler._alz_handler = True
+    root.addHandler(handler)
+    root.setLevel(level)
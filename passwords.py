@@ -0,0 +1,51 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HashingBusy(RuntimeError):
+    """Too many password hashes are already waiting; the caller should answer 503."""
+
+
+class PasswordHasher:
+    """Hashes and verifies passwords on a few dedicated threads.
+
+    scrypt and pbkdf2 run without the GIL, so request threads keep serving
+    while a hash is computed, but at most ``workers`` hashes run at once: a
+    login storm queues here instead of taking every core from dashboards and
+    predictions. Past ``max_queue`` waiting hashes, ``HashingBusy`` is raised.
+    """
+
+    def __init__(self, method, workers=2, max_queue=32):
+        self.method = method
+        workers = max(1, int(workers))
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._slots = threading.BoundedSemaphore(workers + max(0, int(max_queue)))
+        self._prefix = None
+        self.rejected = 0
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """Whether ``pwhash`` was made with other parameters than ``method`` (e.g. PASSWORD_HASH_METHOD changed)."""
+        if self._prefix is None:
+            # 'scrypt' -> 'scrypt:32768:8:1': let Werkzeug fill in its defaults once
+            self._prefix = self.hash("").split("$", 1)[0]
+        return pwhash.split("$", 1)[0] != self._prefix
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HashingBusy("Too many sign-ins in progress, try again shortly")
+        try:
+            future = self._pool.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
@@ -134,116 +134,656 @@
 
 from PIL import Image
 import numpy as np
-import tensorflow as tf
-from tensorflow.keras.models import load_model
-from tensorflow.keras.applications.efficientnet import preprocess_input
-from tensorflow.keras.layers import Layer
+from itertools import islice
+import logging
+import threading
+import time
 import os
 
-# Model path
+from augmentation import parse_views, tta_batch
+from batching import InferenceBusy
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from config import Config
+from inference_backends import create_backend, tag_output
+from model_registry import DEFAULT_STATE, ModelRegistry
+from observability import BATCH_SIZE, MODEL_LOAD_SECONDS, MODEL_SWAPS, timed
+from shadow import ShadowRunner, ShadowStats
+from preprocessing import ImagePreprocessor
+from volumes import is_volume_path, iter_volume_slices
+
+log = logging.getLogger(__name__)
+
+# TensorFlow is imported lazily (in load_alzheimer_model) so the web app can start
+# serving logins and dashboards without paying the TF import.
+
+# Model path and backend (keras / tflite / onnx)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-MODEL_PATH = os.path.join(BASE_DIR, "alz_effnet_clean.keras")
-model = None
+MODEL_PATH = Config.MODEL_PATH
+INFERENCE_BACKEND = Config.INFERENCE_BACKEND
+model = None  # an inference_backends backend, exposing predict(batch)
+loaded_model_version = None
+# Extra checkpoints averaged in by predict_batch(..., ensemble=True) (ENSEMBLE_MODEL_PATHS)
+ensemble_models = None
+TTA_VIEWS = parse_views(Config.TTA_VIEWS)
+
+# Readiness: not_loaded -> loading -> loaded -> ready once a forward pass has run (or failed)
+model_state = "not_loaded"
+model_error = None
+model_load_seconds = None
+_model_lock = threading.Lock()
+_warmup_thread = None
+
+# Versioned models (model_registry.py): the registry's active version, when set, is served
+# instead of MODEL_PATH. Processes running the model poll it and hot-swap (see swap_model).
+registry = ModelRegistry(Config.MODEL_REGISTRY_PATH)
+_registry_state = None
+_registry_checked = 0.0
+_serving_lock = threading.Lock()  # model and loaded_model_version change together
+_swap_lock = threading.Lock()
+_swap_thread = None
+_swap_target = None
+_swap_failed = None  # a version that failed to load is not retried until another one is activated
+# Runs the registry's shadow version on sampled batches (shadow.py); created on first use
+shadow_runner = None
+
+# Set by use_inference_pool(): forward passes then run on dedicated inference
+# processes (inference_pool.InferencePool) and this process never loads the model
+inference_pool = None
+
+# Shared decode/resize engine (thread pool + reusable input buffers)
+preprocessor = ImagePreprocessor(
+    num_threads=Config.PREPROCESS_THREADS or None,
+    jpeg_draft=Config.PREPROCESS_JPEG_DRAFT,
+)
+
+# Order must match train_gen.class_indices:
+# {'MildDemented': 0, 'ModerateDemented': 1, 'NonDemented': 2, 'VeryMildDemented': 3}
+CLASS_NAMES = [
+    "Very Mild Demented",       # index 0
+    "Moderate Demented",   # index 1
+    "Non-Demented",        # index 2
+    "Mild Demented",  # index 3
+]
+
+
+def preprocess_input(x):
+    # Same as tensorflow.keras.applications.efficientnet.preprocess_input, which is a
+    # pass-through: EfficientNet rescales/normalizes inside the model itself.
+    return x
+
+
+def _custom_objects():
+    import tensorflow as tf
+    from tensorflow.keras.layers import Layer
+
+    class CastLayer(Layer):
+        def __init__(self, **kwargs):
+            super(CastLayer, self).__init__(**kwargs)
+
+        def call(self, x):
+            return tf.cast(x, tf.float32)
+
+        def get_config(self):
+            return super(CastLayer, self).get_config()
+
+    return {"Cast": CastLayer}
+
+
+def configure_tensorflow_threads():
+    """Apply TF_INTRA_OP_THREADS / TF_INTER_OP_THREADS; must run before TF executes anything."""
+    if not (Config.TF_INTRA_OP_THREADS or Config.TF_INTER_OP_THREADS):
+        return
+    import tensorflow as tf
+    try:
+        if Config.TF_INTRA_OP_THREADS:
+            tf.config.threading.set_intra_op_parallelism_threads(Config.TF_INTRA_OP_THREADS)
+        if Config.TF_INTER_OP_THREADS:
+            tf.config.threading.set_inter_op_parallelism_threads(Config.TF_INTER_OP_THREADS)
+    except RuntimeError as e:
+        log.warning("⚠️ TensorFlow thread settings ignored: %s", e)
+
+
+def _keras_options():
+    configure_tensorflow_threads()
+    return {
+        "custom_objects": _custom_objects(),
+        "compiled": Config.KERAS_COMPILED,
+        "jit_compile": Config.KERAS_JIT_COMPILE,
+        "precision": Config.KERAS_PRECISION or None,
+        "embeddings": Config.EMBEDDINGS_ENABLED,
+        "embedding_layer": Config.EMBEDDING_LAYER or None,
+    }
+
+
+def _backend_options(backend=None):
+    if (backend or INFERENCE_BACKEND) == "keras":
+        return _keras_options()
+    return {"num_threads": Config.INFERENCE_THREADS or None}
+
+
+# TensorFlow's runtime hangs in a child forked after a model was loaded; these don't
+FORK_SAFE_BACKENDS = ("tflite", "onnx")
+
+
+def preload_model():
+    """Load the model before a pre-fork server forks, when that is safe.
+
+    Forked workers then share the weights copy-on-write instead of each loading
+    a copy. Returns True if the model was loaded here.
+    """
+    if not Config.PRELOAD_MODEL or Config.INFERENCE_WORKERS or active_artifact()[0] not in FORK_SAFE_BACKENDS:
+        return False
+    return load_alzheimer_model() is not None
 
 
-class CastLayer(Layer):
-    def __init__(self, **kwargs):
-        super(CastLayer, self).__init__(**kwargs)
+def model_file_version(path=MODEL_PATH):
+    """Cheap fingerprint of a model file: changes whenever the file is replaced."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return "missing"
+    return f"{os.path.basename(path)}:{st.st_size}:{st.st_mtime_ns}"
+
+
+def active_artifact():
+    """``(backend, path, version)`` to serve: the registry's active version, else MODEL_PATH."""
+    active = registry.state()["active"]
+    if active:
+        manifest = registry.manifest(active)
+        return manifest["backend"], manifest["path"], active
+    return INFERENCE_BACKEND, MODEL_PATH, model_file_version()
 
-    def call(self, x):
-        return tf.cast(x, tf.float32)
 
-    def get_config(self):
-        return super(CastLayer, self).get_config()
+def model_version():
+    """Version of the model predictions come from (the one that would be loaded, if none is yet)."""
+    return loaded_model_version or active_artifact()[2]
+
+
+def load_model_version(version, embeddings=True):
+    """A backend for registry ``version``."""
+    manifest = registry.manifest(version)
+    options = _backend_options(manifest["backend"])
+    if "embeddings" in options:
+        options["embeddings"] = options["embeddings"] and embeddings
+    return create_backend(manifest["backend"], manifest["path"], **options)
 
 
 def load_alzheimer_model():
-    global model
-    if model is None:
-        print("Loading model from:", MODEL_PATH)
-        print("File exists?", os.path.exists(MODEL_PATH))
-        try:
-            model = load_model(
-                MODEL_PATH,
-                custom_objects={"Cast": CastLayer},
-                compile=False,
-            )
-            print("✅ Model loaded successfully!")
-            print("Model input shape:", model.input_shape)  # expect (None, 224, 224, 3)
-        except Exception as e:
-            print(f"❌ Model load error: {e}")
-            model = None
+    global model, loaded_model_version, model_state, model_error, model_load_seconds
+    if model is not None:
+        return model
+
+    # Request threads and the warm-up thread must not load the model twice
+    with _model_lock:
+        if model is None:
+            model_state = "loading"
+            start = time.perf_counter()
+            try:
+                backend, path, version = active_artifact()
+                log.info("Loading %s model %s from %s (exists: %s)", backend, version, path, os.path.exists(path))
+                loaded = create_backend(backend, path, **_backend_options(backend))
+                with _serving_lock:
+                    model, loaded_model_version = loaded, version
+                model_load_seconds = time.perf_counter() - start
+                model_state = "loaded"
+                model_error = None
+                MODEL_LOAD_SECONDS.set(model_load_seconds)
+                # input shape: expect (None, 224, 224, 3)
+                log.info("✅ Model loaded in %.1fs, input shape %s", model_load_seconds, model.input_shape)
+            except Exception as e:
+                log.error("❌ Model load error: %s", e)
+                model = None
+                model_state = "failed"
+                model_error = str(e)
     return model
 
 
-def preprocess_image(image_path):
+def load_ensemble_models():
+    """The ENSEMBLE_MODEL_PATHS checkpoints, loaded with the main model's backend on first use."""
+    global ensemble_models
+    if ensemble_models is None:
+        with _model_lock:
+            if ensemble_models is None:
+                ensemble_models = [
+                    create_backend(INFERENCE_BACKEND, path.strip(), **_backend_options())
+                    for path in Config.ENSEMBLE_MODEL_PATHS
+                ]
+    return ensemble_models
+
+
+def warm_up_model():
+    """Load the model and run one dummy inference so the first real request doesn't pay for tracing."""
+    global model_state, model_error
+    if load_alzheimer_model() is None:
+        return False
+    try:
+        # Ensemble checkpoints, if any, are loaded and warmed too
+        predict_batch(np.zeros((1, 224, 224, 3), dtype="float32"), ensemble=bool(Config.ENSEMBLE_MODEL_PATHS))
+        log.info("✅ Model warmed up")
+        return True
+    except Exception as e:
+        log.error("❌ Model warm-up error: %s", e)
+        model_state = "failed"
+        model_error = str(e)
+        return False
+
+
+def start_background_warmup():
+    """Warm the model up on a daemon thread; returns immediately."""
+    global _warmup_thread
+    if _warmup_thread is None or not _warmup_thread.is_alive():
+        _warmup_thread = threading.Thread(target=warm_up_model, name="model-warmup", daemon=True)
+        _warmup_thread.start()
+    return _warmup_thread
+
+
+def _poll_registry():
+    """The registry state, re-read at most every MODEL_POLL_SECONDS.
+
+    Starts a hot-swap when the active version is not the one being served.
+    """
+    global _registry_state, _registry_checked
+    now = time.monotonic()
+    if _registry_state is not None and now - _registry_checked < Config.MODEL_POLL_SECONDS:
+        return _registry_state
+    _registry_checked = now
+    try:
+        _registry_state = registry.state()
+    except (OSError, ValueError) as e:
+        log.warning("⚠️ Model registry unreadable: %s", e)
+        return _registry_state or dict(DEFAULT_STATE)
+    active = _registry_state["active"]
+    if active and model is not None and active not in (loaded_model_version, _swap_failed):
+        start_swap(active)
+    return _registry_state
+
+
+def start_swap(version):
+    """Run ``swap_model(version)`` on a background thread, unless a swap is already running."""
+    global _swap_thread, _swap_target
+    with _swap_lock:
+        if _swap_thread is None or not _swap_thread.is_alive():
+            _swap_target = version
+            _swap_thread = threading.Thread(target=swap_model, args=(version,), name="model-swap", daemon=True)
+            _swap_thread.start()
+        return _swap_thread
+
+
+def swap_model(version):
+    """Load registry ``version`` and run one dummy batch through it, then serve it.
+
+    The current model keeps serving until then: batches already running
+    finish on it and no request waits for the load. Returns True on success.
+    """
+    global model, loaded_model_version, model_load_seconds, _swap_failed
+    log.info("🔄 Loading model %s to swap in", version)
+    start = time.perf_counter()
     try:
-        # Load as RGB (training used RGB with EfficientNetB3)
-        img = Image.open(image_path).convert("RGB")  # 3 channels
+        new_model = load_model_version(version)
+        new_model.predict(np.zeros((1, 224, 224, 3), dtype="float32"))
+    except Exception as e:
+        log.error("❌ Model %s failed to load, still serving %s: %s", version, loaded_model_version, e)
+        _swap_failed = version
+        MODEL_SWAPS.labels("failed").inc()
+        return False
+    with _serving_lock:
+        previous = loaded_model_version
+        model, loaded_model_version = new_model, version
+    model_load_seconds = time.perf_counter() - start
+    MODEL_LOAD_SECONDS.set(model_load_seconds)
+    MODEL_SWAPS.labels("ok").inc()
+    log.info("✅ Swapped model %s -> %s (loaded in %.1fs)", previous, version, model_load_seconds)
+    return True
+
+
+def _shadow_runner():
+    global shadow_runner
+    if shadow_runner is None:
+        with _swap_lock:
+            if shadow_runner is None:
+                shadow_runner = ShadowRunner(
+                    lambda version: load_model_version(version, embeddings=False),
+                    ShadowStats(Config.SHADOW_STATS_PATH),
+                    CLASS_NAMES,
+                    queue_size=Config.SHADOW_QUEUE_SIZE,
+                )
+    return shadow_runner
+
+
+def use_inference_pool(pool):
+    """Send every forward pass (``predict_batch``) of this process to ``pool``."""
+    global inference_pool
+    inference_pool = pool
+
+
+def get_model_status():
+    if inference_pool is not None:
+        return inference_pool.status()
+    swapping = _swap_thread is not None and _swap_thread.is_alive()
+    return {
+        "state": model_state,
+        "ready": model_state == "ready",
+        "model_version": loaded_model_version,
+        "swapping_to": _swap_target if swapping else None,
+        "load_seconds": model_load_seconds,
+        "error": model_error,
+    }
+
 
-        # Resize to 224x224 (training size)
-        img = img.resize((224, 224))
+def load_image(source):
+    """Decode an image path, bytes or file object (grayscale or RGB), None on failure."""
+    try:
+        with timed("decode"):
+            return preprocessor.open(source)
+    except Exception as e:
+        log.warning("Preprocess error: %s", e)
+        return None
 
-        # Convert to numpy
-        img = np.array(img).astype("float32")        # (224, 224, 3)
 
-        # Same preprocessing as training
-        img = preprocess_input(img)
+def preprocess_image(image, out=None):
+    """Preprocess an image path/bytes (or an already decoded image) to a (1, 224, 224, 3) batch.
 
-        # Add batch dimension
-        img_array = np.expand_dims(img, axis=0)      # (1, 224, 224, 3)
-        print("✅ Preprocessed shape:", img_array.shape)
-        return img_array
+    Writes into ``out`` when given (e.g. a slot of ``preprocessor.buffer``),
+    otherwise into a new array.
+    """
+    try:
+        with timed("preprocess"):
+            if isinstance(image, Image.Image):
+                img = image
+            else:
+                with timed("decode"):
+                    img = preprocessor.open(image)
+            if out is None:
+                out = np.empty((1, 224, 224, 3), dtype="float32")
+
+            # Resize to 224x224 (training size), RGB, float32 (training used RGB with EfficientNetB3)
+            with timed("resize"):
+                preprocessor.write(img, out[0])
+
+            # Same preprocessing as training
+            return preprocess_input(out)
     except Exception as e:
-        print("Preprocess error:", e)
+        log.warning("Preprocess error: %s", e)
         return None
 
 
-def predict_alzheimer(image_path):
+def predict_batch(img_batch, ensemble=False):
+    """Run one forward pass over a (N, 224, 224, 3) batch, returns (N, 4) probabilities.
+
+    When the backend emits embeddings (EMBEDDINGS_ENABLED, keras backend) each
+    row continues with the image's embedding: (N, 4 + d), see ``split_row``.
+
+    With ``ensemble`` the batch also goes through every ENSEMBLE_MODEL_PATHS
+    checkpoint (one pass each) and the probabilities are averaged; the
+    embedding stays the main model's.
+
+    The rows are tagged with the version of the model that produced them
+    (``inference_backends.ModelOutput``). A sampled share of non-ensemble
+    batches is also queued for the registry's shadow version, if any.
+    """
+    global model_state
+    if inference_pool is not None:
+        return inference_pool.predict(img_batch, ensemble=ensemble)
+    if load_alzheimer_model() is None:
+        raise RuntimeError("Model not loaded")
+    state = _poll_registry()
+    with _serving_lock:
+        current, version = model, loaded_model_version
+    BATCH_SIZE.observe(len(img_batch))
+    with timed("forward"):
+        probs = current.predict(img_batch)
+        if ensemble:
+            members = load_ensemble_models()
+            if members:
+                c = len(CLASS_NAMES)
+                mean = (probs[:, :c] + sum(member.predict(img_batch)[:, :c] for member in members)) / (1 + len(members))
+                probs = np.concatenate([mean, probs[:, c:]], axis=1)
+    if model_state == "loaded":
+        model_state = "ready"
+    if state["shadow"] and not ensemble and state["shadow"] != version:
+        _shadow_runner().submit(img_batch, probs, version or model_version(), state["shadow"],
+                                state["shadow_sample_rate"])
+    elif not state["shadow"] and shadow_runner is not None:
+        shadow_runner.release()
+    return tag_output(probs, version)
+
+
+def split_row(row):
+    """``(probs, embedding)`` of one ``predict_batch`` row; embedding is None if the row has none."""
+    c = len(CLASS_NAMES)
+    return row[:c], (row[c:] if len(row) > c else None)
+
+
+def format_prediction(row, version=None):
+    """Turn one row of class probabilities into the API result dict.
+
+    A row carrying an embedding adds it as ``result["embedding"]`` (float16).
+    ``result["model_version"]`` is ``version``, else the row's tag (see
+    ``predict_batch``), else the current ``model_version()``.
+    """
+    probs, embedding = split_row(row)
+    predicted_class_idx = int(np.argmax(probs))
+    predicted_class = CLASS_NAMES[predicted_class_idx]
+    confidence = float(probs[predicted_class_idx])
+
+    class_probs = {
+        class_name: float(probs[i])
+        for i, class_name in enumerate(CLASS_NAMES)
+    }
+
+    result = {
+        "success": True,
+        "prediction": predicted_class,
+        "confidence": confidence,
+        "classes": class_probs,
+        "model_version": version or getattr(row, "model_version", None) or model_version(),
+    }
+    if embedding is not None:
+        result["embedding"] = np.asarray(embedding, dtype=np.float16)
+    return result
+
+
+def predict_alzheimer(image_path, scheduler=None, cache=None, content_key=None, tta=False):
+    """Predict one image path, bytes or file object.
+
+    ``content_key`` (a cache key for the raw file bytes, see
+    ``PredictionCache.content_key``) lets byte-identical uploads skip decoding.
+
+    ``tta`` is the high-confidence mode: the TTA_VIEWS augmentations of the
+    image (and any ensemble checkpoints) are predicted as one stacked batch and
+    averaged. It bypasses the scheduler and the cache.
+    """
+    if tta:
+        scheduler = cache = content_key = None
     try:
-        model = load_alzheimer_model()
-        if model is None:
-            return {"success": False, "message": "Model not loaded"}
+        if cache is not None and content_key is not None:
+            cached = cache.get(content_key)
+            if cached is not None:
+                return format_prediction(cached)
+
+        img = load_image(image_path)
+        if img is None:
+            return {"success": False, "message": "Preprocessing failed"}
 
-        img_array = preprocess_image(image_path)
+        # Repeat uploads of the same pixels skip preprocessing and the forward pass
+        cache_key = None
+        if cache is not None:
+            cache_key = cache.key_for(img)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                if content_key is not None:
+                    cache.put(content_key, cached)
+                return format_prediction(cached)
+
+        if scheduler is None and inference_pool is None:
+            model = load_alzheimer_model()
+            if model is None:
+                return {"success": False, "message": "Model not loaded"}
+
+        # This thread's reusable buffer: free again once the forward pass below returns
+        img_array = preprocess_image(img, out=preprocessor.buffer(1))
         if img_array is None:
             return {"success": False, "message": "Preprocessing failed"}
 
-        print("Input shape to model.predict:", img_array.shape)
-        prediction = model.predict(img_array, verbose=0)
-        print("Prediction shape:", prediction.shape)
-        print("Prediction vector:", prediction[0], "sum=", prediction[0].sum())
-
-        # Order must match train_gen.class_indices:
-        # {'MildDemented': 0, 'ModerateDemented': 1, 'NonDemented': 2, 'VeryMildDemented': 3}
-        class_names = [
-            "Very Mild Demented",       # index 0
-            "Moderate Demented",   # index 1
-            "Non-Demented",        # index 2
-            "Mild Demented",  # index 3
-        ]
-
-        predicted_class_idx = int(np.argmax(prediction[0]))
-        predicted_class = class_names[predicted_class_idx]
-        confidence = float(prediction[0][predicted_class_idx])
-
-        class_probs = {
-            class_name: float(prediction[0][i])
-            for i, class_name in enumerate(class_names)
-        }
-
-        return {
-            "success": True,
-            "prediction": predicted_class,
-            "confidence": confidence,
-            "classes": class_probs,
-        }
+        if tta:
+            view_probs = predict_batch(tta_batch(img_array[0], TTA_VIEWS), ensemble=True)
+            probs = view_probs.mean(axis=0)
+            result = format_prediction(probs, version=getattr(view_probs, "model_version", None))
+            result["tta"] = {
+                "views": list(TTA_VIEWS),
+                "models": 1 + len(Config.ENSEMBLE_MODEL_PATHS),
+                # Share of views whose own top class matches the averaged one
+                "view_agreement": float(np.mean(
+                    view_probs[:, :len(CLASS_NAMES)].argmax(axis=1) == int(np.argmax(probs[:len(CLASS_NAMES)]))
+                )),
+            }
+            return result
+        elif scheduler is not None:
+            # Coalesced with concurrent requests into a single forward pass
+            probs = scheduler.submit(img_array[0])
+        else:
+            probs = predict_batch(img_array)[0]
+            log.debug("Prediction vector: %s", probs)
+
+        if cache is not None:
+            version = getattr(probs, "model_version", None)
+            cache.put(cache_key, probs, version=version)
+            if content_key is not None:
+                cache.put(content_key, probs, version=version)
+        return format_prediction(probs)
+
+    except (InferenceBusy, TimeoutError, FutureTimeoutError):
+        raise  # overload, not a bad image: the caller answers 503 / 504
+    except Exception as e:
+        log.error("❌ Prediction error: %s", e)
+        return {"success": False, "message": str(e)}
+
+
+def predict_alzheimer_batch(image_paths, batch_size=16, cache=None):
+    """Predict many images with one forward pass per ``batch_size`` images.
+
+    ``image_paths`` may be any iterable (e.g. a directory scan) and is consumed
+    lazily. Yields one list of ``(image_path, result)`` per chunk, in input order;
+    ``result`` has the same shape as ``predict_alzheimer``'s return value.
+    """
+    image_paths = iter(image_paths)
+    while True:
+        chunk = list(islice(image_paths, batch_size))
+        if not chunk:
+            return
+
+        results = [None] * len(chunk)
+
+        # Decode on the thread pool, then answer what we can from the cache
+        images = preprocessor.map(load_image, chunk)
+        misses = []
+        for i, img in enumerate(images):
+            if img is None:
+                results[i] = {"success": False, "message": "Preprocessing failed"}
+                continue
+            cache_key = cache.key_for(img) if cache is not None else None
+            cached = cache.get(cache_key) if cache_key is not None else None
+            if cached is not None:
+                results[i] = format_prediction(cached)
+            else:
+                misses.append((i, img, cache_key))
+
+        if misses:
+            # Resize every miss straight into one reusable (N, 224, 224, 3) buffer
+            batch = preprocessor.buffer(len(misses))
+            ok = preprocessor.map(
+                lambda j: preprocess_image(misses[j][1], out=batch[j:j + 1]) is not None,
+                range(len(misses)),
+            )
+            for (i, _, _), good in zip(misses, ok):
+                if not good:
+                    results[i] = {"success": False, "message": "Preprocessing failed"}
+            if not all(ok):
+                batch = batch[np.flatnonzero(ok)]
+                misses = [miss for miss, good in zip(misses, ok) if good]
+
+            try:
+                probs = predict_batch(batch) if misses else []
+                for (i, _, cache_key), row in zip(misses, probs):
+                    if cache_key is not None:
+                        cache.put(cache_key, row, version=getattr(row, "model_version", None))
+                    results[i] = format_prediction(row)
+            except Exception as e:
+                log.error("❌ Batch prediction error: %s", e)
+                for i, _, _ in misses:
+                    results[i] = {"success": False, "message": str(e)}
+
+        yield list(zip(chunk, results))
+
+
+def predict_volume(source, batch_size=16, aggregation=None):
+    """Predict a DICOM series / NIfTI volume from its sampled axial slices.
+
+    ``source`` is a .nii/.nii.gz or .dcm path, or a list of DICOM slice paths
+    sorted along the axis (see ``volumes.group_dicom_series``). Slices are
+    streamed ``batch_size`` at a time into the reusable input buffer, so at
+    most one chunk of slices is in memory. The study result combines the
+    per-slice probabilities by ``aggregation`` ('mean' or 'max', default
+    ``Config.VOLUME_AGGREGATION``); both are returned.
+    """
+    aggregation = aggregation or Config.VOLUME_AGGREGATION
+    try:
+        slices = iter_volume_slices(
+            source,
+            fraction=Config.VOLUME_SLICE_FRACTION,
+            max_slices=Config.VOLUME_MAX_SLICES,
+        )
+        total = np.zeros(len(CLASS_NAMES), dtype="float64")
+        peak = np.zeros(len(CLASS_NAMES), dtype="float64")
+        embedding_total = None
+        version = None
+        count = 0
+        while True:
+            chunk = list(islice(slices, batch_size))
+            if not chunk:
+                break
+            batch = preprocessor.buffer(len(chunk))
+            for j, pixels in enumerate(chunk):
+                preprocessor.write(Image.fromarray(pixels, "L"), batch[j])
+            rows = predict_batch(preprocess_input(batch))
+            version = getattr(rows, "model_version", None)
+            probs = rows[:, :len(CLASS_NAMES)]
+            if rows.shape[1] > len(CLASS_NAMES):
+                # The study's embedding is the mean of its slices'
+                embeddings = rows[:, len(CLASS_NAMES):].sum(axis=0, dtype="float64")
+                embedding_total = embeddings if embedding_total is None else embedding_total + embeddings
+            total += probs.sum(axis=0)
+            peak = np.maximum(peak, probs.max(axis=0))
+            count += len(chunk)
+
+        if count == 0:
+            return {"success": False, "message": "No usable slices in volume"}
+
+        mean = total / count
+        study = peak / peak.sum() if aggregation == "max" else mean
+        result = format_prediction(study, version=version)
+        if embedding_total is not None:
+            result["embedding"] = (embedding_total / count).astype(np.float16)
+        result.update({
+            "aggregation": aggregation,
+            "slices": count,
+            "mean_classes": dict(zip(CLASS_NAMES, mean.tolist())),
+            "max_classes": dict(zip(CLASS_NAMES, peak.tolist())),
+        })
+        return result
 
     except Exception as e:
-        print("❌ Prediction error:", e)
+        log.error("❌ Volume prediction error: %s", e)
         return {"success": False, "message": str(e)}
 
 
+def predict_file(path, scheduler=None, cache=None, tta=False):
+    """``predict_volume`` for DICOM / NIfTI files, ``predict_alzheimer`` for 2D images."""
+    if is_volume_path(path):
+        return predict_volume(path, batch_size=Config.BATCH_PREDICT_SIZE)
+    return predict_alzheimer(path, scheduler=scheduler, cache=cache, tta=tta)
+
+
 def get_ai_suggestions(prediction_class):
     suggestions = {
         "Non-Demented": (
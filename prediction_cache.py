@@ -0,0 +1,156 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from observability import CACHE_LOOKUPS
+
+log = logging.getLogger(__name__)
+
+
+class PredictionCache:
+    """Two-tier cache of class probabilities keyed by decoded pixel content.
+
+    Keys are a hash of the decoded RGB pixels (so the same slice re-encoded or
+    renamed still hits) combined with the model version; byte-identical uploads
+    can also be looked up by a hash of the raw file (``content_key``). Lookups go to an
+    in-memory LRU first, then to a SQLite table shared by all processes.
+    Whenever ``version_fn()`` reports a new model version the memory tier is
+    cleared and persisted rows for other versions are deleted.
+    """
+
+    def __init__(self, db_path, version_fn, max_entries=1024):
+        self.db_path = db_path
+        self.version_fn = version_fn
+        self.max_entries = max(0, int(max_entries))
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._version = None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    # ----- keys -----
+
+    @staticmethod
+    def pixel_digest(img):
+        """Hash of a decoded PIL image's pixels, independent of file name and encoding."""
+        h = hashlib.blake2b(digest_size=20)
+        h.update(f"{img.mode}:{img.size[0]}x{img.size[1]}:".encode())
+        h.update(img.tobytes())
+        return h.hexdigest()
+
+    def key_for(self, img):
+        return self.pixel_digest(img)
+
+    @staticmethod
+    def content_key(digest):
+        """Key for a raw-bytes digest: identical files hit without being decoded."""
+        return f"file:{digest}"
+
+    # ----- lookups -----
+
+    def get(self, key):
+        """Return the cached probabilities for ``key`` or None."""
+        with self._lock:
+            version = self._check_version()
+            probs = self._memory.get(key)
+            if probs is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                CACHE_LOOKUPS.labels("memory_hit").inc()
+                return probs
+
+            row = self._connection().execute(
+                "SELECT probs FROM prediction_cache WHERE key = ? AND model_version = ?",
+                (key, version),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                CACHE_LOOKUPS.labels("miss").inc()
+                return None
+
+            probs = np.frombuffer(row[0], dtype=np.float32)
+            self._remember(key, probs)
+            self.disk_hits += 1
+            CACHE_LOOKUPS.labels("disk_hit").inc()
+            return probs
+
+    def put(self, key, probs, version=None):
+        """Store ``probs``; skipped if ``version`` (of the model that produced them) isn't the current one."""
+        probs = np.asarray(probs, dtype=np.float32).copy()
+        with self._lock:
+            current = self._check_version()
+            if version is not None and version != current:
+                return  # predicted by the model being swapped out
+            version = current
+            self._remember(key, probs)
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO prediction_cache (key, model_version, probs, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, version, probs.tobytes(), time.time()),
+            )
+            conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            conn = self._connection()
+            conn.execute("DELETE FROM prediction_cache")
+            conn.commit()
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "model_version": self._version,
+            "memory_entries": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+    # ----- internals (caller holds self._lock) -----
+
+    def _remember(self, key, probs):
+        if self.max_entries == 0:
+            return
+        self._memory[key] = probs
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _check_version(self):
+        version = self.version_fn()
+        if version != self._version:
+            if self._version is not None:
+                log.info("🔁 Model changed (%s -> %s), invalidating prediction cache", self._version, version)
+            self._memory.clear()
+            conn = self._connection()
+            conn.execute("DELETE FROM prediction_cache WHERE model_version != ?", (version,))
+            conn.commit()
+            self._version = version
+        return version
+
+    def _connection(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS prediction_cache ("
+                "key TEXT NOT NULL, model_version TEXT NOT NULL, "
+                "probs BLOB NOT NULL, created_at REAL NOT NULL, "
+                "PRIMARY KEY (key, model_version))"
+            )
+            self._conn.commit()
+        return self._conn
@@ -0,0 +1,152 @@
+"""Per-patient progression: each patient's scans as a compact time series of class probabilities.
+
+A series is a sorted numpy record array packed into one blob (16 bytes per
+scan: time, scan id and the four probabilities as float16, in ``STAGES``
+order, mildest first). The app appends to it as scans are stored (see
+``update_progression`` in app.py) and keeps a summary next to it, so
+dashboards read one row per patient instead of every historical scan:
+
+    stage / stage_since   the confirmed stage: it only moves once ``confirm``
+                          consecutive scans agree on a new top class
+    changes               every confirmed stage change
+    trend                 worsening / stable / improving, from the slope of the
+                          severity score (0 = Non-Demented .. 3 = Moderate)
+                          over the last ``trend_years`` years. Scans on the
+                          same day count as one visit; None until the visits
+                          span at least ``min_days`` days
+"""
+from datetime import datetime, timezone
+
+import numpy as np
+
+STAGES = ["Non-Demented", "Very Mild Demented", "Mild Demented", "Moderate Demented"]
+
+POINT = np.dtype([("t", "<u4"), ("scan_id", "<i4"), ("probs", "<f2", (len(STAGES),))])
+
+SECONDS_PER_DAY = 24 * 3600
+SECONDS_PER_YEAR = 365.25 * SECONDS_PER_DAY
+
+
+def encode_probabilities(classes):
+    """float16 bytes of a result's ``classes`` dict, in ``STAGES`` order (for MRIScan.class_probs)."""
+    return np.array([classes.get(stage, 0.0) for stage in STAGES], dtype="<f2").tobytes()
+
+
+def scan_probabilities(class_probs, prediction, confidence):
+    """A scan's probabilities in ``STAGES`` order.
+
+    Scans stored before probabilities were kept only have their top class and
+    confidence; the rest of the mass is spread evenly over the other classes.
+    """
+    if class_probs:
+        return np.frombuffer(class_probs, dtype="<f2")
+    probs = np.full(len(STAGES), (1.0 - (confidence or 0.0)) / (len(STAGES) - 1), dtype="<f2")
+    probs[STAGES.index(prediction)] = confidence or 0.0
+    return probs
+
+
+def _timestamp(created_at):
+    return int((created_at or datetime.utcnow()).replace(tzinfo=timezone.utc).timestamp())
+
+
+def _datetime(t):
+    return datetime.fromtimestamp(int(t), timezone.utc).replace(tzinfo=None)
+
+
+def _date(t):
+    return _datetime(t).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def point(scan_id, created_at, probs):
+    return np.array([(_timestamp(created_at), scan_id, probs)], dtype=POINT)
+
+
+def unpack(blob):
+    return np.frombuffer(blob, dtype=POINT) if blob else np.empty(0, dtype=POINT)
+
+
+def pack(series):
+    return series.tobytes()
+
+
+def upsert(series, points):
+    """``series`` with a list of ``point`` arrays added (replacing points of the same scans), in time order."""
+    if not points:
+        return series
+    points = np.concatenate(points)
+    series = series[~np.isin(series["scan_id"], points["scan_id"])]
+    if len(series) and len(points) == 1 and points["t"][0] >= series["t"][-1]:
+        return np.concatenate([series, points])  # the usual case: a new latest scan
+    merged = np.concatenate([series, points])
+    return merged[np.lexsort((merged["scan_id"], merged["t"]))]
+
+
+def remove(series, scan_ids):
+    return series[~np.isin(series["scan_id"], list(scan_ids))]
+
+
+def severity(series):
+    """Expected stage index (0..3) of each point."""
+    return series["probs"].astype(np.float32) @ np.arange(len(STAGES), dtype=np.float32)
+
+
+def visits(series):
+    """``(day, mean severity)`` per calendar day (UTC) with scans, so a repeat scan doesn't make a trend."""
+    days = series["t"].astype(np.int64) // SECONDS_PER_DAY
+    starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+    scores = np.add.reduceat(severity(series), starts) / np.diff(np.r_[starts, len(series)])
+    return days[starts], scores
+
+
+def summarise(series, confirm=2, trend_years=2.0, threshold=0.25, min_days=90):
+    """Stage, stage changes and trend of a series (see the module docstring)."""
+    summary = {
+        "points": int(len(series)),
+        "stage": None,
+        "stage_since": None,
+        "changes": [],
+        "trend": None,
+        "trend_per_year": None,
+    }
+    if not len(series):
+        return summary
+
+    top = series["probs"].argmax(axis=1)
+    stage, since, run = int(top[0]), 0, 1
+    for i in range(1, len(series)):
+        run = run + 1 if top[i] == top[i - 1] else 1
+        if top[i] != stage and run >= confirm:
+            start = i - run + 1  # the change happened at the first scan of the run
+            summary["changes"].append({
+                "scan_id": int(series["scan_id"][start]),
+                "date": _date(series["t"][start]),
+                "from": STAGES[stage],
+                "to": STAGES[int(top[i])],
+            })
+            stage, since = int(top[i]), start
+    summary["stage"] = STAGES[stage]
+    summary["stage_since"] = _datetime(series["t"][since])
+
+    recent = series[series["t"] >= int(series["t"][-1]) - trend_years * SECONDS_PER_YEAR]
+    days, scores = visits(recent)
+    if len(days) >= 2 and days[-1] - days[0] >= min_days:
+        years = (days - days[0]) * SECONDS_PER_DAY / SECONDS_PER_YEAR
+        slope = float(np.polyfit(years, scores, 1)[0])
+        summary["trend_per_year"] = round(slope, 4)
+        summary["trend"] = "worsening" if slope >= threshold else "improving" if slope <= -threshold else "stable"
+    return summary
+
+
+def to_json(series):
+    """The series as JSON-ready points, oldest first."""
+    probs = np.round(series["probs"].astype(np.float64), 3).tolist()
+    scores = np.round(severity(series).astype(np.float64), 3).tolist()
+    return [
+        {
+            "scan_id": scan_id,
+            "date": _date(t),
+            "probabilities": dict(zip(STAGES, p)),
+            "severity": score,
+        }
+        for t, scan_id, p, score in zip(series["t"].tolist(), series["scan_id"].tolist(), probs, scores)
+    ]
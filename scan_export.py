@@ -0,0 +1,217 @@
+"""Streaming export of scans, with their doctor and patient, as CSV, NDJSON or Parquet.
+
+    python scan_export.py --output scans.csv
+    python scan_export.py --format ndjson --doctor-email dr@example.com --date-from 2024-01-01
+    python scan_export.py --output scans.parquet --prediction "Mild Demented"
+
+The rows are read through a server-side cursor (PostgreSQL; SQLite reads
+lazily anyway) and written out one chunk at a time, so memory use does not
+grow with the number of rows and the first bytes go out before the query has
+finished. The app's GET /api/export streams the same output for a doctor's
+own scans. Parquet needs pyarrow (pip install pyarrow); each chunk becomes a
+row group.
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+
+import numpy as np
+
+from progression import STAGES
+
+# Probability columns, one per class, from mri_scans.class_probs (empty for scans stored before it)
+PROBABILITY_COLUMNS = ['prob_' + stage.lower().replace('-', '_').replace(' ', '_') for stage in STAGES]
+
+COLUMNS = [
+    'scan_id', 'created_at', 'doctor_id', 'doctor_name', 'hospital', 'patient_id', 'patient_name',
+    'patient_age', 'patient_gender', 'filename', 'prediction', 'confidence', 'stage', 'model_version',
+] + PROBABILITY_COLUMNS
+
+# format -> (mimetype, file extension)
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet export needs pyarrow (pip install pyarrow)")
+    return pyarrow
+
+
+def check_format(fmt):
+    """Raise ValueError for an unknown format, ImportError if its library is missing."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}, expected one of {', '.join(FORMATS)}")
+    if fmt == 'parquet':
+        _pyarrow()
+
+
+def iter_chunks(engine, statement, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Run ``statement`` (see app.export_query) and yield its rows as lists of ``COLUMNS`` tuples."""
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=chunk_size).execute(statement)
+        for rows in result.partitions():
+            yield _records(rows)
+
+
+def _records(rows):
+    probabilities = [None] * len(rows)
+    stored = [i for i, row in enumerate(rows) if row.class_probs]
+    if stored:
+        decoded = np.frombuffer(b''.join(rows[i].class_probs for i in stored), dtype='<f2')
+        decoded = np.round(decoded.astype(np.float64), 4).reshape(len(stored), len(STAGES)).tolist()
+        for i, probs in zip(stored, decoded):
+            probabilities[i] = probs
+    empty = [None] * len(STAGES)
+    return [
+        (row.scan_id, row.created_at, row.doctor_id, row.doctor_name, row.hospital, row.patient_id,
+         row.patient_name, row.patient_age, row.patient_gender, row.filename, row.prediction,
+         row.confidence, row.stage, row.model_version, *(probs or empty))
+        for row, probs in zip(rows, probabilities)
+    ]
+
+
+def _text(value):
+    return value.strftime('%Y-%m-%d %H:%M:%S') if hasattr(value, 'strftime') else value
+
+
+def csv_stream(chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    yield buffer.getvalue().encode()  # the header goes out before the first chunk is read
+    for records in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows((_text(value) for value in record) for record in records)
+        yield buffer.getvalue().encode()
+
+
+def ndjson_stream(chunks):
+    for records in chunks:
+        yield ''.join(
+            json.dumps(dict(zip(COLUMNS, map(_text, record)))) + '\n' for record in records
+        ).encode()
+
+
+class _Drain(io.RawIOBase):
+    """Write-only file whose contents are taken out as they are written."""
+
+    def __init__(self):
+        self.parts, self.position = [], 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self):
+        data, self.parts = b''.join(self.parts), []
+        return data
+
+
+def parquet_stream(chunks):
+    pa = _pyarrow()
+    string, integer, real = pa.string(), pa.int64(), pa.float64()
+    schema = pa.schema(
+        list(zip(COLUMNS, [integer, pa.timestamp('us'), integer, string, string, integer, string,
+                           integer, string, string, string, real, string, string]))
+        + [(name, pa.float32()) for name in PROBABILITY_COLUMNS]
+    )
+    sink = _Drain()
+    with pa.parquet.ParquetWriter(sink, schema, compression='zstd') as writer:
+        for records in chunks:
+            columns = list(zip(*records)) if records else [[] for _ in COLUMNS]
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema
+            ))
+            yield sink.take()
+    yield sink.take()  # footer
+
+
+def export_stream(fmt, chunks):
+    """The bytes of ``chunks`` written as ``fmt``, one piece per chunk."""
+    return {'csv': csv_stream, 'ndjson': ndjson_stream, 'parquet': parquet_stream}[fmt](chunks)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export scans as CSV, NDJSON or Parquet')
+    parser.add_argument('--format', choices=list(FORMATS), help='Default: from --output extension, else csv')
+    parser.add_argument('--output', help='Write here instead of stdout')
+    parser.add_argument('--doctor-email', help="Only this doctor's scans")
+    parser.add_argument('--patient-email', help="Only this patient's scans")
+    parser.add_argument('--prediction', action='append', default=[], help='Only these predictions (repeatable)')
+    parser.add_argument('--date-from', help='YYYY-MM-DD, inclusive')
+    parser.add_argument('--date-to', help='YYYY-MM-DD, inclusive')
+    parser.add_argument('--chunk-size', type=int, help='Rows per chunk (default EXPORT_CHUNK_SIZE)')
+    args = parser.parse_args(argv)
+
+    fmt = args.format or next((f for f, (_, ext) in FORMATS.items()
+                               if args.output and args.output.endswith('.' + ext)), 'csv')
+    try:
+        check_format(fmt)
+    except ImportError as e:
+        parser.error(str(e))
+
+    from werkzeug.datastructures import MultiDict
+    from app import app, db, Doctor, Patient, export_query
+    import migrations
+
+    filters = MultiDict([('prediction', p) for p in args.prediction])
+    filters.update({'date_from': args.date_from or '', 'date_to': args.date_to or ''})
+    with app.app_context():
+        migrations.upgrade(db.engine)
+        doctor_id = None
+        if args.doctor_email:
+            doctor = Doctor.query.filter_by(email=args.doctor_email).first()
+            if not doctor:
+                parser.error(f'Doctor not found: {args.doctor_email}')
+            doctor_id = doctor.id
+        if args.patient_email:
+            patient = Patient.query.filter_by(email=args.patient_email).first()
+            if not patient:
+                parser.error(f'Patient not found: {args.patient_email}')
+            filters['patient_id'] = str(patient.id)
+        try:
+            statement = export_query(filters, doctor_id=doctor_id)
+        except ValueError as e:
+            parser.error(f'Invalid filter: {e}')
+
+        rows = 0
+
+        def counted(chunks):
+            nonlocal rows
+            for records in chunks:
+                rows += len(records)
+                yield records
+
+        out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+        try:
+            for data in export_stream(fmt, counted(iter_chunks(
+                    db.engine, statement, args.chunk_size or app.config['EXPORT_CHUNK_SIZE']))):
+                out.write(data)
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+    print(f'✅ Exported {rows} scan(s) as {fmt}', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from flask.sessions import SessionInterface, SessionMixin
+from sqlalchemy import delete, insert, select, update
+from werkzeug.datastructures import CallbackDict
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session data kept on the server; the cookie only carries a random token."""
+
+    def __init__(self, initial=None, token=None, expires_at=None):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.token = token
+        self.expires_at = expires_at
+        self.stale_token = None
+        self.modified = False
+
+    def regenerate(self):
+        """Save under a new token and delete the current row (on login, so a planted token stays logged out)."""
+        if self.token is not None:
+            self.stale_token = self.token
+        self.token, self.expires_at = None, None
+        self.modified = True
+
+
+class SessionStore:
+    """Session rows in the ``user_sessions`` table behind a per-process LRU cache.
+
+    Rows are keyed by a hash of the cookie token, so the table never holds a
+    usable token. Reads within ``cache_ttl`` seconds of the last database read
+    are answered from memory; a session deleted by another process (logout)
+    can therefore stay usable there for up to ``cache_ttl`` seconds.
+    """
+
+    PURGE_INTERVAL = 3600
+
+    def __init__(self, engine_fn, table, cache_ttl=30, cache_size=10000):
+        self._engine_fn = engine_fn
+        self.table = table
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, key):
+        """``(data, expires_at)`` of a live session, or None."""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and now - cached[2] < self.cache_ttl and cached[1] > datetime.utcnow():
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached[0], cached[1]
+            self.misses += 1
+
+        t = self.table
+        with self._engine_fn().connect() as conn:
+            row = conn.execute(
+                select(t.c.data, t.c.expires_at).where(t.c.id == key, t.c.expires_at > datetime.utcnow())
+            ).first()
+        if row is None:
+            self._forget(key)
+            return None
+        data = json.loads(row.data)
+        self._remember(key, data, row.expires_at)
+        return data, row.expires_at
+
+    def put(self, key, data, expires_at, new):
+        t = self.table
+        values = {'data': json.dumps(data), 'expires_at': expires_at}
+        with self._engine_fn().begin() as conn:
+            if new:
+                conn.execute(insert(t).values(id=key, created_at=datetime.utcnow(), **values))
+            else:
+                conn.execute(update(t).where(t.c.id == key).values(**values))
+            if time.monotonic() - self._last_purge > self.PURGE_INTERVAL:
+                self._last_purge = time.monotonic()
+                conn.execute(delete(t).where(t.c.expires_at <= datetime.utcnow()))
+        self._remember(key, data, expires_at)
+
+    def delete(self, key):
+        with self._engine_fn().begin() as conn:
+            conn.execute(delete(self.table).where(self.table.c.id == key))
+        self._forget(key)
+
+    def stats(self):
+        with self._lock:
+            return {'cached': len(self._cache), 'hits': self.hits, 'misses': self.misses}
+
+    def _remember(self, key, data, expires_at):
+        with self._lock:
+            self._cache[key] = (data, expires_at, time.monotonic())
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _forget(self, key):
+        with self._lock:
+            self._cache.pop(key, None)
+
+
+class ServerSessionInterface(SessionInterface):
+    """Flask session interface over a ``SessionStore``.
+
+    Rows are written only when the session changes, or to push the expiry
+    forward once less than half of PERMANENT_SESSION_LIFETIME is left, so
+    ordinary requests only read.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        token = request.cookies.get(self.get_cookie_name(app))
+        if token:
+            found = self.store.get(self.store.key(token))
+            if found is not None:
+                data, expires_at = found
+                return ServerSession(data, token=token, expires_at=expires_at)
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session or session.token or session.stale_token:
+            response.vary.add('Cookie')
+        if session.stale_token is not None:
+            self.store.delete(self.store.key(session.stale_token))
+
+        if not session:
+            if session.modified and (session.token or session.stale_token):
+                if session.token:
+                    self.store.delete(self.store.key(session.token))
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        lifetime = app.permanent_session_lifetime
+        now = datetime.utcnow()
+        new = session.token is None
+        renew = session.expires_at is not None and session.expires_at - now < lifetime / 2
+        if not (new or session.modified or renew):
+            return
+
+        token = session.token or secrets.token_urlsafe(32)
+        self.store.put(self.store.key(token), dict(session), now + lifetime, new)
+        response.set_cookie(
+            name, token,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
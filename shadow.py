@@ -0,0 +1,191 @@
+"""Shadow evaluation: a candidate model run on a sample of live batches, off the request path.
+
+``ShadowRunner.submit`` is called by ``predict.predict_batch`` after the active
+model has answered. A sampled batch is copied onto a small queue (dropped, not
+waited for, when the queue is full) and a background thread runs the candidate
+on it, comparing its top class and probabilities with the active model's.
+Counts go to a SQLite file shared by every process, read back by
+``ShadowStats.summary`` for GET /api/models and ``model_registry.py status``.
+"""
+import logging
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from observability import SHADOW_PREDICTIONS
+
+log = logging.getLogger(__name__)
+
+
+class ShadowStats:
+    """Agreement counts per (primary version, shadow version, primary class, shadow class)."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS shadow_agreement ("
+                "primary_version TEXT NOT NULL, shadow_version TEXT NOT NULL, "
+                "primary_class TEXT NOT NULL, shadow_class TEXT NOT NULL, "
+                "images INTEGER NOT NULL, abs_diff_sum REAL NOT NULL, seconds_sum REAL NOT NULL, "
+                "PRIMARY KEY (primary_version, shadow_version, primary_class, shadow_class))"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def record(self, primary_version, shadow_version, counts):
+        """Add ``{(primary_class, shadow_class): (images, abs_diff_sum, seconds_sum)}``."""
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                "INSERT INTO shadow_agreement VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (primary_version, shadow_version, primary_class, shadow_class) DO UPDATE SET "
+                "images = images + excluded.images, abs_diff_sum = abs_diff_sum + excluded.abs_diff_sum, "
+                "seconds_sum = seconds_sum + excluded.seconds_sum",
+                [(primary_version, shadow_version, p, s, n, diff, seconds)
+                 for (p, s), (n, diff, seconds) in counts.items()],
+            )
+            conn.commit()
+
+    def summary(self):
+        """One entry per (shadow, primary) version pair: agreement, mean |Δp|, latency and confusion counts."""
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT primary_version, shadow_version, primary_class, shadow_class, images, abs_diff_sum, "
+                "seconds_sum FROM shadow_agreement ORDER BY shadow_version, primary_version"
+            ).fetchall()
+        entries = {}
+        for primary, shadow, p, s, n, diff, seconds in rows:
+            entry = entries.setdefault((primary, shadow), {
+                "primary_version": primary, "shadow_version": shadow,
+                "images": 0, "agreed": 0, "abs_diff_sum": 0.0, "seconds_sum": 0.0, "confusion": {},
+            })
+            entry["images"] += n
+            entry["agreed"] += n if p == s else 0
+            entry["abs_diff_sum"] += diff
+            entry["seconds_sum"] += seconds
+            entry["confusion"].setdefault(p, {})[s] = n
+        summary = []
+        for entry in entries.values():
+            images = entry.pop("images")
+            agreed = entry.pop("agreed")
+            diff_sum, seconds_sum = entry.pop("abs_diff_sum"), entry.pop("seconds_sum")
+            entry.update(
+                images=images,
+                agreement=agreed / images if images else 0.0,
+                # Mean over images of the mean absolute difference of the class probabilities
+                mean_abs_diff=diff_sum / images if images else 0.0,
+                mean_ms_per_image=seconds_sum / images * 1000 if images else 0.0,
+            )
+            summary.append(entry)
+        return summary
+
+
+class ShadowRunner:
+    """Background thread running sampled batches through the shadow model (see the module docstring).
+
+    ``load(version)`` returns a backend for a registry version; the runner
+    keeps one loaded and replaces it when the shadow version changes.
+    Results are added to ``store`` (a ``ShadowStats``).
+    """
+
+    def __init__(self, load, store, class_names, queue_size=4):
+        self.load = load
+        self.store = store
+        self.class_names = class_names
+        self._queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._thread = None
+        self._lock = threading.Lock()
+        self._model, self._version, self._failed = None, None, None
+
+        self.sampled = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def submit(self, batch, rows, primary_version, shadow_version, sample_rate):
+        """Queue a copy of ``batch`` and the active model's ``rows`` with probability ``sample_rate``."""
+        if shadow_version == self._failed or random.random() >= sample_rate:
+            return
+        c = len(self.class_names)
+        try:
+            self._queue.put_nowait((np.array(batch), np.array(rows[:, :c]), primary_version, shadow_version))
+        except queue.Full:
+            self.dropped += 1
+            SHADOW_PREDICTIONS.labels("dropped").inc(len(batch))
+            return
+        self.sampled += 1
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="shadow-model", daemon=True)
+                self._thread.start()
+
+    def release(self):
+        """Drop the shadow model (e.g. once shadow mode is turned off)."""
+        with self._lock:
+            self._model, self._version = None, None
+
+    def _run(self):
+        while True:
+            batch, primary, primary_version, shadow_version = self._queue.get()
+            try:
+                model = self._shadow_model(shadow_version)
+                if model is None:
+                    continue
+                start = time.perf_counter()
+                shadow = model.predict(batch)[:, :len(self.class_names)]
+                seconds = time.perf_counter() - start
+                self._record(primary, shadow, seconds, primary_version, shadow_version)
+            except Exception as e:
+                self.errors += 1
+                SHADOW_PREDICTIONS.labels("error").inc(len(batch))
+                log.warning("⚠️ Shadow prediction with %s failed: %s", shadow_version, e)
+
+    def _shadow_model(self, version):
+        with self._lock:
+            if self._version == version:
+                return self._model
+        try:
+            model = self.load(version)
+        except Exception as e:
+            # Not retried until another version is put in shadow
+            log.error("❌ Shadow model %s failed to load: %s", version, e)
+            self._failed = version
+            return None
+        log.info("👥 Shadow model %s loaded", version)
+        with self._lock:
+            self._model, self._version = model, version
+        return model
+
+    def _record(self, primary, shadow, seconds, primary_version, shadow_version):
+        primary_top, shadow_top = primary.argmax(axis=1), shadow.argmax(axis=1)
+        diffs = np.abs(primary - shadow).mean(axis=1)
+        counts = {}
+        for p, s, diff in zip(primary_top.tolist(), shadow_top.tolist(), diffs.tolist()):
+            key = (self.class_names[p], self.class_names[s])
+            n, diff_sum, seconds_sum = counts.get(key, (0, 0.0, 0.0))
+            counts[key] = (n + 1, diff_sum + diff, seconds_sum + seconds / len(primary))
+        self.store.record(primary_version, shadow_version, counts)
+        agreed = int((primary_top == shadow_top).sum())
+        SHADOW_PREDICTIONS.labels("agree").inc(agreed)
+        SHADOW_PREDICTIONS.labels("disagree").inc(len(primary) - agreed)
+
+    def stats(self):
+        return {
+            "shadow_version": self._version,
+            "sampled_batches": self.sampled,
+            "dropped_batches": self.dropped,
+            "errors": self.errors,
+            "queued": self._queue.qsize(),
+        }
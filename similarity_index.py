@@ -0,0 +1,442 @@
+"""On-disk approximate nearest-neighbour index over scan embeddings (cosine similarity).
+
+Every file lives in one directory and is memory-mapped, so all web workers
+share a single copy through the page cache:
+
+    meta.json             dim, row count, capacity, model version, IVF generation
+    vectors.f16           (capacity, dim) L2-normalised float16 embeddings
+    ids.i64, owners.i32   scan id and doctor id of each row
+    projection-<g>.f32    (dim, r) top principal directions of generation g's sample
+    centroids-<g>.f32     IVF cluster centres of generation g, in the projected space
+    reduced-<g>.f32       (capacity, r) every row projected to r dimensions
+    lists-<g>.i32         the cluster each row belongs to under generation g
+
+Rows are only ever appended, under an exclusive file lock, and become visible
+to other processes when meta.json (replaced atomically) counts them. Below
+``train_size`` rows a query compares against every full vector. From then on
+a background thread fits the projection and k-means clusters (again whenever
+the index has doubled since); a query then scores the rows of the ``nprobe``
+clusters nearest to it on their r-dimensional float32 projections and
+re-ranks the best few with the full vectors. A doctor with at most
+``EXACT_SEARCH_ROWS`` scans has all of them scored, not just the probed ones.
+
+The scan_embeddings table is the source of truth; the index can be rebuilt
+from it at any time:
+
+    python similarity_index.py --status
+    python similarity_index.py --rebuild
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process dev server, no cross-process locking
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+
+def encode_vector(vector):
+    """float16 bytes of an embedding, as stored in scan_embeddings.vector."""
+    return np.asarray(vector, dtype=np.float16).tobytes()
+
+
+def decode_vector(data):
+    return np.frombuffer(data, dtype=np.float16)
+
+
+def _normalise(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _project(vectors, projection, chunk=8192):
+    """``vectors`` (float16 rows are converted a chunk at a time) times ``projection``."""
+    out = np.empty((len(vectors), projection.shape[1]), dtype=np.float32)
+    for start in range(0, len(vectors), chunk):
+        block = np.asarray(vectors[start:start + chunk], dtype=np.float32)
+        out[start:start + len(block)] = block @ projection
+    return out
+
+
+def _nearest_centroid(vectors, centroids, chunk=8192):
+    """Index of the most similar centroid for each row of ``vectors``."""
+    out = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), chunk):
+        out[start:start + chunk] = (vectors[start:start + chunk] @ centroids.T).argmax(axis=1)
+    return out
+
+
+def _kmeans(sample, nlist, iterations=10, seed=0):
+    """Spherical k-means: ``nlist`` unit-length centres for the ``sample`` rows."""
+    rng = np.random.default_rng(seed)
+    sample = _normalise(sample)
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assign = _nearest_centroid(sample, centroids)
+        order = np.argsort(assign, kind="stable")
+        clusters, starts = np.unique(assign[order], return_index=True)
+        centroids[clusters] = np.add.reduceat(sample[order], starts, axis=0)
+        empty = np.setdiff1d(np.arange(nlist), clusters)
+        if len(empty):
+            centroids[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+        centroids = _normalise(centroids)
+    return centroids
+
+
+def _top(scores, k):
+    """Positions of the ``k`` highest ``scores``, highest first."""
+    top = np.argpartition(-scores, k - 1)[:k] if len(scores) > k else np.arange(len(scores))
+    return top[np.argsort(-scores[top])]
+
+
+class SimilarityIndex:
+    """Append-only IVF index of ``(scan_id, owner_id, embedding)`` rows in the ``path`` directory.
+
+    ``search`` returns ``(scan_id, similarity)`` pairs, most similar first.
+    Each process re-reads meta.json (one ``stat`` per call) to pick up rows
+    and retrained clusters written by the others.
+    """
+
+    EXACT_SEARCH_ROWS = 8192  # owners with at most this many rows have every row scored
+    RERANK_FACTOR = 32  # rows re-ranked with the full vectors, per result
+    INITIAL_CAPACITY = 1024
+
+    def __init__(self, path, train_size=2048, nlist=0, nprobe=16, dims=256):
+        self.path = path
+        self.train_size = max(1, int(train_size))
+        self.nlist = int(nlist)
+        self.nprobe = max(1, int(nprobe))
+        self.dims = max(1, int(dims))
+        self._lock = threading.RLock()
+        self._meta = None
+        self._signature = None
+        self._maps = {}
+        self._mapped = None  # (epoch, capacity, generation) the maps were opened for
+        self._training = None
+
+    # ----- files -----
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    @contextmanager
+    def _file_lock(self, name=".lock", blocking=True):
+        """Exclusive lock shared with the other processes; yields False if ``blocking`` is off and it is taken."""
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._file(name), "a+b") as f:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+                except BlockingIOError:
+                    yield False
+                    return
+            try:
+                yield True
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _write_meta(self, meta):
+        tmp = self._file(f"meta.json.{os.getpid()}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, self._file("meta.json"))
+        self._meta, self._signature = dict(meta), None
+
+    def _refresh(self):
+        """Reload meta.json, and remap the files, if another process changed them."""
+        try:
+            st = os.stat(self._file("meta.json"))
+        except FileNotFoundError:
+            self._meta, self._signature, self._maps, self._mapped = None, None, {}, None
+            return
+        signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if signature != self._signature:
+            with open(self._file("meta.json")) as f:
+                self._meta = json.load(f)
+            self._signature = signature
+        meta = self._meta
+        mapped = (meta["epoch"], meta["capacity"], meta["generation"])
+        if mapped != self._mapped:
+            capacity, dim, g = meta["capacity"], meta["dim"], meta["generation"]
+            maps = {
+                "vectors": np.memmap(self._file("vectors.f16"), np.float16, "r+", shape=(capacity, dim)),
+                "ids": np.memmap(self._file("ids.i64"), np.int64, "r+", shape=(capacity,)),
+                "owners": np.memmap(self._file("owners.i32"), np.int32, "r+", shape=(capacity,)),
+            }
+            if g:
+                r = meta["reduced_dim"]
+                maps["projection"] = np.fromfile(self._file(f"projection-{g}.f32"), np.float32).reshape(dim, r)
+                maps["centroids"] = np.fromfile(self._file(f"centroids-{g}.f32"), np.float32).reshape(-1, r)
+                maps["reduced"] = np.memmap(self._file(f"reduced-{g}.f32"), np.float32, "r+", shape=(capacity, r))
+                maps["lists"] = np.memmap(self._file(f"lists-{g}.i32"), np.int32, "r+", shape=(capacity,))
+            self._maps, self._mapped = maps, mapped
+
+    def _data_files(self, meta):
+        files = [("vectors.f16", 2 * meta["dim"]), ("ids.i64", 8), ("owners.i32", 4)]
+        g = meta["generation"]
+        if g:
+            files += [(f"reduced-{g}.f32", 4 * meta["reduced_dim"]), (f"lists-{g}.i32", 4)]
+        return files
+
+    def _resize(self, meta, capacity):
+        for name, row_bytes in self._data_files(meta):
+            with open(self._file(name), "a+b") as f:
+                f.truncate(capacity * row_bytes)
+        meta["capacity"] = capacity
+
+    # ----- writes -----
+
+    def add(self, items, model_version=None):
+        """Append ``(scan_id, owner_id, embedding)`` items; scans already indexed are skipped.
+
+        Items computed by a different model than the index holds are skipped
+        too (see ``reset``). Returns the number of rows added.
+        """
+        items = list(items)
+        if not items:
+            return 0
+        with self._lock, self._file_lock():
+            self._refresh()
+            dim = len(items[0][2])
+            if self._meta is None:
+                meta = {"epoch": uuid.uuid4().hex, "dim": dim, "count": 0, "capacity": 0,
+                        "model_version": model_version, "generation": 0, "trained_count": 0,
+                        "nlist": 0, "reduced_dim": 0}
+                self._resize(meta, self.INITIAL_CAPACITY)
+                self._write_meta(meta)
+                self._refresh()
+            meta = dict(self._meta)
+            if model_version is not None and meta["model_version"] not in (None, model_version):
+                log.debug("Not indexing %d embedding(s) of model %s", len(items), model_version)
+                return 0
+            if meta["dim"] != dim:
+                raise ValueError(f"Embedding has {dim} values, the index holds {meta['dim']}")
+
+            count = meta["count"]
+            ids, first = np.unique(np.array([item[0] for item in items], dtype=np.int64), return_index=True)
+            keep = np.sort(first[~np.isin(ids, self._maps["ids"][:count])])
+            new = len(keep)
+            if not new:
+                return 0
+            if count + new > meta["capacity"]:
+                self._resize(meta, max(2 * meta["capacity"], count + new))
+                self._write_meta(meta)
+                self._refresh()
+
+            vectors = _normalise([items[i][2] for i in keep])
+            rows = slice(count, count + new)
+            maps = self._maps
+            maps["vectors"][rows] = vectors
+            maps["ids"][rows] = [items[i][0] for i in keep]
+            maps["owners"][rows] = [items[i][1] for i in keep]
+            if meta["generation"]:
+                reduced = vectors @ maps["projection"]
+                maps["reduced"][rows] = reduced
+                maps["lists"][rows] = _nearest_centroid(reduced, maps["centroids"])
+            meta["count"] = count + new
+            meta["model_version"] = meta["model_version"] or model_version
+            self._write_meta(meta)
+        self._maybe_train()
+        return new
+
+    def reset(self):
+        """Drop every row (before a rebuild, or once the model was replaced); the next ``add`` starts afresh."""
+        with self._lock, self._file_lock():
+            for name in os.listdir(self.path):
+                if name.startswith(("meta.json", "vectors.", "ids.", "owners.", "projection-", "centroids-",
+                                    "reduced-", "lists-")):
+                    os.remove(self._file(name))
+            self._meta, self._signature, self._maps, self._mapped = None, None, {}, None
+
+    # ----- clustering -----
+
+    def _maybe_train(self):
+        meta = self._meta
+        if meta is None or meta["count"] < self.train_size:
+            return
+        if meta["generation"] and meta["count"] < 2 * meta["trained_count"]:
+            return
+        if self._training is not None and self._training.is_alive():
+            return
+        self._training = threading.Thread(target=self.train, name="similarity-index-train", daemon=True)
+        self._training.start()
+
+    def wait_training(self, timeout=None):
+        if self._training is not None:
+            self._training.join(timeout)
+
+    def train(self, force=False):
+        """Fit the projection and clusters on the current rows and publish them as the next generation.
+
+        One process at a time; unless ``force``, only when the index has
+        doubled since the last training.
+        """
+        with self._file_lock(".train.lock", blocking=False) as acquired:
+            if not acquired:
+                return False
+            with self._lock:
+                self._refresh()
+                if self._meta is None:
+                    return False
+                meta = dict(self._meta)
+                vectors = self._maps["vectors"]
+            count = meta["count"]
+            if not force and meta["generation"] and count < 2 * meta["trained_count"]:
+                return False  # another process just did it
+
+            nlist = max(1, min(self.nlist or int(np.sqrt(count)), count))
+            rng = np.random.default_rng(count)
+            sample = vectors[np.sort(rng.choice(count, min(count, max(32 * nlist, 4 * self.dims)), replace=False))]
+            sample = np.asarray(sample, dtype=np.float32)
+            r = min(self.dims, meta["dim"], len(sample))
+            # Top right-singular vectors of the (uncentred) sample: dot products survive the projection
+            _, eigenvectors = np.linalg.eigh(sample.T @ sample)
+            projection = np.ascontiguousarray(eigenvectors[:, ::-1][:, :r], dtype=np.float32)
+            centroids = _kmeans(sample @ projection, nlist)
+            reduced = _project(vectors[:count], projection)
+            lists = _nearest_centroid(reduced, centroids)
+
+            with self._lock, self._file_lock():
+                self._refresh()
+                if self._meta is None or self._meta["epoch"] != meta["epoch"]:
+                    return False  # reset meanwhile
+                meta = dict(self._meta)
+                g, previous = meta["generation"] + 1, meta["generation"]
+                projection.tofile(self._file(f"projection-{g}.f32"))
+                centroids.tofile(self._file(f"centroids-{g}.f32"))
+                shape = (meta["capacity"],)
+                stored = np.memmap(self._file(f"reduced-{g}.f32"), np.float32, "w+", shape=shape + (r,))
+                assigned = np.memmap(self._file(f"lists-{g}.i32"), np.int32, "w+", shape=shape)
+                stored[:count], assigned[:count] = reduced, lists
+                # Rows appended while training
+                tail = _project(self._maps["vectors"][count:meta["count"]], projection)
+                stored[count:meta["count"]] = tail
+                assigned[count:meta["count"]] = _nearest_centroid(tail, centroids)
+                stored.flush()
+                assigned.flush()
+                del stored, assigned
+                meta.update(generation=g, trained_count=count, nlist=nlist, reduced_dim=r)
+                self._write_meta(meta)
+                self._refresh()
+                if previous:
+                    # Processes still mapping the old files keep reading them until they remap
+                    for name in ("projection", "centroids", "reduced", "lists"):
+                        for path in (self._file(f"{name}-{previous}.f32"), self._file(f"{name}-{previous}.i32")):
+                            if os.path.exists(path):
+                                os.remove(path)
+            log.info("✅ Similar-scan index trained: %d rows, %d lists, %d dimensions", count, nlist, r)
+            return True
+
+    # ----- reads -----
+
+    def search(self, vector, k=10, owner=None, exclude=None):
+        """The ``k`` most similar rows to ``vector`` as ``(scan_id, similarity)``, best first.
+
+        ``owner`` restricts the search to one doctor's scans and ``exclude``
+        leaves out a scan id (the query scan itself).
+        """
+        if k < 1:
+            return []
+        with self._lock:
+            self._refresh()
+            if self._meta is None or not self._meta["count"]:
+                return []
+            meta, maps = self._meta, self._maps
+        count = meta["count"]
+        if len(vector) != meta["dim"]:
+            raise ValueError(f"Embedding has {len(vector)} values, the index holds {meta['dim']}")
+        query = _normalise(vector)
+
+        owned = None if owner is None else maps["owners"][:count] == owner
+        candidates = count if owned is None else np.count_nonzero(owned)
+        if not meta["generation"] or candidates <= self.EXACT_SEARCH_ROWS:
+            rows = np.arange(count) if owned is None else np.flatnonzero(owned)
+        else:
+            # Probe the lists nearest to the query, widening until there are enough candidates
+            order = np.argsort(maps["centroids"] @ (query @ maps["projection"]))[::-1]
+            lists = maps["lists"][:count]
+            nprobe = self.nprobe
+            while True:
+                probed = np.zeros(len(order), dtype=bool)
+                probed[order[:nprobe]] = True
+                selected = probed[lists] if owned is None else probed[lists] & owned
+                rows = np.flatnonzero(selected)
+                if len(rows) > k or nprobe >= len(order):
+                    break
+                nprobe *= 2
+
+        if exclude is not None:
+            rows = rows[maps["ids"][rows] != exclude]
+        if meta["generation"] and len(rows) > self.RERANK_FACTOR * k:
+            # Shortlist on the float32 projections, then re-rank with the full vectors
+            approximate = maps["reduced"][rows] @ (query @ maps["projection"])
+            rows = rows[_top(approximate, self.RERANK_FACTOR * k)]
+        if not len(rows):
+            return []
+        scores = np.asarray(maps["vectors"][rows], dtype=np.float32) @ query
+        top = _top(scores, k)
+        ids = maps["ids"][rows[top]]
+        return [(int(scan_id), float(min(score, 1.0))) for scan_id, score in zip(ids, scores[top])]
+
+    def scan_ids(self):
+        """Ids of every indexed scan."""
+        with self._lock:
+            self._refresh()
+            if self._meta is None:
+                return np.empty(0, dtype=np.int64)
+            return np.array(self._maps["ids"][:self._meta["count"]])
+
+    def model_version(self):
+        with self._lock:
+            self._refresh()
+            return self._meta["model_version"] if self._meta else None
+
+    def stats(self):
+        with self._lock:
+            self._refresh()
+            meta = self._meta or {}
+        return {
+            "rows": meta.get("count", 0),
+            "dim": meta.get("dim"),
+            "model_version": meta.get("model_version"),
+            "generation": meta.get("generation", 0),
+            "trained_rows": meta.get("trained_count", 0),
+            "lists": meta.get("nlist", 0),
+            "reduced_dim": meta.get("reduced_dim", 0),
+            "nprobe": self.nprobe,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Similar-scan embedding index')
+    parser.add_argument('--rebuild', action='store_true', help='Re-create the index from the scan_embeddings table')
+    parser.add_argument('--status', action='store_true', help='Show the index size and clustering')
+    args = parser.parse_args(argv)
+
+    from app import similarity_index, sync_similarity_index
+    if args.rebuild:
+        added = sync_similarity_index(rebuild=True)
+        similarity_index.wait_training()
+        stats = similarity_index.stats()
+        if stats['rows'] >= similarity_index.train_size and stats['trained_rows'] < stats['rows']:
+            similarity_index.train(force=True)
+        print(f'✅ Indexed {added} scan embedding(s)')
+    for key, value in similarity_index.stats().items():
+        print(f'{key:>14}  {value}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
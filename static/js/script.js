@@ -333,6 +333,9 @@ function handleMRIUpload(event) {
     const formData = new FormData();
     formData.append('patient_email', patientEmail);
     formData.append('mri_file', mriFile);
+    formData.append('async', '1');
+    const ttaBox = document.getElementById('tta-mode');
+    if (ttaBox && ttaBox.checked) formData.append('tta', '1');
     
     showAlert('Analyzing MRI scan...', 'info');
     
@@ -343,10 +346,15 @@ function handleMRIUpload(event) {
     .then(r => r.json())
     .then(data => {
         if (data.success) {
-            displayPredictionResult(data);
-            showAlert('Analysis complete!', 'success');
             document.getElementById('mri-file').value = '';
             document.getElementById('patient-email').value = '';
+            if (data.status === 'pending') {
+                refreshScanList();
+                pollScanStatus(data.scan_id);
+            } else {
+                displayPredictionResult(data);
+                showAlert('Analysis complete!', 'success');
+            }
         } else {
             showAlert(data.message, 'error');
         }
@@ -354,14 +362,62 @@ function handleMRIUpload(event) {
     .catch(e => showAlert('Error: ' + e.message, 'error'));
 }
 
+// ===== Poll an Async Scan Until It Completes =====
+function pollScanStatus(scanId, interval = 2000) {
+    fetch('/api/scans/' + scanId)
+    .then(r => r.json())
+    .then(data => {
+        if (!data.success) {
+            showAlert(data.message, 'error');
+        } else if (data.status === 'pending') {
+            setTimeout(() => pollScanStatus(scanId, interval), interval);
+        } else if (data.status === 'failed') {
+            showAlert('Analysis failed. Please re-upload the scan.', 'error');
+            refreshScanList();
+        } else {
+            displayPredictionResult(data);
+            showAlert('Analysis complete!', 'success');
+            refreshScanList();
+        }
+    })
+    .catch(e => showAlert('Error: ' + e.message, 'error'));
+}
+
+// ===== Grad-CAM Heatmap (generated on first view) =====
+function showExplanation(scanId, containerId, interval = 2000) {
+    const container = document.getElementById(containerId);
+    container.innerHTML = '<p>Generating heatmap...</p>';
+    fetch('/api/scans/' + scanId + '/explanation')
+    .then(r => {
+        if (r.status === 202) {
+            setTimeout(() => showExplanation(scanId, containerId, interval), interval);
+            return;
+        }
+        if (!r.ok) {
+            return r.json().then(data => { container.innerHTML = ''; showAlert(data.message, 'error'); });
+        }
+        const explained = r.headers.get('X-Explained-Class');
+        return r.blob().then(blob => {
+            container.innerHTML = `
+                <p style="margin: 10px 0 5px;">Regions driving "${explained}" (red = strongest)</p>
+                <img src="${URL.createObjectURL(blob)}" alt="Grad-CAM heatmap" style="max-width: 100%; border-radius: 5px;">`;
+        });
+    })
+    .catch(e => showAlert('Error: ' + e.message, 'error'));
+}
+
+function refreshScanList() {
+    if (typeof loadDoctorDashboard === 'function') loadDoctorDashboard();
+}
+
 // Display prediction results
 function displayPredictionResult(data) {
     const resultDiv = document.getElementById('prediction-result');
     document.getElementById('pred-class').textContent = data.prediction;
     document.getElementById('pred-confidence').textContent = data.confidence + '%';
     
-    // Class probabilities
-    const classesHtml = Object.entries(data.classes)
+    // Class probabilities (not stored for async scans)
+    const classesHtml = Object.entries(data.classes || {})
         .map(([className, prob]) => `
             <div style="margin-bottom: 10px; padding: 10px; background: #f5f5f5; border-radius: 5px;">
                 <div style="display: flex; justify-content: space-between; margin-bottom: 5px;">
@@ -0,0 +1,210 @@
+"""Content-addressed storage for uploaded scans.
+
+Originals are stored under a hash of their bytes in a sharded tree
+(``uploads/ab/cd/abcd....png``), so identical uploads are stored once, two
+files with the same name never collide and no directory grows without bound.
+``put*`` returns a reference string that is saved as ``MRIScan.filepath``;
+for the local backend it is simply the file path.
+
+Backends implement ``BlobStorage``; pick one with ``create_storage``.
+"""
+import hashlib
+import os
+import tempfile
+import time
+from abc import ABC, abstractmethod
+
+CHUNK_SIZE = 1 << 20
+
+
+def content_digest(data):
+    """Hex digest used as the blob name (same hash as ``upload_writer.read_upload``)."""
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+def blob_suffix(filename):
+    """Extension kept on the blob so readers can still tell the format (.nii.gz included)."""
+    lower = filename.lower()
+    if lower.endswith('.nii.gz'):
+        return '.nii.gz'
+    return os.path.splitext(lower)[1]
+
+
+class BlobStorage(ABC):
+    """Interface for upload storage backends."""
+
+    @abstractmethod
+    def put(self, data, suffix='', digest=None):
+        """Store ``data`` (bytes) and return its reference; a no-op if already stored."""
+
+    @abstractmethod
+    def put_stream(self, stream, suffix=''):
+        """Store a file-like object, hashing it while it is copied; returns its reference."""
+
+    @abstractmethod
+    def ref_for(self, digest, suffix=''):
+        """Reference a blob will have once stored (lets callers store it later)."""
+
+    @abstractmethod
+    def exists(self, ref):
+        """Whether ``ref`` is stored."""
+
+    @abstractmethod
+    def delete(self, ref):
+        """Remove ``ref``; a no-op if it is not stored."""
+
+    @abstractmethod
+    def iter_blobs(self):
+        """Yield ``(ref, modified_time)`` for every stored blob."""
+
+    @abstractmethod
+    def local_path(self, ref):
+        """A filesystem path readers can open for ``ref``."""
+
+
+class LocalBlobStorage(BlobStorage):
+    """Blobs on the local filesystem, ``depth`` levels of 2-hex-digit shard directories deep."""
+
+    def __init__(self, root, depth=2):
+        self.root = root
+        self.depth = max(0, int(depth))
+        self.tmp_dir = os.path.join(root, 'tmp')
+
+    def ref_for(self, digest, suffix=''):
+        shards = [digest[2 * i:2 * i + 2] for i in range(self.depth)]
+        return os.path.join(self.root, *shards, digest + suffix)
+
+    def put(self, data, suffix='', digest=None):
+        ref = self.ref_for(digest or content_digest(data), suffix)
+        if self._reuse(ref):
+            return ref
+        with self._temp_file() as (tmp, f):
+            f.write(data)
+        self._publish(tmp, ref)
+        return ref
+
+    def put_stream(self, stream, suffix=''):
+        h = hashlib.blake2b(digest_size=20)
+        with self._temp_file() as (tmp, f):
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                h.update(chunk)
+                f.write(chunk)
+        ref = self.ref_for(h.hexdigest(), suffix)
+        if self._reuse(ref):
+            os.remove(tmp)
+        else:
+            self._publish(tmp, ref)
+        return ref
+
+    def exists(self, ref):
+        return os.path.exists(ref)
+
+    def delete(self, ref):
+        try:
+            os.remove(ref)
+        except FileNotFoundError:
+            return
+        # Drop shard directories left empty
+        directory = os.path.dirname(ref)
+        for _ in range(self.depth):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
+
+    def iter_blobs(self):
+        if self.depth == 0:
+            return  # unsharded blobs can't be told apart from legacy uploads
+        for name in sorted(os.listdir(self.root)) if os.path.isdir(self.root) else []:
+            shard = os.path.join(self.root, name)
+            # Shard directories are 2 hex digits; skips tmp/ and legacy flat uploads
+            if len(name) != 2 or not os.path.isdir(shard):
+                continue
+            for dirpath, _, files in os.walk(shard):
+                for filename in files:
+                    path = os.path.join(dirpath, filename)
+                    yield path, os.path.getmtime(path)
+
+    def local_path(self, ref):
+        return ref
+
+    def clean_temp(self, older_than):
+        """Remove partial writes left in tmp/ by crashed processes; returns how many."""
+        removed = 0
+        if os.path.isdir(self.tmp_dir):
+            for entry in os.scandir(self.tmp_dir):
+                if entry.is_file() and entry.stat().st_mtime < older_than:
+                    os.remove(entry.path)
+                    removed += 1
+        return removed
+
+    def _reuse(self, ref):
+        # Already stored: dedupe, and touch it so a concurrent GC leaves it in its grace period
+        try:
+            os.utime(ref)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _temp_file(self):
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        return _TempFile(self.tmp_dir)
+
+    def _publish(self, tmp, ref):
+        os.makedirs(os.path.dirname(ref), exist_ok=True)
+        os.replace(tmp, ref)  # atomic: readers never see a partial blob
+
+
+class _TempFile:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def __enter__(self):
+        fd, self.path = tempfile.mkstemp(dir=self.directory, suffix='.part')
+        self.file = os.fdopen(fd, 'wb')
+        return self.path, self.file
+
+    def __exit__(self, exc_type, exc, tb):
+        self.file.close()
+        if exc_type is not None:
+            os.remove(self.path)
+        return False
+
+
+BACKENDS = {
+    'local': LocalBlobStorage,
+}
+
+
+def create_storage(name, root, **kwargs):
+    try:
+        cls = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown storage backend {name!r} (choose from {', '.join(BACKENDS)})")
+    return cls(root, **kwargs)
+
+
+def collect_garbage(storage, referenced, grace_seconds=3600, dry_run=False):
+    """Delete blobs no scan references.
+
+    Blobs modified within ``grace_seconds`` are kept: uploads are stored before
+    their scan row is committed. Returns ``(removed_refs, bytes_freed)``.
+    """
+    referenced = {os.path.normpath(ref) for ref in referenced}
+    cutoff = time.time() - grace_seconds
+    removed, freed = [], 0
+    for ref, mtime in storage.iter_blobs():
+        if os.path.normpath(ref) in referenced or mtime >= cutoff:
+            continue
+        size = os.path.getsize(storage.local_path(ref))
+        if not dry_run:
+            storage.delete(ref)
+        removed.append(ref)
+        freed += size
+    if not dry_run and hasattr(storage, 'clean_temp'):
+        storage.clean_temp(cutoff)
+    return removed, freed
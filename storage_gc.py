@@ -0,0 +1,40 @@
+"""Delete stored upload blobs that no MRIScan references any more.
+
+    python storage_gc.py --dry-run
+    python storage_gc.py --grace-hours 24
+
+Blobs younger than the grace period are always kept, since uploads are stored
+shortly before their scan row is committed. Legacy files in the top level of
+the upload folder are never touched.
+"""
+import argparse
+import sys
+
+from app import app, db, MRIScan, storage
+import migrations
+from storage import collect_garbage
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Garbage-collect orphaned upload blobs')
+    parser.add_argument('--dry-run', action='store_true', help='Only list what would be deleted')
+    parser.add_argument('--grace-hours', type=float, default=1.0,
+                        help='Keep blobs modified more recently than this (default 1)')
+    args = parser.parse_args(argv)
+
+    with app.app_context():
+        migrations.upgrade(db.engine)
+        referenced = [filepath for (filepath,) in db.session.query(MRIScan.filepath).distinct()]
+
+    removed, freed = collect_garbage(
+        storage, referenced, grace_seconds=args.grace_hours * 3600, dry_run=args.dry_run
+    )
+    for ref in removed:
+        print(ref)
+    action = 'Would delete' if args.dry_run else 'Deleted'
+    print(f'🧹 {action} {len(removed)} orphaned blob(s), {freed / 1e6:.1f} MB', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
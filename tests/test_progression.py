@@ -0,0 +1,37 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import progression
+
+NON = [0.9, 0.05, 0.03, 0.02]
+MILD = [0.05, 0.2, 0.7, 0.05]
+
+
+def series_of(*scans):
+    return progression.upsert(progression.unpack(None), [
+        progression.point(i + 1, created_at, np.array(probs, dtype="<f2"))
+        for i, (created_at, probs) in enumerate(scans)
+    ])
+
+
+def test_near_simultaneous_scans_have_no_trend():
+    now = datetime(2025, 3, 1, 10, 0, 0)
+    summary = progression.summarise(series_of((now, NON), (now + timedelta(seconds=5), MILD)))
+    assert summary["trend"] is None
+    assert summary["trend_per_year"] is None
+
+
+def test_visits_shorter_than_min_days_have_no_trend():
+    start = datetime(2025, 3, 1)
+    summary = progression.summarise(series_of((start, NON), (start + timedelta(days=30), MILD)))
+    assert summary["trend"] is None
+
+
+def test_same_day_scans_are_one_visit():
+    start = datetime(2024, 1, 1, 9, 0)
+    series = series_of((start, NON), (start + timedelta(hours=2), MILD), (start + timedelta(days=180), MILD))
+    days, scores = progression.visits(series)
+    assert len(days) == 2
+    assert np.isclose(scores[0], progression.severity(series[:2]).mean())
+    assert progression.summarise(series)["trend"] == "worsening"
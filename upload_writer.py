@@ -0,0 +1,78 @@
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from observability import UPLOAD_WRITES_PENDING
+from storage import content_digest
+
+log = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1 << 20
+
+
+def read_upload(stream, chunk_size=CHUNK_SIZE):
+    """Read an upload stream into memory, hashing it chunk by chunk as it arrives.
+
+    Returns ``(data, digest)`` where ``digest`` is the hex blake2b of the raw bytes.
+    """
+    h = hashlib.blake2b(digest_size=20)
+    data = bytearray()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        h.update(chunk)
+        data += chunk
+    return bytes(data), h.hexdigest()
+
+
+class UploadWriter:
+    """Stores upload bytes on a background thread so requests don't wait on disk writes.
+
+    ``save`` returns the blob's storage reference straight away (it only depends
+    on the content hash); the write itself happens on the pool. Pending writes
+    finish before the interpreter exits (the pool's threads are joined at
+    shutdown).
+    """
+
+    def __init__(self, storage, max_workers=1):
+        self.storage = storage
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upload-writer")
+        self._lock = threading.Lock()
+        self._pending = set()
+        self.written = 0
+        self.failed = 0
+
+    def save(self, data, suffix="", digest=None):
+        """Queue ``data`` for storage; returns its reference (e.g. for ``MRIScan.filepath``)."""
+        digest = digest or content_digest(data)
+        future = self._pool.submit(self.storage.put, data, suffix, digest)
+        with self._lock:
+            self._pending.add(future)
+        UPLOAD_WRITES_PENDING.inc()
+        future.add_done_callback(self._done)
+        return self.storage.ref_for(digest, suffix)
+
+    def flush(self, timeout=None):
+        """Block until every queued write has finished."""
+        with self._lock:
+            pending = list(self._pending)
+        for future in pending:
+            future.exception(timeout=timeout)
+
+    def stats(self):
+        with self._lock:
+            return {"pending": len(self._pending), "written": self.written, "failed": self.failed}
+
+    def _done(self, future):
+        error = future.exception()
+        with self._lock:
+            self._pending.discard(future)
+            if error is None:
+                self.written += 1
+            else:
+                self.failed += 1
+        UPLOAD_WRITES_PENDING.dec()
+        if error is not None:
+            log.error("❌ Upload write error: %s", error)
@@ -0,0 +1,165 @@
+"""Streaming slice extraction from DICOM series and NIfTI volumes.
+
+Only the slices that will be predicted are read: NIfTI volumes are memory-mapped
+through nibabel's array proxy and sliced one axial plane at a time, and DICOM
+series are sorted from headers alone (``stop_before_pixels``) before pixel data
+is decoded for the chosen slices / frames. pydicom and nibabel are optional
+dependencies, imported on first use.
+"""
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+VOLUME_EXTENSIONS = ('.nii', '.nii.gz', '.dcm')
+
+
+def is_volume_path(path):
+    return str(path).lower().endswith(VOLUME_EXTENSIONS)
+
+
+def select_slices(count, fraction=0.5, max_slices=32):
+    """Evenly spaced indices over the central ``fraction`` of ``count`` slices."""
+    if count <= 0:
+        return []
+    fraction = min(max(fraction, 0.0), 1.0)
+    lo = int(count * (1 - fraction) / 2)
+    hi = max(lo + 1, int(round(count * (1 + fraction) / 2)))
+    n = max(1, min(max_slices, hi - lo))
+    return sorted(set(np.linspace(lo, hi - 1, n).round().astype(int).tolist()))
+
+
+def to_uint8(pixels, window=None):
+    """Window a slice to 0-255: DICOM window centre/width if given, else 1st-99th percentile."""
+    pixels = np.asarray(pixels, dtype=np.float32)
+    if window is not None:
+        center, width = window
+        lo, hi = center - width / 2.0, center + width / 2.0
+    else:
+        lo, hi = np.percentile(pixels, (1, 99))
+    if hi <= lo:
+        return np.zeros(pixels.shape, dtype=np.uint8)
+    scaled = (np.clip(pixels, lo, hi) - lo) * (255.0 / (hi - lo))
+    return scaled.astype(np.uint8)
+
+
+# ----- NIfTI -----
+
+def _nibabel():
+    try:
+        import nibabel
+    except ImportError:
+        raise ImportError("NIfTI support needs nibabel (pip install nibabel)")
+    return nibabel
+
+
+def iter_nifti_slices(path, fraction=0.5, max_slices=32):
+    """Yield uint8 axial slices of a NIfTI volume without loading the whole volume."""
+    nib = _nibabel()
+    img = nib.load(path, mmap=True)
+    shape = img.shape
+    if len(shape) < 3:
+        raise ValueError(f"Expected a 3D/4D NIfTI volume, got shape {shape}")
+
+    # Axial = the voxel axis that runs inferior/superior
+    codes = nib.aff2axcodes(img.affine)
+    axis = next((i for i, c in enumerate(codes[:3]) if c in ('S', 'I')), 2)
+
+    for k in select_slices(shape[axis], fraction, max_slices):
+        index = [slice(None)] * 3 + [0] * (len(shape) - 3)  # first volume of 4D series
+        index[axis] = k
+        plane = np.asarray(img.dataobj[tuple(index)])
+        if np.ptp(plane) == 0:
+            continue  # blank slice outside the head
+        yield to_uint8(np.rot90(plane))
+
+
+# ----- DICOM -----
+
+def _pydicom():
+    try:
+        import pydicom
+    except ImportError:
+        raise ImportError("DICOM support needs pydicom (pip install pydicom)")
+    return pydicom
+
+
+def _slice_position(ds):
+    position = getattr(ds, 'ImagePositionPatient', None)
+    if position is not None and len(position) == 3:
+        return float(position[2])
+    return float(getattr(ds, 'InstanceNumber', 0) or 0)
+
+
+def _first(value):
+    # Multi-valued DICOM elements (e.g. several windows): use the first
+    if isinstance(value, (str, bytes)) or not hasattr(value, '__len__'):
+        return value
+    return value[0]
+
+
+def _window(ds):
+    center, width = getattr(ds, 'WindowCenter', None), getattr(ds, 'WindowWidth', None)
+    if center is None or width is None:
+        return None
+    return float(_first(center)), float(_first(width))
+
+
+def _rescale(pixels, ds):
+    slope = float(getattr(ds, 'RescaleSlope', 1) or 1)
+    intercept = float(getattr(ds, 'RescaleIntercept', 0) or 0)
+    return pixels.astype(np.float32) * slope + intercept
+
+
+def group_dicom_series(items):
+    """Group ``(filename, path)`` DICOM items by SeriesInstanceUID, slices sorted by position.
+
+    Only headers are read. Returns an ordered dict ``uid -> [(filename, path), ...]``.
+    """
+    pydicom = _pydicom()
+    series = OrderedDict()
+    for filename, path in items:
+        ds = pydicom.dcmread(path, stop_before_pixels=True, force=True)
+        uid = str(getattr(ds, 'SeriesInstanceUID', '') or os.path.dirname(path))
+        series.setdefault(uid, []).append((_slice_position(ds), filename, path))
+    return OrderedDict(
+        (uid, [(filename, path) for _, filename, path in sorted(entries, key=lambda e: e[0])])
+        for uid, entries in series.items()
+    )
+
+
+def iter_dicom_slices(paths, fraction=0.5, max_slices=32):
+    """Yield uint8 slices from one multi-frame DICOM file or a sorted list of single-slice files."""
+    pydicom = _pydicom()
+    paths = [paths] if isinstance(paths, (str, os.PathLike)) else list(paths)
+
+    if len(paths) == 1:
+        ds = pydicom.dcmread(paths[0], stop_before_pixels=True, force=True)
+        frames = int(getattr(ds, 'NumberOfFrames', 1) or 1)
+        indices = select_slices(frames, fraction, max_slices)
+        try:
+            # pydicom >= 3 decodes only the requested frames
+            from pydicom.pixels import iter_pixels
+            frame_iter = iter_pixels(paths[0], indices=indices)
+        except ImportError:
+            pixel_array = pydicom.dcmread(paths[0], force=True).pixel_array
+            frame_iter = (pixel_array[i] if frames > 1 else pixel_array for i in indices)
+        for pixels in frame_iter:
+            if pixels.ndim != 2 or np.ptp(pixels) == 0:
+                continue
+            yield to_uint8(_rescale(pixels, ds), _window(ds))
+        return
+
+    for k in select_slices(len(paths), fraction, max_slices):
+        ds = pydicom.dcmread(paths[k], force=True)
+        pixels = ds.pixel_array
+        if pixels.ndim != 2 or np.ptp(pixels) == 0:
+            continue
+        yield to_uint8(_rescale(pixels, ds), _window(ds))
+
+
+def iter_volume_slices(source, fraction=0.5, max_slices=32):
+    """Slices of a .nii/.nii.gz path, a .dcm path, or a list of DICOM slice paths."""
+    if isinstance(source, (str, os.PathLike)) and str(source).lower().endswith(('.nii', '.nii.gz')):
+        return iter_nifti_slices(source, fraction, max_slices)
+    return iter_dicom_slices(source, fraction, max_slices)
@@ -0,0 +1,15 @@
+"""WSGI entry point for production servers.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Imported once in the gunicorn master (preload_app): the schema is migrated and
+fork-safe model backends are loaded before the web workers are forked.
+"""
+import logging
+
+from app import app, init_db
+from predict import preload_model
+
+init_db()
+if preload_model():
+    logging.getLogger(__name__).info("✅ Model preloaded before fork; workers share its weights")